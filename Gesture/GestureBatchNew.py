@@ -1,121 +1,570 @@
-import json
-import base64
+import asyncio
+import itertools
 import threading
 import queue
 import time
 import grpc
+import torch
 from concurrent import futures
 from datetime import datetime
 
-import cv2
-import numpy as np
-
+import metrics
+from actions import ActionTable
+from batching import DynamicBatcher, DeadlineExceeded, deadline_from_context
 from config import settings
-from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+from frames import FrameDecodeError, FrameDecoder, encodings_metadata
+from health import LatencyWindow, ReadinessMonitor
+from model_loader import load_class_names, load_predictor, warm_up
+from pipeline import Pipeline
+from roi_tracker import RoiTracker
+from routing import create_router, worker_stats
+from streams import ClientStates, StreamState
+from temporal_cache import TemporalCache, frame_signature
+from vision.ssd.config import mobilenetv1_ssd_config
 from vision.utils.misc import Timer
+from worker_pool import ProcessWorkerPool
 
 import gesture_pb2
 import gesture_pb2_grpc
-from grpc_health.v1 import health_pb2_grpc, health_pb2
+from grpc_health.v1 import health, health_pb2_grpc
 
 
-class HealthServicer(health_pb2_grpc.HealthServicer):
-    def Check(self, request, context):
-        return health_pb2.HealthCheckResponse(status=health_pb2.HealthCheckResponse.SERVING)
+# batch中個別請求失敗時回給client的狀態碼
+ERROR_STATUS = {
+    DeadlineExceeded: grpc.StatusCode.DEADLINE_EXCEEDED,
+    FrameDecodeError: grpc.StatusCode.INVALID_ARGUMENT,
+}
+REQUEST_ERRORS = tuple(ERROR_STATUS)
+# RecognitionStream的讀取執行緒檢查RPC是否已結束的間隔(秒)
+STREAM_POLL_INTERVAL = 0.1
 
 
-class RequestWrapper:
-    def __init__(self, image_data):
-        self.image_data = image_data
-        self.result_queue = queue.Queue()
+class FrameRecognizer:
+    """One model replica: turns decoded model-input frames into RecognitionReplies.
 
+    With share_weights the replicas of one process share a single set of weights.
+    Replies are numbered from `frame_indexes` (an itertools.count), which the
+    replicas of a service share so every reply gets its own frame index.
+    """
 
-class GestureDetectionWorker:
-    def __init__(self, worker_id):
+    def __init__(self, worker_id=0, share_weights=False, frame_indexes=None):
         self.worker_id = worker_id
-        self.class_names = [name.strip() for name in open(settings.label_path).readlines()]
-        self.net = create_mobilenetv1_ssd(len(self.class_names), is_test=True)
-        self.net.load(settings.weights)
-        self.predictor = create_mobilenetv1_ssd_predictor(self.net, candidate_size=200)
-        self.queue = queue.Queue()
-        self.batch_size = settings.batch_size
-        self.queue_timeout = settings.queue_timeout
+        self.class_names = load_class_names()
+        self.predictor = load_predictor(len(self.class_names), share_weights)
+        self.actions = ActionTable(self.class_names)
+        self.frame_indexes = frame_indexes if frame_indexes is not None else itertools.count(1)
         self.frame_index = 0
-        threading.Thread(target=self._batch_worker, daemon=True).start()
 
-    def handle_request(self, image_data):
-        wrapper = RequestWrapper(image_data)
-        self.queue.put(wrapper)
-        return wrapper.result_queue.get()
+    def warm_up(self):
+        warm_up(self.predictor, settings.batch_size)
+
+    def __call__(self, frames, sizes):
+        return self.recognize(frames, sizes)[0]
+
+    def recognize(self, frames, sizes, offsets=None):
+        """Return the replies and the (boxes, labels, probs) detections of a batch of frames.
+
+        `sizes` and `offsets` are the size and corner of every frame's crop in
+        its original frame, as for Predictor.predict_batch.
+        """
+        return self.finish(self.forward(frames), sizes, offsets)
+
+    def next_frame_index(self):
+        # itertools.count的next()是原子操作，多個worker執行緒共用也不會重複
+        self.frame_index = next(self.frame_indexes)
+        return self.frame_index
+
+    def forward(self, frames):
+        """First half of recognize(): the model outputs of a batch, still on the device."""
+        return self.predictor.forward_batch(frames)
+
+    def finish(self, outputs, sizes, offsets=None):
+        """Second half of recognize(): post-process forward() outputs into replies and detections."""
+        timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+        results = self.predictor.postprocess_batch(*outputs, sizes, top_k=settings.top_k,
+                                                   prob_threshold=settings.conf_thres, offsets=offsets)
+        replies = []
+        for boxes, labels, probs in results:
+            replies.append(gesture_pb2.RecognitionReply(
+                frame_index=self.next_frame_index(),
+                timestamp=timestamp,
+                action=self.actions.action(labels.tolist())
+            ))
+        return replies, results
+
+
+class _BatchJob:
+    """One batch on its way through a worker's decode, infer and reply stages."""
+
+    __slots__ = ("payloads", "items", "infer_seconds", "decoder", "frames", "decoded", "replies", "outputs")
+
+    def __init__(self, payloads, items=None):
+        self.payloads = payloads
+        self.items = items
+        self.infer_seconds = None  # 推論階段本身的時間，不含在各階段queue中等待的時間
+        self.decoder = None
+        self.frames = None
+        self.decoded = []
+        self.replies = [None] * len(payloads)
+        self.outputs = None
+
+
+class GestureDetectionWorker:
+    """A model replica with its own batch queue.
+
+    A batch goes through three stages: decode the frames, run the model, then
+    post-process and reply. By default one thread runs them in turn. With
+    pipeline_depth > 0 every stage has its own thread, so the next batch is
+    decoded while the model runs and the previous batch is answered at the
+    same time. On CUDA the model work is queued on the worker's own stream.
+    """
+
+    def __init__(self, worker_id, frame_indexes=None):
+        self.worker_id = worker_id
+        self.recognizer = FrameRecognizer(worker_id, settings.share_weights, frame_indexes)
+        predictor = self.recognizer.predictor
+        depth = settings.pipeline_depth
+        # 每個在途的batch各用一個解碼緩衝區，推論階段上傳完就還回來
+        self.decoders = queue.Queue()
+        for _ in range(depth + 2 if depth else 1):
+            self.decoders.put(FrameDecoder(predictor.size, settings.batch_size))
+        self.in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        # 預熱完成後才啟動batch執行緒，在此之前送來的請求先留在queue中
+        self.batcher = DynamicBatcher(None if depth else self._process_batch,
+                                      max_batch_size=settings.batch_size,
+                                      max_delay=settings.queue_timeout,
+                                      target_latency=settings.target_batch_latency,
+                                      name=f"gesture-worker-{worker_id}")
+        self.pipeline = None
+        if depth:
+            if predictor.stream is None and predictor.device.type == "cuda":
+                predictor.stream = torch.cuda.Stream(predictor.device)
+            self.pipeline = Pipeline([("decode", self._decode), ("infer", self._infer), ("reply", self._complete)],
+                                     depth, on_error=self._fail, name=f"gesture-worker-{worker_id}")
+
+    def start(self):
+        self.recognizer.warm_up()
+        if self.pipeline is None:
+            self.batcher.start()
+        else:
+            self.pipeline.start()
+            threading.Thread(target=self._feed, name=f"gesture-worker-{self.worker_id}", daemon=True).start()
+        return self
+
+    @property
+    def queue_depth(self):
+        return self.batcher.queue_depth + (self.batcher.in_progress if self.pipeline is None else self.in_flight)
+
+    @property
+    def batch_latency(self):
+        return self.batcher.latency_ewma
+
+    def submit(self, request, deadline=None, tracker=None):
+        """Queue a frame; with a RoiTracker it is detected on the tracker's region and updates it."""
+        return self.batcher.submit((request, tracker), deadline)
 
-    def _batch_worker(self):
+    def _process_batch(self, payloads):
+        return self._reply(self._infer(self._decode(_BatchJob(payloads))))
+
+    def _feed(self):
         while True:
-            batch_frames = []
-            wrappers = []
-            timestamps = []
-            start_time = time.time()
+            items = self.batcher.next_batch()
+            if not items:
+                if self.batcher.closed:
+                    break
+                continue
+            self._add_in_flight(len(items))
+            # 前面的階段都滿時在此等待，新請求繼續在batcher中湊成下一個batch
+            self.pipeline.put(_BatchJob([item.payload for item in items], items))
+        self.pipeline.close()
 
-            while len(batch_frames) < self.batch_size and (time.time() - start_time) < self.queue_timeout:
+    def _add_in_flight(self, count):
+        with self._in_flight_lock:
+            self.in_flight += count
+
+    def _decode(self, job):
+        job.decoder = self.decoders.get()
+        try:
+            batch_frames = job.decoder.buffer(len(job.payloads))
+            for i, (request, tracker) in enumerate(job.payloads):
+                # 解碼時才決定裁切區域，能用到同一條stream之前batch的偵測結果
+                crop = tracker.region() if tracker is not None else None
+                frame = batch_frames[len(job.decoded)]
                 try:
-                    wrapper = self.queue.get(timeout=0.01)
-                    nparr = np.frombuffer(wrapper.image_data, np.uint8)
-                    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                    batch_frames.append(img)
-                    wrappers.append(wrapper)
-                    timestamps.append(datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
-                except queue.Empty:
-                    pass
-
-            if not batch_frames:
-                continue
+                    with metrics.stage_timer("decode"):
+                        if crop is None:
+                            _, frame_size = job.decoder.decode(request, frame)
+                        else:
+                            _, frame_size, crop = job.decoder.decode_crop(request, crop, frame)
+                except FrameDecodeError as e:
+                    job.replies[i] = e
+                    continue
+                job.decoded.append((i, tracker, crop, frame_size))
+            job.frames = batch_frames[:len(job.decoded)]
+        except BaseException:
+            self._release_decoder(job)
+            raise
+        return job
 
-            results = self.predictor.predict_batch(batch_frames, top_k=settings.top_k, prob_threshold=settings.conf_thres)
+    def _infer(self, job):
+        try:
+            if job.decoded:
+                start = time.monotonic()
+                job.outputs = self.recognizer.forward(job.frames)
+                job.infer_seconds = time.monotonic() - start
+        finally:
+            # frame已上傳，緩衝區可以給下一個batch解碼
+            self._release_decoder(job)
+        return job
 
-            for i, (boxes, labels, probs) in enumerate(results):
-                self.frame_index += 1
-                text = {"Left": "", "Right": ""}
+    def _reply(self, job):
+        if not job.decoded:
+            return job.replies
+        sizes = [frame_size if crop is None else (crop[2] - crop[0], crop[3] - crop[1])
+                 for _, _, crop, frame_size in job.decoded]
+        offsets = [(0, 0) if crop is None else crop[:2] for _, _, crop, _ in job.decoded]
+        batch_replies, results = self.recognizer.finish(job.outputs, sizes, offsets)
+        for (i, tracker, crop, frame_size), reply, (boxes, _, _) in zip(job.decoded, batch_replies, results):
+            job.replies[i] = reply
+            if tracker is not None:
+                tracker.update(crop, boxes, frame_size)
+                metrics.roi_frame("full" if crop is None else "crop")
+        return job.replies
 
-                for j in range(boxes.size(0)):
-                    label_name = self.class_names[labels[j]]
-                    digit = label_name.split("_")[-1]
-                    text["Left"] = digit
-                    text["Right"] = digit
+    def _complete(self, job):
+        replies = self._reply(job)
+        self._add_in_flight(-len(job.items))
+        # 只回報模型本身的時間，否則pipeline排隊會讓batch縮小、router避開這個worker
+        self.batcher.complete(job.items, replies, job.infer_seconds)
 
-                reply = gesture_pb2.RecognitionReply(
-                    frame_index=self.frame_index,
-                    timestamp=timestamps[i],
-                    action=json.dumps(text)
-                )
-                wrappers[i].result_queue.put(reply)
+    def _fail(self, job, exc):
+        self._release_decoder(job)
+        self._add_in_flight(-len(job.items))
+        self.batcher.fail(job.items, exc)
+
+    def _release_decoder(self, job):
+        if job.decoder is not None:
+            self.decoders.put(job.decoder)
+            job.decoder = None
+
+
+def create_process_pool():
+    return ProcessWorkerPool(FrameRecognizer, settings.num_workers,
+                             size=mobilenetv1_ssd_config.image_size,
+                             slots_per_worker=settings.worker_ring_slots,
+                             router=create_router(settings.routing_policy),
+                             max_batch_size=settings.batch_size,
+                             max_delay=settings.queue_timeout,
+                             target_latency=settings.target_batch_latency)
 
 
 class GestureRecognitionService(gesture_pb2_grpc.GestureRecognitionServicer):
     def __init__(self):
         self.num_workers = settings.num_workers
-        self.workers = [GestureDetectionWorker(i) for i in range(self.num_workers)]
-        self.next_worker = 0
         self.lock = threading.Lock()
+        # thread worker的回覆與temporal cache命中共用同一個frame編號
+        self.frame_indexes = itertools.count(1)
+        if settings.worker_mode == "process":
+            # 每個worker是獨立的程序，解碼與後處理不再互搶GIL
+            self.pool = create_process_pool()
+            self.workers = []
+        else:
+            self.pool = None
+            self.workers = [GestureDetectionWorker(i, self.frame_indexes) for i in range(self.num_workers)]
+            self.router = create_router(settings.routing_policy)
+        # 最近請求的延遲，health依其p99判斷是否過載
+        self.latencies = LatencyWindow(settings.health_window)
+        # ROI tracking要把偵測框交回tracker，只有thread worker做得到
+        self.roi_tracking = settings.roi_tracking and self.pool is None
+        if settings.roi_tracking and not self.roi_tracking:
+            print("roi_tracking needs worker_mode='thread', frames are detected whole")
+        # unary請求依client位址、stream請求每條stream各有一份cache與tracker
+        self.client_states = ClientStates(self.new_stream_state) \
+            if settings.temporal_cache or self.roi_tracking else None
+
+    def new_stream_state(self):
+        cache = TemporalCache(settings.temporal_threshold, settings.temporal_refresh_frames) \
+            if settings.temporal_cache else None
+        tracker = RoiTracker(settings.roi_margin, settings.roi_min_height, settings.roi_refresh_frames) \
+            if self.roi_tracking else None
+        return StreamState(cache, tracker)
+
+    def submit(self, request, deadline=None, tracker=None):
+        start = time.monotonic()
+        metrics.request_started()
+        if self.pool is not None:
+            future = self.pool.submit(request, deadline)
+        else:
+            # 選worker與送入queue在同一把鎖內，同時到達的請求才會看到彼此造成的queue深度
+            with self.lock:
+                future = self.router.choose(self.workers).submit(request, deadline, tracker)
+        future.add_done_callback(lambda _: self._finished(time.monotonic() - start))
+        return future
+
+    def _finished(self, seconds):
+        self.latencies.record(seconds)
+        metrics.request_finished(seconds)
+
+    def submit_frame(self, request, deadline=None, state=None):
+        """submit() for a frame of the stream (or client) `state`: a frame nearly identical
+        to the last one is answered from its cache, others are detected around its tracked hands."""
+        if state is None:
+            return self.submit(request, deadline)
+        cache = state.cache
+        if cache is None:
+            return self.submit(request, deadline, state.tracker)
+        try:
+            signature = frame_signature(request)
+        except FrameDecodeError:
+            # 交給worker回報解碼錯誤
+            return self.submit(request, deadline, state.tracker)
+        reply, result = cache.lookup(signature)
+        metrics.temporal_cache_lookup(result)
+        if reply is not None:
+            future = futures.Future()
+            future.set_result(gesture_pb2.RecognitionReply(
+                frame_index=self.next_frame_index(),
+                timestamp=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                action=reply.action
+            ))
+            return future
+
+        def store(future):
+            if not future.cancelled() and future.exception() is None:
+                cache.store(signature, future.result())
+
+        future = self.submit(request, deadline, state.tracker)
+        future.add_done_callback(store)
+        return future
+
+    def next_frame_index(self):
+        """Frame index of a reply answered from a TemporalCache, from the counter the
+        thread workers number their replies with (process workers count their own)."""
+        return next(self.frame_indexes)
+
+    def client_state(self, context):
+        return self.client_states.get(context.peer()) if self.client_states is not None else None
+
+    def stream_state(self):
+        return self.new_stream_state() if self.client_states is not None else None
+
+    def start(self):
+        """Warm up every model replica and start serving the queued requests."""
+        if self.pool is not None:
+            self.pool.wait_ready()
+        for worker in self.workers:
+            worker.start()
+
+    def worker_stats(self):
+        """Queue depth and batch latency (seconds) of every worker."""
+        return self.pool.worker_stats() if self.pool is not None else worker_stats(self.workers)
+
+    def queue_depth(self):
+        """Requests queued or in inference over all workers."""
+        return sum(worker["queue_depth"] for worker in self.worker_stats())
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+        for worker in self.workers:
+            worker.batcher.close()
 
     def Recognition(self, request, context):
-        with self.lock:
-            worker = self.workers[self.next_worker]
-            self.next_worker = (self.next_worker + 1) % self.num_workers
-        image_bytes = base64.b64decode(request.image)
-        return worker.handle_request(image_bytes)
+        if request.encoding == gesture_pb2.ENCODING_BASE64:
+            # 告知舊版client可改用原始bytes傳送
+            context.send_initial_metadata(encodings_metadata())
+        future = self.submit_frame(request, deadline_from_context(context), self.client_state(context))
+        # client斷線時取消尚未進入batch的請求
+        context.add_callback(future.cancel)
+        try:
+            return future.result()
+        except REQUEST_ERRORS as e:
+            context.abort(ERROR_STATUS[type(e)], str(e))
+        except futures.CancelledError:
+            context.abort(grpc.StatusCode.CANCELLED, "request cancelled")
+
+    def RecognitionStream(self, request_iterator, context):
+        # 讀取執行緒先把frame送進batch，回覆端依序等待結果，
+        # 同一條stream最多stream_window張frame同時在處理，也能和其他stream的frame併成同一個batch
+        deadline = deadline_from_context(context)
+        state = self.stream_state()
+        pending = queue.Queue(maxsize=settings.stream_window)
+        outstanding = set()
+        # RPC結束(完成、取消或abort)後不再有人從pending取出，讀取執行緒必須自行結束
+        finished = threading.Event()
+
+        def put(item):
+            while not finished.is_set():
+                try:
+                    pending.put(item, timeout=STREAM_POLL_INTERVAL)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def read_requests():
+            try:
+                for request in request_iterator:
+                    if finished.is_set():
+                        return
+                    future = self.submit_frame(request, deadline, state)
+                    outstanding.add(future)
+                    if not put(future):
+                        future.cancel()
+                        return
+            finally:
+                put(None)
+
+        def finish():
+            finished.set()
+            for future in list(outstanding):
+                future.cancel()
+
+        context.send_initial_metadata(encodings_metadata())
+        context.add_callback(finish)
+        threading.Thread(target=read_requests, name="gesture-stream-reader", daemon=True).start()
+        try:
+            while True:
+                future = pending.get()
+                if future is None:
+                    return
+                try:
+                    yield future.result()
+                except REQUEST_ERRORS as e:
+                    context.abort(ERROR_STATUS[type(e)], str(e))
+                except futures.CancelledError:
+                    context.abort(grpc.StatusCode.CANCELLED, "request cancelled")
+                finally:
+                    outstanding.discard(future)
+        finally:
+            finish()
+
+
+class AsyncGestureRecognitionService(GestureRecognitionService):
+    """grpc.aio版本：handler只await batch結果，推論仍在各worker的batch執行緒上進行"""
+
+    async def submit_async(self, request, deadline=None, state=None):
+        if self.pool is not None or (state is not None and state.cache is not None):
+            # process模式在呼叫端解碼並可能等待frame slot，temporal cache要先解碼縮圖算簽章，都不能佔住event loop
+            return await asyncio.to_thread(self.submit_frame, request, deadline, state)
+        return self.submit_frame(request, deadline, state)
+
+    async def Recognition(self, request, context):
+        if request.encoding == gesture_pb2.ENCODING_BASE64:
+            await context.send_initial_metadata(encodings_metadata())
+        future = await self.submit_async(request, deadline_from_context(context), self.client_state(context))
+        try:
+            # client斷線時handler task被取消，wrap_future會一併取消batch中的請求
+            return await asyncio.wrap_future(future)
+        except REQUEST_ERRORS as e:
+            await context.abort(ERROR_STATUS[type(e)], str(e))
+
+    async def RecognitionStream(self, request_iterator, context):
+        deadline = deadline_from_context(context)
+        state = self.stream_state()
+        pending = asyncio.Queue(maxsize=settings.stream_window)
+
+        async def read_requests():
+            async for request in request_iterator:
+                future = await self.submit_async(request, deadline, state)
+                await pending.put(asyncio.wrap_future(future))
+            await pending.put(None)
+
+        await context.send_initial_metadata(encodings_metadata())
+        reader = asyncio.create_task(read_requests())
+        try:
+            while True:
+                future = await pending.get()
+                if future is None:
+                    return
+                try:
+                    yield await future
+                except REQUEST_ERRORS as e:
+                    await context.abort(ERROR_STATUS[type(e)], str(e))
+        finally:
+            reader.cancel()
+            while not pending.empty():
+                future = pending.get_nowait()
+                if future is not None:
+                    future.cancel()
+
+
+def create_readiness_monitor(servicer, service, loop=None):
+    return ReadinessMonitor(servicer, queue_depth=service.queue_depth, latencies=service.latencies,
+                            max_queue_depth=settings.health_max_queue_depth,
+                            max_p99_latency=settings.health_max_p99_latency,
+                            interval=settings.health_interval, loop=loop)
+
+
+def create_server():
+    """grpc.server for thread mode.
+
+    Every open RecognitionStream holds a handler thread, so calls beyond the
+    handler threads fail at once with RESOURCE_EXHAUSTED instead of queueing
+    behind long-lived streams without bound.
+    """
+    max_rpcs = settings.grpc_max_concurrent_rpcs or settings.grpc_max_workers
+    return grpc.server(futures.ThreadPoolExecutor(max_workers=settings.grpc_max_workers),
+                       maximum_concurrent_rpcs=max_rpcs)
 
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    health_pb2_grpc.add_HealthServicer_to_server(HealthServicer(), server)
-    gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(GestureRecognitionService(), server)
+    server = create_server()
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    service = GestureRecognitionService()
+    gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(service, server)
+    # 預熱完成前health回報NOT_SERVING
+    monitor = create_readiness_monitor(health_servicer, service)
+    metrics.start_metrics_server(settings.metrics_port, queue_depth=service.queue_depth,
+                                 worker_stats=service.worker_stats)
     server.add_insecure_port("[::]:" + settings.gRPC_port)
     server.start()
     print("Gesture gRPC server started on port", settings.gRPC_port)
-    server.wait_for_termination()
+    try:
+        service.start()
+        monitor.mark_ready()
+        monitor.start()
+        print("Gesture models warmed up, serving")
+        server.wait_for_termination()
+    finally:
+        monitor.close()
+        service.close()
+
+
+async def serve_aio():
+    server = grpc.aio.server(
+        maximum_concurrent_rpcs=settings.aio_max_concurrent_rpcs,
+        options=[("grpc.max_concurrent_streams", settings.aio_max_concurrent_streams)],
+    )
+    health_servicer = health.aio.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    service = AsyncGestureRecognitionService()
+    gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(service, server)
+    monitor = create_readiness_monitor(health_servicer, service, asyncio.get_running_loop())
+    metrics.start_metrics_server(settings.metrics_port, queue_depth=service.queue_depth,
+                                 worker_stats=service.worker_stats)
+    server.add_insecure_port("[::]:" + settings.gRPC_port)
+    await server.start()
+    print("Gesture gRPC aio server started on port", settings.gRPC_port)
+    try:
+        await asyncio.to_thread(service.start)
+        monitor.mark_ready()
+        monitor.start()
+        print("Gesture models warmed up, serving")
+        await server.wait_for_termination()
+    finally:
+        monitor.close()
+        await server.stop(None)
+        service.close()
 
 
 if __name__ == "__main__":
     try:
-        serve()
+        if settings.server_mode == "aio":
+            asyncio.run(serve_aio())
+        else:
+            serve()
     except KeyboardInterrupt:
         print("Gesture gRPC server stopped")
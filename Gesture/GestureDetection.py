@@ -1,7 +1,7 @@
 import json
-import base64
+import threading
 from concurrent import futures
-from grpc_health.v1 import health_pb2_grpc, health_pb2
+from grpc_health.v1 import health, health_pb2_grpc
 import grpc
 import gesture_pb2
 import gesture_pb2_grpc
@@ -11,9 +11,13 @@ import math
 import numpy as np
 from datetime import datetime
 import traceback
-from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+import metrics
+from actions import ActionTable
+from model_loader import load_class_names, load_predictor, warm_up
 from vision.utils.misc import Timer
 from config import settings
+from frames import FrameDecoder, encodings_metadata
+from health import LatencyWindow, ReadinessMonitor
 
 
 net_type = settings.net_type
@@ -21,21 +25,19 @@ model_path = settings.weights
 label_path = settings.label_path
 
 
-class_names = [name.strip() for name in open(label_path).readlines()]
+class_names = load_class_names(label_path)
 num_classes = len(class_names)
 
-net = create_mobilenetv1_ssd(len(class_names), is_test=True)
-net.load(model_path)
-
-predictor = create_mobilenetv1_ssd_predictor(net, candidate_size=200)
+predictor = load_predictor(num_classes)
+actions = ActionTable(class_names)
+frame_decoder = FrameDecoder(predictor.size)
 
 timer = Timer()
 frame_index = 0
 
-class HealthServicer(health_pb2_grpc.HealthServicer):
-    def Check(self, request, context):
-        return health_pb2.HealthCheckResponse(status=health_pb2.HealthCheckResponse.SERVING)
-    
+ready = threading.Event()  # 模型預熱完成前請求先等待
+latencies = LatencyWindow(settings.health_window)  # 最近請求的延遲，health依其p99判斷是否過載
+
 class GestureRecognitionService(gesture_pb2_grpc.GestureRecognitionServicer):
     def __init__(self):
         # 建立 TensorFlow 操作，確保它在 GPU 上運行
@@ -45,84 +47,30 @@ class GestureRecognitionService(gesture_pb2_grpc.GestureRecognitionServicer):
 
     def Recognition(self, request, context):
         global frame_index
+        start = time.monotonic()
+        metrics.request_started()
         try:
-            imgString = base64.b64decode(request.image)
-            nparr = np.fromstring(imgString, np.uint8)
-            # nparr = np.frombuffer(request.image, np.uint8)  # 將二進制數據轉換成 numpy 陣列
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)  # 將二進制數據轉換成圖像
+            if request.encoding == gesture_pb2.ENCODING_BASE64:
+                context.send_initial_metadata(encodings_metadata())
+            # 依request.encoding直接解碼成模型輸入大小的RGB圖像(JPEG以縮小比例解碼)
+            with metrics.stage_timer("decode"):
+                img, size = frame_decoder.decode(request)
+            ready.wait()  # 預熱期間先等待，不與預熱同時推論
             # print("Image decoded.")
 
-            w, h = settings.img_resize_w, settings.img_resize_h  # 影像尺寸
-            img = cv2.resize(img, (w, h))  # 縮小尺寸，加快處理效率
-            img2 = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)  # 轉換成 RGB 色彩
-            # print("Image resize and converted to RGB.")
-
             #timer.start("default")
-            boxes, labels, probs = predictor.predict(img2, settings.top_k, settings.conf_thres)
+            boxes, labels, probs = predictor.predict(img, settings.top_k, settings.conf_thres, size=size)
             #interval = timer.end("default")
             #print('Time: {:.2f}s, Detect Objects: {:d}.'.format(interval, labels.size(0)))
 
             frame_index += 1
             timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-            action = json.dumps({'Left':"", 'Right':""})
-
-            text = {'Left': "", 'Right': ""}
-            for i in range(boxes.size(0)):
-                box = boxes[i, :]
-                label = f"{class_names[labels[i]]}: {probs[i]:.2f}"
-                label_name = class_names[labels[i]]
-
-                if label_name == "hand_0":
-                    text["Right"] = '0'
-                    text["Left"] = '0'
-                elif label_name == "hand_1":
-                    text["Right"] = '1'
-                    text["Left"] = '1'
-                elif label_name == "hand_2":
-                    text["Right"] = '2'
-                    text["Left"] = '2'
-                elif label_name == "hand_3":
-                    text["Right"] = '3'
-                    text["Left"] = '3'
-                elif label_name == "hand_4":
-                    text["Right"] = '4'
-                    text["Left"] = '4'
-                elif label_name == "hand_5":
-                    text["Right"] = '5'
-                    text["Left"] = '5'
-                elif label_name == "hand_6":
-                    text["Right"] = '6'
-                    text["Left"] = '6'
-                elif label_name == "hand_7":
-                    text["Right"] = '7'
-                    text["Left"] = '7'
-                # elif label_name == "rhand_8":
-                #     text["Right"] = '8'
-                # elif label_name == "rhand_9":
-                #     text["Right"] = '9'
-                # elif label_name == "lhand_0":
-                #     text["Left"] = '0'
-                # elif label_name == "lhand_1":
-                #     text["Left"] = '1'
-                # elif label_name == "lhand_2":
-                #     text["Left"] = '2'
-                # elif label_name == "lhand_3":
-                #     text["Left"] = '3'
-                # elif label_name == "lhand_4":
-                #     text["Left"] = '4'
-                # elif label_name == "lhand_5":
-                #     text["Left"] = '5'
-                # elif label_name == "lhand_6":
-                #     text["Left"] = '6'
-                # elif label_name == "lhand_7":
-                #     text["Left"] = '7'
-                # elif label_name == "lhand_8":
-                #     text["Left"] = '8'
-                # elif label_name == "lhand_9":
-                #     text["Left"] = '9'
-
-            action = json.dumps(text)
-            print("frame_index: {}, action: {}".format(frame_index, action))
+            # 類別到動作的JSON在啟動時就建好，回覆時只查表
+            action = actions.action(labels.tolist())
+
+            if settings.is_debug:
+                print("frame_index: {}, action: {}".format(frame_index, action))
+            latencies.record(time.monotonic() - start)
             return gesture_pb2.RecognitionReply(
                 frame_index=frame_index,
                 timestamp=timestamp,
@@ -134,12 +82,20 @@ class GestureRecognitionService(gesture_pb2_grpc.GestureRecognitionServicer):
             return gesture_pb2.RecognitionReply(
                 frame_index=0,
                 timestamp="",
-                action=json.dumps({'Left':"",'Right':""}))
+                action=actions.empty)
+        finally:
+            metrics.request_finished(time.monotonic() - start)
 
 
 def serve():
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    health_pb2_grpc.add_HealthServicer_to_server(HealthServicer(), server)    
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    # 沒有queue，只依預熱與p99延遲判斷
+    monitor = ReadinessMonitor(health_servicer, latencies=latencies,
+                               max_p99_latency=settings.health_max_p99_latency,
+                               interval=settings.health_interval)
+    metrics.start_metrics_server(settings.metrics_port)
     gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(
         GestureRecognitionService(), server
     )
@@ -148,7 +104,14 @@ def serve():
     server.add_insecure_port("[::]:" + settings.gRPC_port)
     server.start()
     print("Server started, listening on " + settings.gRPC_port)
-    server.wait_for_termination()
+    warm_up(predictor, 1)
+    ready.set()
+    monitor.mark_ready()
+    monitor.start()
+    try:
+        server.wait_for_termination()
+    finally:
+        monitor.close()
 
 
 if __name__ == "__main__":
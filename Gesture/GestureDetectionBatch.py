@@ -1,103 +1,141 @@
-import json
-import base64
 import threading
 import queue
 from concurrent import futures
-from grpc_health.v1 import health_pb2_grpc, health_pb2
+from grpc_health.v1 import health, health_pb2_grpc
 import grpc
 import gesture_pb2
 import gesture_pb2_grpc
 import time
-import cv2
-import numpy as np
 from datetime import datetime
 import traceback
 
-from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+import metrics
+from actions import ActionTable
+from model_loader import load_class_names, load_predictor, warm_up
 from vision.utils.misc import Timer
+from batching import ResponseTable, ResponseTableFull, time_remaining
+from frames import FrameDecodeError, FrameDecoder, encodings_metadata
 from config import settings
+from health import LatencyWindow, ReadinessMonitor
 
 # 模型與預測器
-class_names = [name.strip() for name in open(settings.label_path).readlines()]
-net = create_mobilenetv1_ssd(len(class_names), is_test=True)
-net.load(settings.weights)
-predictor = create_mobilenetv1_ssd_predictor(net, candidate_size=200)
+class_names = load_class_names()
+predictor = load_predictor(len(class_names))
+actions = ActionTable(class_names)
 
 # queue 與設定
 request_queue = queue.Queue()
-response_map = {}
+response_table = ResponseTable(settings.max_pending_responses)
 BATCH_SIZE = 5
 MAX_WAIT_TIME = 0.05
+frame_decoder = FrameDecoder(predictor.size, BATCH_SIZE)
 
 frame_index = 0
 timer = Timer()
 
-class HealthServicer(health_pb2_grpc.HealthServicer):
-    def Check(self, request, context):
-        return health_pb2.HealthCheckResponse(status=health_pb2.HealthCheckResponse.SERVING)
+latencies = LatencyWindow(settings.health_window)  # 最近請求的延遲，health依其p99判斷是否過載
 
 def batch_worker():
     global frame_index
     while True:
-        batch = []
+        batch = frame_decoder.buffer(BATCH_SIZE)
+        sizes = []
         ids = []
         timestamps = []
         start_time = time.time()
 
-        while len(batch) < BATCH_SIZE and (time.time() - start_time) < MAX_WAIT_TIME:
+        while len(ids) < BATCH_SIZE and (time.time() - start_time) < MAX_WAIT_TIME:
             try:
-                req_id, image_bytes = request_queue.get(timeout=MAX_WAIT_TIME)
-                nparr = np.frombuffer(image_bytes, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                batch.append(img)
+                req_id, request = request_queue.get(timeout=MAX_WAIT_TIME)
+                if not response_table.is_pending(req_id):  # client已離線
+                    continue
+                try:
+                    with metrics.stage_timer("decode"):
+                        _, size = frame_decoder.decode(request, batch[len(ids)])
+                except Exception as e:
+                    # 只讓這個請求失敗，batch執行緒繼續運作
+                    response_table.fail(req_id, e)
+                    continue
+                sizes.append(size)
                 ids.append(req_id)
                 timestamps.append(datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
             except queue.Empty:
                 break
 
-        if not batch:
+        if not ids:
             continue
 
-        results = predictor.predict_batch(batch, top_k=settings.top_k, prob_threshold=settings.conf_thres)
+        try:
+            results = predictor.predict_batch(batch[:len(ids)], top_k=settings.top_k,
+                                              prob_threshold=settings.conf_thres, sizes=sizes)
+        except Exception as e:
+            traceback.print_exc()
+            for req_id in ids:
+                response_table.fail(req_id, e)
+            continue
 
         for i, (boxes, labels, probs) in enumerate(results):
             frame_index += 1
-            text = {'Left': "", 'Right': ""}
-            for j in range(boxes.size(0)):
-                label_name = class_names[labels[j]]
-                digit = label_name.split("_")[-1]
-                text["Left"] = digit
-                text["Right"] = digit
-
-            action = json.dumps(text)
-            response_map[ids[i]] = gesture_pb2.RecognitionReply(
+            response_table.resolve(ids[i], gesture_pb2.RecognitionReply(
                 frame_index=frame_index,
                 timestamp=timestamps[i],
-                action=action
-            )
+                action=actions.action(labels.tolist())
+            ))
+
+
+def request_finished(seconds):
+    latencies.record(seconds)
+    metrics.request_finished(seconds)
 
-# 啟動 batch 執行緒
-threading.Thread(target=batch_worker, daemon=True).start()
 
 class GestureRecognitionService(gesture_pb2_grpc.GestureRecognitionServicer):
     def Recognition(self, request, context):
-        req_id = str(time.time()) + "_" + str(threading.get_ident())
-        image_bytes = base64.b64decode(request.image)
-        request_queue.put((req_id, image_bytes))
-
-        while True:
-            if req_id in response_map:
-                return response_map.pop(req_id)
-            time.sleep(0.005)
+        try:
+            req_id, future = response_table.register()
+        except ResponseTableFull as e:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(e))
+        start = time.monotonic()
+        metrics.request_started()
+        future.add_done_callback(lambda _: request_finished(time.monotonic() - start))
+        # RPC結束(完成、取消或斷線)時移除尚未回覆的請求
+        context.add_callback(lambda: response_table.evict(req_id))
+        if request.encoding == gesture_pb2.ENCODING_BASE64:
+            context.send_initial_metadata(encodings_metadata())
+        request_queue.put((req_id, request))
+
+        try:
+            return future.result(timeout=time_remaining(context))
+        except FrameDecodeError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        except futures.TimeoutError:
+            response_table.evict(req_id)
+            context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "no response before deadline")
+        except futures.CancelledError:
+            context.abort(grpc.StatusCode.CANCELLED, "request cancelled")
 
 def serve():
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    health_pb2_grpc.add_HealthServicer_to_server(HealthServicer(), server)
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    # 預熱完成前health回報NOT_SERVING，之後依等待回覆的請求數與p99延遲判斷
+    monitor = ReadinessMonitor(health_servicer, queue_depth=lambda: len(response_table), latencies=latencies,
+                               max_queue_depth=settings.health_max_queue_depth,
+                               max_p99_latency=settings.health_max_p99_latency,
+                               interval=settings.health_interval)
+    metrics.start_metrics_server(settings.metrics_port, queue_depth=lambda: len(response_table))
     gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(GestureRecognitionService(), server)
     server.add_insecure_port("[::]:" + settings.gRPC_port)
     server.start()
     print("Server started on port", settings.gRPC_port)
-    server.wait_for_termination()
+    warm_up(predictor, BATCH_SIZE)
+    # 預熱完成後才啟動 batch 執行緒，先到的請求留在queue中
+    threading.Thread(target=batch_worker, daemon=True).start()
+    monitor.mark_ready()
+    monitor.start()
+    try:
+        server.wait_for_termination()
+    finally:
+        monitor.close()
 
 if __name__ == "__main__":
     try:
@@ -1,22 +1,14 @@
 import cv2
 import copy
-import base64
 import grpc
 import gesture_pb2
 import gesture_pb2_grpc
 
 from config import settings
+from frames import encode_image, negotiate_encoding
+from gesture_client import GestureClient, load_video_frames, run_loadgen
 
-def cv2_base64(image):
-    base64_str = cv2.imencode('.jpg', image)[1].tostring()
-    base64_str = base64.b64encode(base64_str)
-
-    return base64_str
-
-
-def run():
-    frame_count = 0  # count no of frames
-
+def open_capture():
     if settings.source.isnumeric():
         cap = cv2.VideoCapture(int(settings.source))  # pass video to videocapture object
     else:
@@ -29,9 +21,23 @@ def run():
         print('Error while trying to read video. Please check path again')
         raise SystemExit()
 
-    else:
-        frame_width = int(cap.get(3))  # get video frame width
-        frame_height = int(cap.get(4))  # get video frame height
+    return cap
+
+
+def create_client():
+    return GestureClient(settings.server_host + ":" + settings.gRPC_port,
+                         num_channels=settings.client_channels,
+                         window=settings.client_window,
+                         encoding=settings.image_encoding)
+
+
+def run():
+    frame_count = 0  # count no of frames
+    client = create_client()  # 整個程式共用同一組連線
+
+    cap = open_capture()
+    frame_width = int(cap.get(3))  # get video frame width
+    frame_height = int(cap.get(4))  # get video frame height
 
     while (cap.isOpened):  # loop until cap opened or video not complete
 
@@ -43,18 +49,60 @@ def run():
             raw_image = frame  # store frame
             im0 = copy.deepcopy(frame)
 
-            encoded_string = cv2_base64(frame)  # 將frame轉成bytearray
-
-            # build connect with grpc server 50051 is the default port used for grpc
-            channel = grpc.insecure_channel("localhost:"+settings.gRPC_port)
-            stub = gesture_pb2_grpc.GestureRecognitionStub(channel)
-            response = stub.Recognition(gesture_pb2.RecognitionRequest(image=encoded_string))
+            # 第一張frame用base64傳送，再依伺服器回傳的metadata決定編碼
+            response = client.recognize(frame)
             print("Client received: " + response.action)
 
         cv2.imshow('annotated', frame)
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
+    client.close()
+
+
+def run_stream():
+    cap = open_capture()
+    latest = {'frame': None}
+
+    def frames():
+        encoding = None
+        while cap.isOpened():
+            ret, frame = cap.read()
+            if not ret:
+                break
+            latest['frame'] = frame
+            if encoding is None:
+                yield encode_image(frame, "base64")
+                encoding = negotiate_encoding(responses.initial_metadata(), settings.image_encoding)
+            else:
+                yield encode_image(frame, encoding)
+
+    # 整段影像共用一條stream，每張frame不再重新建立連線與RPC
+    channel = grpc.insecure_channel(settings.server_host + ":" + settings.gRPC_port)
+    stub = gesture_pb2_grpc.GestureRecognitionStub(channel)
+    responses = stub.RecognitionStream(frames())
+    for response in responses:
+        print("Client received: {} (frame {})".format(response.action, response.frame_index))
+        if latest['frame'] is not None:
+            cv2.imshow('annotated', latest['frame'])
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            responses.cancel()
+            break
+    channel.close()
+
+
+def run_loadgen_report():
+    frames = load_video_frames(settings.source)
+    with create_client() as client:
+        report = run_loadgen(client, frames, settings.loadgen_fps, settings.loadgen_duration)
+    print("sent {sent}, completed {completed}, errors {errors}".format(**report))
+    print("throughput {achieved_fps:.1f}/{offered_fps:.1f} FPS, "
+          "latency p50 {p50_ms:.1f} ms, p95 {p95_ms:.1f} ms, p99 {p99_ms:.1f} ms".format(**report))
 
 
 if __name__ == "__main__":
-    run()
+    if settings.loadgen_fps > 0:
+        run_loadgen_report()
+    elif settings.client_streaming:
+        run_stream()
+    else:
+        run()
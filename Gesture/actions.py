@@ -0,0 +1,55 @@
+import json
+import re
+
+# rhand_3：右手3、lhand_3：左手3、hand_3：不分左右，兩手都回報3
+HAND_LABEL = re.compile(r"^(?P<hand>[rl]?)hand_(?P<gesture>\w+)$")
+
+
+def hand_gestures(label_name):
+    """(left, right) gesture a class reports; "" for a hand it says nothing about."""
+    match = HAND_LABEL.match(label_name)
+    if match is None:
+        # 其他類別沿用底線後的字串，左右手相同
+        gesture = label_name.split("_")[-1]
+        return gesture, gesture
+    gesture = match.group("gesture")
+    hand = match.group("hand")
+    return ("" if hand == "r" else gesture), ("" if hand == "l" else gesture)
+
+
+def action_payload(left, right):
+    return json.dumps({"Left": left, "Right": right})
+
+
+class ActionTable:
+    """Class index -> action JSON of a RecognitionReply, computed once from the labels.
+
+    The payloads of single detections and of every left/right combination are
+    serialized up front, so building a reply is a list or dict lookup.
+    """
+
+    def __init__(self, class_names):
+        self.class_names = list(class_names)
+        self.gestures = [hand_gestures(name) for name in self.class_names]
+        self.empty = action_payload("", "")
+        self.single = [action_payload(left, right) for left, right in self.gestures]
+        lefts = {""} | {left for left, _ in self.gestures}
+        rights = {""} | {right for _, right in self.gestures}
+        self.combined = {(left, right): action_payload(left, right) for left in lefts for right in rights}
+
+    def action(self, labels):
+        """Action JSON for the class indexes detected in one frame.
+
+        Later detections override earlier ones hand by hand, like the original
+        per-detection loop.
+        """
+        if not labels:
+            return self.empty
+        if len(labels) == 1:
+            return self.single[labels[0]]
+        left = right = ""
+        for label in labels:
+            label_left, label_right = self.gestures[label]
+            left = label_left or left
+            right = label_right or right
+        return self.combined[left, right]
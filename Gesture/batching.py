@@ -0,0 +1,261 @@
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent import futures
+
+
+# grpc回報的剩餘時間大於此值視為client未設定deadline
+NO_DEADLINE = 24 * 60 * 60
+
+
+class DeadlineExceeded(Exception):
+    """The request expired while waiting in the batch queue."""
+
+
+class _BatchItem:
+    __slots__ = ("payload", "future", "deadline", "enqueued")
+
+    def __init__(self, payload, deadline):
+        self.payload = payload
+        self.future = futures.Future()
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+
+
+def time_remaining(context):
+    """Return the seconds left before the call's deadline, or None without one.
+
+    Sync gRPC reports an effectively infinite float for calls without a
+    deadline, which cannot be used as a wait timeout.
+    """
+    if context is None:
+        return None
+    remaining = context.time_remaining()
+    if remaining is None or remaining > NO_DEADLINE:
+        return None
+    return remaining
+
+
+def deadline_from_context(context):
+    """Convert the remaining time of a gRPC call into a monotonic deadline.
+
+    Returns None when the client did not set a deadline.
+    """
+    remaining = time_remaining(context)
+    if remaining is None:
+        return None
+    return time.monotonic() + remaining
+
+
+class DynamicBatcher:
+    """Collect single requests into batches and resolve them through futures.
+
+    A batch is closed as soon as `batch_limit` requests are waiting or the
+    oldest request has been queued for `max_delay` seconds, whichever comes
+    first. When `target_latency` is set the batch limit adapts to the measured
+    inference time: it grows by one while full batches finish under the target
+    and halves when a batch overshoots it.
+
+    Args:
+        handler: callable taking a list of payloads and returning one result (or
+            Exception instance) per payload. If None the owner drives the batcher
+            through next_batch() and complete().
+        max_batch_size: upper bound of the batch size.
+        max_delay: longest time (seconds) the oldest request may wait for a batch.
+        target_latency: per-batch latency budget (seconds) for adaptive sizing.
+        name: name of the worker thread.
+    """
+
+    def __init__(self, handler=None, max_batch_size=8, max_delay=0.005,
+                 target_latency=None, name="batcher"):
+        self.handler = handler
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_delay = max_delay
+        self.target_latency = target_latency
+        self.batch_limit = self.max_batch_size
+        self.latency_ewma = None  # 最近batch的推論時間(秒)
+        self.ewma_alpha = 0.2
+        self.dropped = 0
+        self.in_progress = 0  # 目前正在推論的batch大小
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self.name = name
+
+    @property
+    def queue_depth(self):
+        return len(self._items)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def start(self):
+        if self.handler is None:
+            raise ValueError("DynamicBatcher.start() needs a handler")
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def join(self, timeout=None):
+        """Wait for the worker thread to finish the requests queued before close()."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, payload, deadline=None):
+        """Queue a payload and return a concurrent.futures.Future for its result.
+
+        Args:
+            payload: the object handed to the batch handler.
+            deadline: absolute time.monotonic() after which the request is dropped.
+        """
+        item = _BatchItem(payload, deadline)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("DynamicBatcher is closed")
+            self._items.append(item)
+            self._cond.notify()
+        return item.future
+
+    def next_batch(self, timeout=None):
+        """Block until a batch is ready and return its live items.
+
+        Cancelled and expired requests are removed here so that they never reach
+        the model. Returns an empty list on timeout or after close().
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return []
+            if not self._items:
+                return []
+            limit = self.batch_limit
+            close_at = self._items[0].enqueued + self.max_delay
+            while len(self._items) < limit and not self._closed:
+                remaining = close_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._items.popleft() for _ in range(min(limit, len(self._items)))]
+
+        now = time.monotonic()
+        live = []
+        for item in batch:
+            if item.deadline is not None and item.deadline <= now:
+                self.dropped += 1
+                if item.future.set_running_or_notify_cancel():
+                    item.future.set_exception(DeadlineExceeded("request expired before inference"))
+            elif item.future.set_running_or_notify_cancel():
+                live.append(item)
+            else:
+                self.dropped += 1
+        return live
+
+    def complete(self, items, results, elapsed=None):
+        """Resolve the futures of a processed batch and update the batch limit.
+
+        An Exception instance in `results` fails only the matching request.
+        """
+        if elapsed is not None:
+            self._record_latency(len(items), elapsed)
+        for item, result in zip(items, results):
+            if isinstance(result, Exception):
+                item.future.set_exception(result)
+            else:
+                item.future.set_result(result)
+
+    def fail(self, items, exc):
+        for item in items:
+            item.future.set_exception(exc)
+
+    def _record_latency(self, batch_size, elapsed):
+        if self.latency_ewma is None:
+            self.latency_ewma = elapsed
+        else:
+            self.latency_ewma += self.ewma_alpha * (elapsed - self.latency_ewma)
+
+        if self.target_latency is None:
+            return
+        if self.latency_ewma > self.target_latency and self.batch_limit > 1:
+            self.batch_limit = max(1, self.batch_limit // 2)
+            self.latency_ewma = None  # 重新量測新的batch大小
+        elif (batch_size >= self.batch_limit and self.batch_limit < self.max_batch_size
+              and self.latency_ewma < 0.8 * self.target_latency):
+            self.batch_limit += 1
+
+    def _run(self):
+        while True:
+            items = self.next_batch()
+            if not items:
+                if self._closed:
+                    return
+                continue
+            start = time.monotonic()
+            self.in_progress = len(items)
+            try:
+                results = self.handler([item.payload for item in items])
+            except Exception as e:
+                self.fail(items, e)
+                continue
+            finally:
+                self.in_progress = 0
+            self.complete(items, results, time.monotonic() - start)
+
+
+class ResponseTableFull(Exception):
+    """Too many requests are already waiting for a response."""
+
+
+class ResponseTable:
+    """Bounded map from request id to the future that receives its response.
+
+    Request ids come from a counter instead of the clock so they never collide. Entries
+    are removed when they are resolved or when their client goes away, and at
+    most `max_entries` requests can be pending at the same time.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def register(self):
+        """Return a new (request_id, future) pair."""
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                raise ResponseTableFull(f"{len(self._entries)} requests pending")
+            req_id = next(self._ids)
+            future = futures.Future()
+            self._entries[req_id] = future
+        return req_id, future
+
+    def is_pending(self, req_id):
+        return req_id in self._entries
+
+    def resolve(self, req_id, result):
+        with self._lock:
+            future = self._entries.pop(req_id, None)
+        if future is not None and future.set_running_or_notify_cancel():
+            future.set_result(result)
+
+    def fail(self, req_id, exc):
+        with self._lock:
+            future = self._entries.pop(req_id, None)
+        if future is not None and future.set_running_or_notify_cancel():
+            future.set_exception(exc)
+
+    def evict(self, req_id):
+        with self._lock:
+            future = self._entries.pop(req_id, None)
+        if future is not None:
+            future.cancel()
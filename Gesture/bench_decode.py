@@ -0,0 +1,93 @@
+"""Compare the old and the new frame decode path, from request bytes to model input tensor.
+
+before: decode_image -> PredictionTransform (cv2.resize + float casts) per frame -> torch.cat
+after:  FrameDecoder (reduced-scale JPEG decode into a reused buffer) -> one batched upload
+
+    python bench_decode.py --video test.avi --batch 4
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import torch
+
+from frames import FrameDecoder, decode_image, encode_image
+from gesture_client import load_video_frames
+from vision.ssd.config import mobilenetv1_ssd_config as config
+from vision.ssd.data_preprocessing import DevicePredictionTransform, PredictionTransform
+
+
+def synthetic_frames(width, height, count=8):
+    rng = np.random.default_rng(0)
+    return [cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (31, 31), 10)
+            for _ in range(count)]
+
+
+def before_path():
+    transform = PredictionTransform(config.image_size, config.image_mean, config.image_std)
+
+    def run(batch):
+        images = [cv2.cvtColor(decode_image(request), cv2.COLOR_BGR2RGB) for request in batch]
+        return torch.cat([transform(image).unsqueeze(0) for image in images])
+    return run
+
+
+def after_path():
+    decoder = FrameDecoder(config.image_size)
+    transform = DevicePredictionTransform(config.image_size, config.image_mean, config.image_std)
+
+    def run(batch):
+        frames = decoder.buffer(len(batch))
+        for i, request in enumerate(batch):
+            decoder.decode(request, frames[i])
+        return transform(frames)
+    return run
+
+
+def measure(run, batches, repeat):
+    run(batches[0])  # 預熱
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for batch in batches:
+            run(batch)
+    latency = (time.perf_counter() - start) / (repeat * sum(len(batch) for batch in batches))
+
+    # numpy的配置會回報給tracemalloc，torch的CPU配置不會
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    for batch in batches:
+        run(batch)
+    snapshot_after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = snapshot_after.compare_to(snapshot_before, "filename")
+    num_frames = sum(len(batch) for batch in batches)
+    retained = sum(max(stat.count_diff, 0) for stat in stats)
+    return latency * 1000, retained / num_frames, peak / num_frames / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame decode benchmark")
+    parser.add_argument("--video", help="video file to take frames from (default: synthetic frames)")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--encoding", default="jpeg", choices=["jpeg", "png", "raw_bgr", "base64"])
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    frames = load_video_frames(args.video, 64) if args.video else synthetic_frames(args.width, args.height)
+    requests = [encode_image(frame, args.encoding) for frame in frames]
+    batches = [requests[i:i + args.batch] for i in range(0, len(requests), args.batch)]
+    print(f"{len(requests)} {args.encoding} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"batch {args.batch}")
+    for name, path in (("before", before_path), ("after", after_path)):
+        latency, retained, peak = measure(path(), batches, args.repeat)
+        print(f"{name:>6}: {latency:.2f} ms/frame, peak allocated {peak:.0f} KiB/frame, "
+              f"{retained:.1f} blocks/frame retained")
+
+
+if __name__ == "__main__":
+    main()
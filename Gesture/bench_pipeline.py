@@ -0,0 +1,83 @@
+"""Throughput of one GestureDetectionWorker with its stages run in turn and pipelined.
+
+sequential: decode, model and reply of a batch on the worker thread, one batch after another
+pipelined:  decode, infer and reply stages on their own threads (pipeline_depth), overlapping batches
+
+    weights=models/mb1-ssd.pth python bench_pipeline.py --video test.avi --batch 4 --depth 2
+
+Without a weights setting a randomly initialized model is used; the timings
+are the same, only the detections are meaningless. Stage utilization is the
+fraction of the run a stage thread spent working; their sum above 1 is the
+overlap the pipeline gained.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from bench_decode import synthetic_frames
+from config import settings
+from frames import encode_image
+from gesture_client import load_video_frames
+from GestureBatchNew import GestureDetectionWorker
+from model_loader import load_class_names
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd
+
+
+def random_weights():
+    path = os.path.join(tempfile.mkdtemp(), "random-ssd.pth")
+    create_mobilenetv1_ssd(len(load_class_names())).save(path)
+    return path
+
+
+def measure(depth, requests, repeat):
+    settings.pipeline_depth = depth
+    worker = GestureDetectionWorker(0).start()
+    try:
+        for future in [worker.submit(request) for request in requests]:  # 預熱batcher與各執行緒
+            future.result()
+        busy_before = dict(worker.pipeline.busy) if worker.pipeline else {}
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for future in [worker.submit(request) for request in requests]:
+                future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        worker.batcher.close()
+    utilization = {name: (busy - busy_before[name]) / elapsed for name, busy in worker.pipeline.busy.items()} \
+        if worker.pipeline else {}
+    return repeat * len(requests) / elapsed, utilization
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker pipeline throughput benchmark")
+    parser.add_argument("--video", help="video file to take frames from (default: synthetic frames)")
+    parser.add_argument("--width", type=int, default=540)
+    parser.add_argument("--height", type=int, default=310)
+    parser.add_argument("--encoding", default="jpeg", choices=["jpeg", "png", "raw_bgr", "base64"])
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=2, help="pipeline_depth of the pipelined run")
+    parser.add_argument("--frames", type=int, default=64, help="frames submitted at once")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists(settings.weights):
+        settings.weights = random_weights()
+    settings.batch_size = args.batch
+    settings.target_batch_latency = None  # 固定batch大小，兩種模式才好比較
+    frames = load_video_frames(args.video, args.frames) if args.video else synthetic_frames(args.width, args.height)
+    requests = [encode_image(frames[i % len(frames)], args.encoding) for i in range(args.frames)]
+    print(f"{len(requests)} {args.encoding} frames of {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"batch {args.batch}, {settings.weights}")
+
+    for name, depth in (("sequential", 0), ("pipelined", args.depth)):
+        fps, utilization = measure(depth, requests, args.repeat)
+        line = f"{name:>10}: {fps:.1f} frames/s"
+        if utilization:
+            stages = ", ".join(f"{stage} {busy:.0%}" for stage, busy in utilization.items())
+            line += f" (stage utilization {stages}; overlap {sum(utilization.values()):.2f})"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic.v1 import BaseSettings
 import numpy as np
 
@@ -6,8 +8,26 @@ class Settings(BaseSettings):
     source: str = '0'
     device: str = '0'  # device arugments 使用GPU填裝置索引值'0'  使用CPU填'cpu'
     weights: str = 'mb1-ssd-best.pth'
+    model_format: str = 'pth'  # 'pth' 或 'torchscript'(export_model.py或quantize_model.py匯出的檔案)
+    backend: str = 'torch'  # 'torch' 或 'onnxruntime'(weights為export_model.py onnx匯出的.onnx檔，CPU執行)
+    ort_intra_op_threads: int = 0  # onnxruntime單一運算子的執行緒數，0為預設；多個worker時建議設為核心數/num_workers
+    ort_inter_op_threads: int = 0  # onnxruntime同時執行不同運算子的執行緒數，0為預設(依序執行)
+    ort_io_binding: bool = True  # 以IO binding讓onnxruntime直接讀寫torch tensor的記憶體
 
     gRPC_port: str = '50051'
+    server_host: str = 'localhost'  # client連線的gesture服務位址
+    client_streaming: bool = False  # client使用RecognitionStream傳送frame
+    client_channels: int = 2  # client連線池的channel數
+    client_window: int = 8  # client同時等待回覆的請求上限
+    loadgen_fps: float = 0  # >0時client以此FPS重播source影片做壓力測試
+    loadgen_duration: float = 30.0  # 壓力測試秒數
+    image_encoding: str = 'jpeg'  # client偏好的影像編碼: 'base64', 'jpeg', 'png', 'raw_bgr'
+    server_mode: str = 'thread'  # 'thread': grpc.server + ThreadPoolExecutor, 'aio': grpc.aio (GestureBatchNew)
+    # thread模式的handler執行緒數；每條開著的RecognitionStream佔住一個執行緒，大量長時間的stream請用server_mode='aio'
+    grpc_max_workers: int = 10
+    grpc_max_concurrent_rpcs: Optional[int] = None  # thread模式同時處理的RPC上限，超過的立即回RESOURCE_EXHAUSTED；None為grpc_max_workers
+    aio_max_concurrent_rpcs: Optional[int] = None  # aio模式同時處理的RPC上限，None為不限制
+    aio_max_concurrent_streams: int = 4096  # 每條HTTP/2連線的stream上限
 
     net_type = 'mb1-ssd'
     label_path = 'voc-model-labels.txt'
@@ -24,6 +44,13 @@ class Settings(BaseSettings):
     conf_thres: float = 0.40
     iou_thres: float = 0.65
     top_k: int = 1
+    nms_backend: str = 'matrix'  # 'matrix' 或 'torchvision'(需安裝torchvision)
+    device_preprocess: bool = False  # 在GPU上整批做resize與正規化
+    precision: str = 'fp32'  # 'fp32'、'fp16'、'bf16' 或 'auto'，CPU上會退回bf16或fp32
+    channels_last: bool = False  # 以NHWC記憶體配置推論
+    fuse_conv_bn: bool = False  # 將MobileNetV1的Conv+BN+ReLU融合成單一卷積
+    torch_compile: bool = False  # 以torch.compile編譯模型
+    warmup_iterations: int = 2  # 啟動時每種batch大小的預熱次數，完成前health回報NOT_SERVING
     # classes: int = None
 
     # 除錯用設定
@@ -44,8 +71,30 @@ class Settings(BaseSettings):
     # class Config:
     #    env_file = "env.txt"
 
-    batch_size: int = 2
-    queue_timeout: float = 0.05
+    batch_size: int = 2  # 每個batch的最大張數
+    queue_timeout: float = 0.05  # 最早進入queue的請求最多等待湊batch的秒數
+    target_batch_latency: Optional[float] = None  # 自適應batch大小的推論時間目標(秒)，例如0.05；None為關閉
     num_workers: int = 3
+    worker_mode: str = 'thread'  # 'thread' 或 'process'(每個worker一個程序，透過shared memory傳frame)
+    worker_ring_slots: int = 16  # process模式下每個worker的frame slot數
+    share_weights: bool = False  # thread模式的worker共用同一份模型權重，GPU上各用一條CUDA stream
+    pipeline_depth: int = 0  # >0時thread worker的解碼、推論、回覆各在一個執行緒重疊進行，階段前最多排隊幾個batch；0為依序執行
+    routing_policy: str = 'least_queue'  # 'round_robin'、'least_queue'、'power_of_two' 或 'ewma_latency'
+    max_pending_responses: int = 256  # 等待回覆的請求上限
+    stream_window: int = 4  # RecognitionStream每條stream同時處理中的frame上限
+    temporal_cache: bool = False  # 同一個client連續幾乎相同的frame直接沿用上一次的辨識結果
+    temporal_threshold: int = 8  # frame簽章(256位元dHash)相差不超過此位元數視為相同
+    temporal_refresh_frames: int = 5  # 連續沿用幾張後強制重新推論
+    roi_tracking: bool = False  # 只在上一張偵測到的手附近裁切後偵測(僅worker_mode='thread')
+    roi_margin: float = 0.5  # 手的框往四周各擴大其寬高的比例
+    roi_min_height: int = 150  # 裁切區域的最小高度(像素)，寬度依frame比例
+    roi_refresh_frames: int = 10  # 連續裁切幾張後改用整張frame重新偵測
+
+    # health狀態：預熱完成且未過載時才回報SERVING，上限為0時不檢查該項
+    health_max_queue_depth: int = 32  # 排隊與推論中的請求數超過此值回報NOT_SERVING
+    health_max_p99_latency: float = 1.0  # 最近請求的p99延遲(秒)超過此值回報NOT_SERVING
+    health_window: float = 10.0  # 計算p99延遲的時間窗(秒)
+    health_interval: float = 1.0  # 重新評估health狀態的間隔(秒)
+    metrics_port: int = 8000  # Prometheus /metrics的HTTP port，0為關閉；process模式需設PROMETHEUS_MULTIPROC_DIR才含各worker程序
 
 settings = Settings()
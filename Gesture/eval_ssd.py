@@ -0,0 +1,115 @@
+"""Compare the VOC average precision of an optimized predictor with the fp32 baseline.
+
+    python eval_ssd.py --dataset /data/VOC2007 --precision auto --channels_last --fuse
+"""
+import argparse
+from collections import defaultdict
+
+import numpy as np
+import torch
+
+from config import settings
+from model_loader import load_class_names
+from vision.datasets.voc_dataset import VOCDataset
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+from vision.utils import box_utils, measurements
+
+
+def average_precision(ground_truth, detections, iou_threshold=0.5, use_2007_metric=True):
+    """AP of one class.
+
+    Args:
+        ground_truth: {image_index: (boxes (n, 4) tensor, difficult (n,) bool array)}.
+        detections: list of (image_index, prob, box (4,) tensor).
+    """
+    num_true = sum(int((~difficult).sum()) for _, difficult in ground_truth.values())
+    if num_true == 0:
+        return float("nan")
+    detections = sorted(detections, key=lambda detection: -detection[1])
+    true_positive = np.zeros(len(detections))
+    false_positive = np.zeros(len(detections))
+    matched = defaultdict(set)
+    for k, (image_index, _, box) in enumerate(detections):
+        if image_index not in ground_truth:
+            false_positive[k] = 1
+            continue
+        gt_boxes, difficult = ground_truth[image_index]
+        ious = box_utils.iou_of(box.unsqueeze(0), gt_boxes)
+        max_iou, j = ious.max(0)
+        j = j.item()
+        if max_iou.item() <= iou_threshold:
+            false_positive[k] = 1
+        elif difficult[j]:
+            continue
+        elif j in matched[image_index]:
+            false_positive[k] = 1
+        else:
+            true_positive[k] = 1
+            matched[image_index].add(j)
+
+    true_positive = true_positive.cumsum()
+    false_positive = false_positive.cumsum()
+    precision = true_positive / np.maximum(true_positive + false_positive, np.finfo(np.float64).eps)
+    recall = true_positive / num_true
+    if use_2007_metric:
+        return measurements.compute_voc2007_average_precision(precision, recall)
+    return measurements.compute_average_precision(precision, recall)
+
+
+def evaluate(predictor, dataset, class_names, iou_threshold=0.5, use_2007_metric=True):
+    """Per-class AP of `predictor` on a VOCDataset, keyed by the model's class names."""
+    ground_truth = defaultdict(dict)
+    detections = defaultdict(list)
+    for i in range(len(dataset)):
+        _, (gt_boxes, gt_labels, difficult) = dataset.get_annotation(i)
+        for name in set(dataset.class_names[label] for label in gt_labels):
+            mask = np.array([dataset.class_names[label] == name for label in gt_labels])
+            ground_truth[name][i] = (torch.from_numpy(gt_boxes[mask]), difficult[mask].astype(bool))
+
+        boxes, labels, probs = predictor.predict(dataset.get_image(i))
+        for box, label, prob in zip(boxes, labels.tolist(), probs.tolist()):
+            detections[class_names[label]].append((i, prob, box.float()))
+
+    return {name: average_precision(ground_truth[name], detections[name], iou_threshold, use_2007_metric)
+            for name in class_names[1:]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSD accuracy of inference optimizations against fp32")
+    parser.add_argument("--dataset", required=True, help="VOC-style dataset root (ImageSets/Main/test.txt)")
+    parser.add_argument("--weights", default=None, help="model weights (default: settings.weights)")
+    parser.add_argument("--label_file", default=None, help="model labels (default: settings.label_path)")
+    parser.add_argument("--precision", default="auto", choices=["fp32", "fp16", "bf16", "auto"])
+    parser.add_argument("--channels_last", action="store_true")
+    parser.add_argument("--fuse", action="store_true", help="fuse Conv+BN+ReLU in the base net")
+    parser.add_argument("--iou_threshold", type=float, default=0.5)
+    parser.add_argument("--use_2007_metric", type=int, default=1)
+    args = parser.parse_args()
+
+    class_names = load_class_names(args.label_file)
+    dataset = VOCDataset(args.dataset, is_test=True)
+
+    def build(**options):
+        net = create_mobilenetv1_ssd(len(class_names), is_test=True)
+        net.load(args.weights or settings.weights)
+        return create_mobilenetv1_ssd_predictor(net, **options)
+
+    baseline = evaluate(build(), dataset, class_names, args.iou_threshold, args.use_2007_metric)
+    optimized_predictor = build(precision=args.precision, channels_last=args.channels_last, fuse=args.fuse)
+    optimized = evaluate(optimized_predictor, dataset, class_names, args.iou_threshold, args.use_2007_metric)
+
+    print_report(class_names, baseline, optimized, str(optimized_predictor.dtype).split('.')[-1])
+
+
+def print_report(class_names, baseline, optimized, label):
+    """Print the per-class AP and mAP of an optimized model next to the fp32 baseline."""
+    print(f"{'class':<16}{'fp32':>10}{label:>10}")
+    for name in class_names[1:]:
+        print(f"{name:<16}{baseline[name]:>10.4f}{optimized[name]:>10.4f}")
+    baseline_map = np.nanmean(list(baseline.values()))
+    optimized_map = np.nanmean(list(optimized.values()))
+    print(f"{'mAP':<16}{baseline_map:>10.4f}{optimized_map:>10.4f}  (delta {optimized_map - baseline_map:+.4f})")
+
+
+if __name__ == "__main__":
+    main()
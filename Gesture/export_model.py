@@ -0,0 +1,131 @@
+"""Export the gesture SSD so the servers can load it without rebuilding it in Python.
+
+    python export_model.py torchscript --weights mb1-ssd-best.pth --output mb1-ssd.pt --fuse
+    weights=mb1-ssd.pt model_format=torchscript python GestureBatchNew.py
+
+    python export_model.py onnx --weights mb1-ssd-best.pth --output mb1-ssd.onnx
+    weights=mb1-ssd.onnx backend=onnxruntime python GestureBatchNew.py
+
+The exported graph contains the whole SSD.forward of the test model, including
+the softmax and the prior-box decoding.
+"""
+import argparse
+import inspect
+import json
+
+import torch
+
+from config import settings
+from model_loader import MODEL_METADATA_FILE, default_device, load_class_names
+from vision.nn.mobilenet import fuse_conv_bn_relu
+from vision.ssd.config import mobilenetv1_ssd_config as config
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd
+from vision.ssd.predictor import resolve_dtype
+
+
+def build_test_net(num_classes, weights, device, precision="fp32", channels_last=False, fuse=True):
+    """Return (net, dtype, memory_format) ready for export, in eval mode on `device`."""
+    net = create_mobilenetv1_ssd(num_classes, is_test=True)
+    net.load(weights)
+    net.priors = net.priors.to(device)
+    net.eval()
+    if fuse:
+        fuse_conv_bn_relu(net.base_net)
+    dtype = resolve_dtype(precision, device)
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    net.to(device=device, dtype=dtype, memory_format=memory_format)
+    return net, dtype, memory_format
+
+
+def export_torchscript(num_classes, weights, output, device=None, precision="fp32", channels_last=False,
+                       fuse=True, batch_size=2, freeze=True):
+    """Trace the test-mode SSD and save it with its export options as metadata."""
+    device = torch.device(device) if device is not None else default_device()
+    net, dtype, memory_format = build_test_net(num_classes, weights, device, precision, channels_last, fuse)
+    example = torch.zeros(batch_size, 3, config.image_size, config.image_size, device=device, dtype=dtype)
+    example = example.contiguous(memory_format=memory_format)
+    metadata = {
+        "format": "torchscript",
+        "num_classes": num_classes,
+        "image_size": config.image_size,
+        "dtype": str(dtype).replace("torch.", ""),
+        "channels_last": channels_last,
+        "fused": fuse,
+        "device": device.type,
+    }
+    save_torchscript(net, example, output, metadata, freeze)
+    return metadata
+
+
+def save_torchscript(net, example, output, metadata, freeze=True):
+    """Trace `net` on `example` and save it with `metadata` for model_loader.load_torchscript."""
+    with torch.no_grad():
+        module = torch.jit.trace(net, example)
+        if freeze:
+            # 權重與priors成為常數，可再做常數折疊
+            module = torch.jit.freeze(module)
+    torch.jit.save(module, output, _extra_files={MODEL_METADATA_FILE: json.dumps(metadata)})
+
+
+def export_onnx(num_classes, weights, output, fuse=True, batch_size=2, opset_version=17):
+    """Export the test-mode SSD as an fp32 ONNX graph with a dynamic batch dimension."""
+    import onnx
+
+    device = torch.device("cpu")
+    net, _, _ = build_test_net(num_classes, weights, device, fuse=fuse)
+    example = torch.zeros(batch_size, 3, config.image_size, config.image_size)
+    # torch 2.5起才有dynamo參數(且之後預設改用torch.export的匯出器)；Dockerfile的torch 2.4.1只有TorchScript匯出器
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(net, example, output, input_names=["images"], output_names=["scores", "boxes"],
+                          dynamic_axes={"images": {0: "batch"}, "scores": {0: "batch"}, "boxes": {0: "batch"}},
+                          opset_version=opset_version, **options)
+    metadata = {
+        "format": "onnx",
+        "num_classes": num_classes,
+        "image_size": config.image_size,
+        "dtype": "float32",
+        "channels_last": False,
+        "fused": fuse,
+        "device": device.type,
+    }
+    model = onnx.load(output)
+    onnx.helper.set_model_props(model, {MODEL_METADATA_FILE: json.dumps(metadata)})
+    onnx.save(model, output)
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the gesture SSD model")
+    subparsers = parser.add_subparsers(dest="format", required=True)
+
+    torchscript = subparsers.add_parser("torchscript", help="traced TorchScript module")
+    torchscript.add_argument("--weights", default=settings.weights, help="trained .pth weights")
+    torchscript.add_argument("--label_file", default=settings.label_path)
+    torchscript.add_argument("--output", default="mb1-ssd.pt")
+    torchscript.add_argument("--device", default=None, help="cpu or cuda:N (default: cuda if available)")
+    torchscript.add_argument("--precision", default="fp32", choices=["fp32", "fp16", "bf16", "auto"])
+    torchscript.add_argument("--channels_last", action="store_true")
+    torchscript.add_argument("--no_fuse", action="store_true", help="keep Conv+BN+ReLU unfused")
+    torchscript.add_argument("--no_freeze", action="store_true", help="keep weights as module parameters")
+
+    onnx = subparsers.add_parser("onnx", help="fp32 ONNX graph for the onnxruntime backend")
+    onnx.add_argument("--weights", default=settings.weights, help="trained .pth weights")
+    onnx.add_argument("--label_file", default=settings.label_path)
+    onnx.add_argument("--output", default="mb1-ssd.onnx")
+    onnx.add_argument("--opset", type=int, default=17)
+    onnx.add_argument("--no_fuse", action="store_true", help="keep Conv+BN+ReLU unfused")
+    args = parser.parse_args()
+
+    num_classes = len(load_class_names(args.label_file))
+    if args.format == "onnx":
+        metadata = export_onnx(num_classes, args.weights, args.output, fuse=not args.no_fuse,
+                               opset_version=args.opset)
+    else:
+        metadata = export_torchscript(num_classes, args.weights, args.output, args.device, args.precision,
+                                      args.channels_last, fuse=not args.no_fuse, freeze=not args.no_freeze)
+    print(f"saved {args.output}: {json.dumps(metadata)}")
+
+
+if __name__ == "__main__":
+    main()
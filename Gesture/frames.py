@@ -0,0 +1,223 @@
+import base64
+import binascii
+
+import cv2
+import numpy as np
+
+import gesture_pb2
+
+# 伺服器在initial metadata告知支援的編碼，client據此決定是否改送原始bytes
+ENCODINGS_METADATA_KEY = "x-gesture-image-encodings"
+SUPPORTED_ENCODINGS = ("base64", "jpeg", "png", "raw_bgr")
+
+ENCODING_BY_NAME = {
+    "base64": gesture_pb2.ENCODING_BASE64,
+    "jpeg": gesture_pb2.ENCODING_JPEG,
+    "png": gesture_pb2.ENCODING_PNG,
+    "raw_bgr": gesture_pb2.ENCODING_RAW_BGR,
+}
+
+
+class FrameDecodeError(ValueError):
+    """The request does not contain a decodable image."""
+
+
+def encodings_metadata():
+    return ((ENCODINGS_METADATA_KEY, ",".join(SUPPORTED_ENCODINGS)),)
+
+
+# JPEG的SOF marker(C4、C8、CC不是SOF)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# libjpeg在解碼時直接做DCT縮放，比先完整解碼再縮小快很多
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                        (4, cv2.IMREAD_REDUCED_COLOR_4),
+                        (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+
+def _raw_bgr_image(request):
+    expected = request.width * request.height * 3
+    if request.width <= 0 or request.height <= 0 or len(request.image) != expected:
+        raise FrameDecodeError(f"raw BGR frame of {len(request.image)} bytes does not match "
+                               f"{request.width}x{request.height}")
+    return np.frombuffer(request.image, np.uint8).reshape(request.height, request.width, 3)
+
+
+def _encoded_bytes(request):
+    encoding = request.encoding
+    if encoding == gesture_pb2.ENCODING_BASE64:
+        try:
+            return base64.b64decode(request.image, validate=True)
+        except (binascii.Error, ValueError) as e:
+            raise FrameDecodeError(f"invalid base64 image: {e}") from e
+    if encoding in (gesture_pb2.ENCODING_JPEG, gesture_pb2.ENCODING_PNG):
+        return request.image
+    raise FrameDecodeError(f"unsupported image encoding {encoding}")
+
+
+def _imdecode(data, flags=cv2.IMREAD_COLOR):
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+    if image is None:
+        raise FrameDecodeError("cannot decode image")
+    return image
+
+
+def decode_image(request):
+    """Decode RecognitionRequest.image into a BGR uint8 image.
+
+    Requests without an encoding are treated as base64 JPEG so older clients keep
+    working.
+    """
+    if request.encoding == gesture_pb2.ENCODING_RAW_BGR:
+        return _raw_bgr_image(request)
+    return _imdecode(_encoded_bytes(request))
+
+
+def decode_thumbnail(request, width, height):
+    """Decode a request into a small grayscale (height, width) image.
+
+    JPEG frames are decoded at 1/8 scale, a small fraction of the cost of the
+    full decode; used for frame signatures rather than model input.
+    """
+    if request.encoding == gesture_pb2.ENCODING_RAW_BGR:
+        image = cv2.resize(_raw_bgr_image(request), (width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = _imdecode(_encoded_bytes(request), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    return cv2.resize(gray, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def jpeg_size(data):
+    """Read (width, height) from the SOF header of JPEG `data`, or None if it is not a JPEG."""
+    if data[:2] != b"\xff\xd8":
+        return None
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # 填充用的0xFF
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # 沒有長度欄位的marker
+            i += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height = int.from_bytes(data[i + 5:i + 7], "big")
+            width = int.from_bytes(data[i + 7:i + 9], "big")
+            return width, height
+        i += 2 + int.from_bytes(data[i + 2:i + 4], "big")
+    return None
+
+
+def reduced_decode_flag(width, height, size):
+    """Largest IMREAD_REDUCED_COLOR_* scale that still leaves at least size x size pixels."""
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if width // factor >= size and height // factor >= size:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def clip_crop(crop, frame_size):
+    """Integer (x0, y0, x1, y1) of `crop` inside a (width, height) frame, at least one pixel large."""
+    width, height = frame_size
+    x0 = min(max(int(crop[0]), 0), width - 1)
+    y0 = min(max(int(crop[1]), 0), height - 1)
+    x1 = min(max(int(round(crop[2])), x0 + 1), width)
+    y1 = min(max(int(round(crop[3])), y0 + 1), height)
+    return x0, y0, x1, y1
+
+
+class FrameDecoder:
+    """Decode RecognitionRequests straight into size x size RGB model input.
+
+    JPEG frames are decoded at a reduced scale when they are at least twice the
+    model size, then resized once and converted to RGB in place, so the only
+    per-frame array is the reduced decode itself. buffer() hands out a reusable
+    (batch, size, size, 3) uint8 array that decode() writes into; one decoder must
+    not be shared between threads that use the buffer concurrently.
+
+    Args:
+        size: side of the model input.
+        capacity: initial number of frames in the reusable buffer.
+    """
+
+    def __init__(self, size=300, capacity=8):
+        self.size = size
+        self._buffer = np.empty((capacity, size, size, 3), np.uint8)
+
+    def buffer(self, num_frames):
+        if num_frames > len(self._buffer):
+            self._buffer = np.empty((num_frames, self.size, self.size, 3), np.uint8)
+        return self._buffer[:num_frames]
+
+    def decode(self, request, out=None):
+        """Decode one request into `out` (or a new array).
+
+        Returns:
+            (image, (width, height)): the RGB model input and the original frame size,
+            which the predictor needs to scale boxes back to the frame.
+        """
+        image, original_size = self._decode_bgr(request)
+        return self._model_input(image, out), original_size
+
+    def decode_crop(self, request, crop, out=None):
+        """Decode only the (x0, y0, x1, y1) `crop` of a request's frame into `out` (or a new array).
+
+        The crop alone is resized to the model input, so a hand in it keeps more
+        pixels than in the whole frame. It is clipped to the frame first.
+
+        Returns:
+            (image, (width, height), crop): the RGB model input, the original frame
+            size and the clipped crop, whose size and corner scale boxes back to the frame.
+        """
+        image, original_size = self._decode_bgr(request, crop)
+        crop = clip_crop(crop, original_size)
+        # 縮小解碼時crop座標跟著縮放
+        scale_x = image.shape[1] / original_size[0]
+        scale_y = image.shape[0] / original_size[1]
+        x0, y0 = int(crop[0] * scale_x), int(crop[1] * scale_y)
+        x1 = max(int(round(crop[2] * scale_x)), x0 + 1)
+        y1 = max(int(round(crop[3] * scale_y)), y0 + 1)
+        return self._model_input(image[y0:y1, x0:x1], out), original_size, crop
+
+    def _decode_bgr(self, request, crop=None):
+        """BGR image, decoded at the smallest scale that keeps the frame (or crop) above the model size."""
+        if request.encoding == gesture_pb2.ENCODING_RAW_BGR:
+            return _raw_bgr_image(request), (request.width, request.height)
+        data = _encoded_bytes(request)
+        original_size = jpeg_size(data)
+        if original_size is None:
+            image = _imdecode(data)
+            return image, (image.shape[1], image.shape[0])
+        width, height = original_size
+        if crop is not None:
+            x0, y0, x1, y1 = clip_crop(crop, original_size)
+            width, height = x1 - x0, y1 - y0
+        return _imdecode(data, reduced_decode_flag(width, height, self.size)), original_size
+
+    def _model_input(self, image, out):
+        if out is None:
+            out = np.empty((self.size, self.size, 3), np.uint8)
+        cv2.resize(image, (self.size, self.size), dst=out)
+        cv2.cvtColor(out, cv2.COLOR_BGR2RGB, dst=out)
+        return out
+
+
+def encode_image(image, encoding="jpeg"):
+    """Build a RecognitionRequest for a BGR image with the given encoding name."""
+    if encoding == "raw_bgr":
+        image = np.ascontiguousarray(image)
+        return gesture_pb2.RecognitionRequest(image=image.tobytes(), encoding=gesture_pb2.ENCODING_RAW_BGR,
+                                              width=image.shape[1], height=image.shape[0])
+    ext = ".png" if encoding == "png" else ".jpg"
+    data = cv2.imencode(ext, image)[1].tobytes()
+    if encoding == "base64":
+        data = base64.b64encode(data)
+    return gesture_pb2.RecognitionRequest(image=data, encoding=ENCODING_BY_NAME[encoding])
+
+
+def negotiate_encoding(initial_metadata, preferred):
+    """Pick the preferred encoding if the server advertised it, otherwise base64."""
+    for key, value in initial_metadata or ():
+        if key == ENCODINGS_METADATA_KEY and preferred in value.split(","):
+            return preferred
+    return "base64"
@@ -0,0 +1,222 @@
+import collections
+import itertools
+import math
+import threading
+import time
+
+import cv2
+import grpc
+
+import gesture_pb2_grpc
+from frames import encode_image, negotiate_encoding
+
+
+def channel_options(keepalive_ms=10000, keepalive_timeout_ms=5000):
+    return [
+        ("grpc.keepalive_time_ms", keepalive_ms),
+        ("grpc.keepalive_timeout_ms", keepalive_timeout_ms),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.http2.max_pings_without_data", 0),
+        ("grpc.initial_reconnect_backoff_ms", 200),
+        ("grpc.max_reconnect_backoff_ms", 2000),
+        # 每條channel各自建立TCP連線，而不是共用同一個subchannel
+        ("grpc.use_local_subchannel_pool", 1),
+    ]
+
+
+class GestureClient:
+    """Long-lived gRPC client for the gesture service.
+
+    Frames are spread round-robin over `num_channels` persistent channels and up
+    to `window` requests may be in flight at once; submit() blocks when the window
+    is full. A channel that fails with UNAVAILABLE is replaced, and calls use
+    wait_for_ready so they ride out reconnects instead of failing fast. The
+    replaced channel is closed once the calls still running on it finish.
+
+    Args:
+        target: "host:port" of the gesture service.
+        num_channels: number of channels (TCP connections) in the pool.
+        window: maximum number of in-flight requests.
+        encoding: preferred image encoding, used once the server advertises it.
+        timeout: per-request deadline in seconds, or None.
+    """
+
+    def __init__(self, target, num_channels=2, window=8, encoding="jpeg", timeout=None,
+                 keepalive_ms=10000):
+        self.target = target
+        self.timeout = timeout
+        self.preferred_encoding = encoding
+        self.encoding = None
+        self._options = channel_options(keepalive_ms)
+        self._lock = threading.Lock()
+        self._window = threading.BoundedSemaphore(window)
+        self._channels = [None] * max(1, num_channels)
+        self._stubs = [None] * len(self._channels)
+        # 每個stub(即每條channel)上還在進行中的呼叫數，被取代的channel等它們結束才關閉
+        self._in_flight = collections.Counter()
+        self._retired = {}
+        for index in range(len(self._channels)):
+            self._connect(index)
+        self._next = itertools.cycle(range(len(self._channels)))
+
+    def _connect(self, index):
+        channel = grpc.insecure_channel(self.target, options=self._options)
+        old, self._channels[index] = self._channels[index], channel
+        old_stub, self._stubs[index] = self._stubs[index], gesture_pb2_grpc.GestureRecognitionStub(channel)
+        if old is None:
+            return
+        # 直接close會取消這條channel上其他仍在進行的呼叫
+        if self._in_flight[old_stub]:
+            self._retired[old_stub] = old
+        else:
+            old.close()
+
+    def _acquire_stub(self, index):
+        with self._lock:
+            stub = self._stubs[index]
+            self._in_flight[stub] += 1
+            return stub
+
+    def _release_stub(self, stub):
+        with self._lock:
+            self._in_flight[stub] -= 1
+            if self._in_flight[stub]:
+                return
+            del self._in_flight[stub]
+            retired = self._retired.pop(stub, None)
+        if retired is not None:
+            retired.close()
+
+    def _negotiate(self, frame):
+        stub = self._acquire_stub(0)
+        try:
+            response, call = stub.Recognition.with_call(
+                encode_image(frame, "base64"), timeout=self.timeout, wait_for_ready=True)
+        finally:
+            self._release_stub(stub)
+        self.encoding = negotiate_encoding(call.initial_metadata(), self.preferred_encoding)
+        return response
+
+    def submit(self, frame):
+        """Send a BGR frame and return a grpc future for its RecognitionReply."""
+        request = encode_image(frame, self.encoding or "base64")
+        return self.submit_request(request)
+
+    def submit_request(self, request):
+        self._window.acquire()
+        with self._lock:
+            index = next(self._next)
+        stub = self._acquire_stub(index)
+        try:
+            future = stub.Recognition.future(request, timeout=self.timeout, wait_for_ready=True)
+        except Exception:
+            self._release_stub(stub)
+            self._window.release()
+            raise
+        future.add_done_callback(lambda f: self._on_done(index, stub, f))
+        return future
+
+    def _on_done(self, index, stub, future):
+        self._window.release()
+        if not future.cancelled() and future.code() == grpc.StatusCode.UNAVAILABLE:
+            with self._lock:
+                if self._stubs[index] is stub:  # 同一條channel只重建一次
+                    self._connect(index)
+        self._release_stub(stub)
+
+    def recognize(self, frame):
+        """Blocking call; the first frame also negotiates the image encoding."""
+        if self.encoding is None:
+            return self._negotiate(frame)
+        return self.submit(frame).result()
+
+    def close(self):
+        with self._lock:
+            channels = self._channels + list(self._retired.values())
+            self._retired.clear()
+        for channel in channels:
+            channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of `values` (0 < q <= 100)."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def load_video_frames(source, max_frames=300):
+    cap = cv2.VideoCapture(int(source) if str(source).isnumeric() else source)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_loadgen(client, frames, fps, duration):
+    """Replay `frames` in a loop at `fps` for `duration` seconds.
+
+    Frames are encoded once up front so encoding cost does not limit the offered
+    load. Returns a dict with the achieved throughput and latency percentiles (ms).
+    """
+    if not frames:
+        raise ValueError("no frames to replay")
+    client.recognize(frames[0])  # 先完成編碼協商
+    requests = [encode_image(frame, client.encoding) for frame in frames]
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    in_flight = []
+    interval = 1.0 / fps
+    start = time.perf_counter()
+    sent = 0
+    while True:
+        scheduled = start + sent * interval
+        if scheduled - start >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent_at = time.perf_counter()
+        future = client.submit_request(requests[sent % len(requests)])
+
+        def record(f, sent_at=sent_at):
+            with lock:
+                if f.cancelled() or f.exception() is not None:
+                    errors[0] += 1
+                else:
+                    latencies.append(time.perf_counter() - sent_at)
+
+        future.add_done_callback(record)
+        in_flight.append(future)
+        sent += 1
+
+    for future in in_flight:
+        try:
+            future.result()
+        except grpc.RpcError:
+            pass
+    elapsed = time.perf_counter() - start
+    return {
+        "sent": sent,
+        "completed": len(latencies),
+        "errors": errors[0],
+        "offered_fps": fps,
+        "achieved_fps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
@@ -24,17 +24,19 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rgesture.proto\"#\n\x12RecognitionRequest\x12\r\n\x05image\x18\x01 \x01(\x0c\"J\n\x10RecognitionReply\x12\x13\n\x0b\x66rame_index\x18\x01 \x01(\x05\x12\x11\n\ttimestamp\x18\x02 \x01(\t\x12\x0e\n\x06\x61\x63tion\x18\x03 \x01(\t2M\n\x12GestureRecognition\x12\x37\n\x0bRecognition\x12\x13.RecognitionRequest\x1a\x11.RecognitionReply\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rgesture.proto\"d\n\x12RecognitionRequest\x12\r\n\x05image\x18\x01 \x01(\x0c\x12 \n\x08\x65ncoding\x18\x02 \x01(\x0e\x32\x0e.ImageEncoding\x12\r\n\x05width\x18\x03 \x01(\x05\x12\x0e\n\x06height\x18\x04 \x01(\x05\"J\n\x10RecognitionReply\x12\x13\n\x0b\x66rame_index\x18\x01 \x01(\x05\x12\x11\n\ttimestamp\x18\x02 \x01(\t\x12\x0e\n\x06\x61\x63tion\x18\x03 \x01(\t*_\n\rImageEncoding\x12\x13\n\x0f\x45NCODING_BASE64\x10\x00\x12\x11\n\rENCODING_JPEG\x10\x01\x12\x10\n\x0c\x45NCODING_PNG\x10\x02\x12\x14\n\x10\x45NCODING_RAW_BGR\x10\x03\x32\x90\x01\n\x12GestureRecognition\x12\x37\n\x0bRecognition\x12\x13.RecognitionRequest\x1a\x11.RecognitionReply\"\x00\x12\x41\n\x11RecognitionStream\x12\x13.RecognitionRequest\x1a\x11.RecognitionReply\"\x00(\x01\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'gesture_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
+  _globals['_IMAGEENCODING']._serialized_start=195
+  _globals['_IMAGEENCODING']._serialized_end=290
   _globals['_RECOGNITIONREQUEST']._serialized_start=17
-  _globals['_RECOGNITIONREQUEST']._serialized_end=52
-  _globals['_RECOGNITIONREPLY']._serialized_start=54
-  _globals['_RECOGNITIONREPLY']._serialized_end=128
-  _globals['_GESTURERECOGNITION']._serialized_start=130
-  _globals['_GESTURERECOGNITION']._serialized_end=207
+  _globals['_RECOGNITIONREQUEST']._serialized_end=117
+  _globals['_RECOGNITIONREPLY']._serialized_start=119
+  _globals['_RECOGNITIONREPLY']._serialized_end=193
+  _globals['_GESTURERECOGNITION']._serialized_start=293
+  _globals['_GESTURERECOGNITION']._serialized_end=437
 # @@protoc_insertion_point(module_scope)
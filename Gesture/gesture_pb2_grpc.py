@@ -40,6 +40,11 @@ class GestureRecognitionStub(object):
                 request_serializer=gesture__pb2.RecognitionRequest.SerializeToString,
                 response_deserializer=gesture__pb2.RecognitionReply.FromString,
                 _registered_method=True)
+        self.RecognitionStream = channel.stream_stream(
+                '/GestureRecognition/RecognitionStream',
+                request_serializer=gesture__pb2.RecognitionRequest.SerializeToString,
+                response_deserializer=gesture__pb2.RecognitionReply.FromString,
+                _registered_method=True)
 
 
 class GestureRecognitionServicer(object):
@@ -53,6 +58,13 @@ class GestureRecognitionServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def RecognitionStream(self, request_iterator, context):
+        """Streams frames over one call; replies come back in request order
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_GestureRecognitionServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -61,6 +73,11 @@ def add_GestureRecognitionServicer_to_server(servicer, server):
                     request_deserializer=gesture__pb2.RecognitionRequest.FromString,
                     response_serializer=gesture__pb2.RecognitionReply.SerializeToString,
             ),
+            'RecognitionStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.RecognitionStream,
+                    request_deserializer=gesture__pb2.RecognitionRequest.FromString,
+                    response_serializer=gesture__pb2.RecognitionReply.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'GestureRecognition', rpc_method_handlers)
@@ -99,3 +116,30 @@ class GestureRecognition(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def RecognitionStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/GestureRecognition/RecognitionStream',
+            gesture__pb2.RecognitionRequest.SerializeToString,
+            gesture__pb2.RecognitionReply.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,134 @@
+"""Readiness of a gesture server, published through the grpc_health protocol.
+
+The servers register grpc_health's HealthServicer and let a ReadinessMonitor
+set its status, for the whole server ("") and for the GestureRecognition
+service, so both a plain health probe and a per-service probe see the same
+state.
+"""
+import asyncio
+import collections
+import threading
+import time
+
+import numpy as np
+from grpc_health.v1 import health, health_pb2
+
+import gesture_pb2
+
+SERVICE_NAMES = (health.OVERALL_HEALTH, gesture_pb2.DESCRIPTOR.services_by_name["GestureRecognition"].full_name)
+SERVING = health_pb2.HealthCheckResponse.SERVING
+NOT_SERVING = health_pb2.HealthCheckResponse.NOT_SERVING
+
+
+class LatencyWindow:
+    """Request latencies (seconds) of the last `window` seconds."""
+
+    def __init__(self, window=10.0, clock=time.monotonic):
+        self.window = window
+        self._clock = clock
+        self._samples = collections.deque()
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append((self._clock(), latency))
+
+    def percentile(self, q):
+        """The q-th percentile of the window, or None when no request finished in it."""
+        with self._lock:
+            oldest = self._clock() - self.window
+            while self._samples and self._samples[0][0] < oldest:
+                self._samples.popleft()
+            if not self._samples:
+                return None
+            return float(np.percentile([latency for _, latency in self._samples], q))
+
+
+class ReadinessMonitor:
+    """Sets the health status of a gesture server from its warm-up, backlog and latency.
+
+    The status is NOT_SERVING until mark_ready() is called after the model
+    warm-up, and afterwards whenever the server is saturated: more than
+    max_queue_depth requests waiting for or in inference, or a p99 latency
+    above max_p99_latency over the latency window. A limit of 0 disables
+    that check. The status is re-evaluated every `interval` seconds once
+    start() has been called.
+
+    Args:
+        servicer: grpc_health HealthServicer, or its asyncio version together with `loop`.
+        queue_depth: callable returning the number of queued and in-progress requests.
+        latencies: LatencyWindow the server records request latencies in.
+        loop: event loop of a grpc.aio server; statuses are set on it.
+    """
+
+    def __init__(self, servicer, queue_depth=None, latencies=None, max_queue_depth=0, max_p99_latency=0.0,
+                 interval=1.0, loop=None):
+        self.servicer = servicer
+        self.queue_depth = queue_depth
+        self.latencies = latencies
+        self.max_queue_depth = max_queue_depth
+        self.max_p99_latency = max_p99_latency
+        self.interval = interval
+        self.loop = loop
+        self.status = None
+        self.reason = "warming up"
+        self._ready = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.update()
+
+    def mark_ready(self):
+        """The model is warmed up; from now on only saturation makes the server NOT_SERVING."""
+        self._ready = True
+        return self.update()
+
+    def check(self):
+        """Return (status, reason) for the current state of the server."""
+        if not self._ready:
+            return NOT_SERVING, "warming up"
+        if self.max_queue_depth and self.queue_depth is not None:
+            depth = self.queue_depth()
+            if depth > self.max_queue_depth:
+                return NOT_SERVING, f"queue depth {depth} > {self.max_queue_depth}"
+        if self.max_p99_latency and self.latencies is not None:
+            p99 = self.latencies.percentile(99)
+            if p99 is not None and p99 > self.max_p99_latency:
+                return NOT_SERVING, f"p99 latency {p99 * 1000:.0f} ms > {self.max_p99_latency * 1000:.0f} ms"
+        return SERVING, "ok"
+
+    def update(self):
+        with self._lock:
+            status, self.reason = self.check()
+            if status != self.status:
+                self.status = status
+                for service in SERVICE_NAMES:
+                    self._set(service, status)
+                if self._ready:
+                    print(f"Gesture health: {health_pb2.HealthCheckResponse.ServingStatus.Name(status)} ({self.reason})")
+            return status
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="gesture-health", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop updating and report NOT_SERVING for good while the server shuts down."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.servicer.enter_graceful_shutdown(), self.loop)
+        else:
+            self.servicer.enter_graceful_shutdown()
+
+    def _set(self, service, status):
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.servicer.set(service, status), self.loop)
+        else:
+            self.servicer.set(service, status)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.update()
@@ -0,0 +1,156 @@
+"""Prometheus metrics of the gesture servers.
+
+    gesture_stage_seconds{stage}     decode, preprocess, forward and postprocess time
+    gesture_batch_size               frames per model forward
+    gesture_frames_total             frames run through the model (rate() gives frames/sec)
+    gesture_request_seconds          time from receiving a frame to its reply
+    gesture_in_flight_requests       requests received and not yet answered
+    gesture_queue_depth              requests queued or in inference
+    gesture_worker_queue_depth{worker}            the same per model worker
+    gesture_worker_batch_latency_seconds{worker}  moving average of a worker's batch time, once measured
+    gesture_temporal_cache_total{result}  temporal cache lookups: hit, miss or refresh
+    gesture_temporal_cache_saved_seconds_total  estimated model forward time skipped by cache hits
+    gesture_roi_frames_total{region}  frames of tracked streams detected on a "crop" or the "full" frame
+
+Every temporal cache hit is a frame that skipped decode and inference. The
+saved-seconds counter charges each hit the recent forward time per frame
+measured in the same process. In worker_mode=process the forwards run in the
+worker processes, so the counter stays at 0 and the saved model time is about
+    gesture_temporal_cache_total{result="hit"}
+      * rate(gesture_stage_seconds_sum{stage="forward"}[5m]) / rate(gesture_frames_total[5m])
+
+prometheus_client is optional; without it every function here does nothing.
+In worker_mode=process the worker processes record into files when the
+PROMETHEUS_MULTIPROC_DIR environment variable names an empty directory, and
+the endpoint of the main process reports the sum over all processes.
+"""
+import contextlib
+import os
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:
+    prometheus_client = None
+
+STAGES = ("decode", "preprocess", "forward", "postprocess")
+FORWARD_EWMA_ALPHA = 0.1
+
+# 最近forward每張frame的推論秒數(EWMA)，用來估計temporal cache命中省下的時間
+_forward_seconds_per_frame = None
+
+if prometheus_client is not None:
+    STAGE_SECONDS = prometheus_client.Histogram(
+        "gesture_stage_seconds", "Time spent in one processing stage of a frame or batch", ["stage"],
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+    BATCH_SIZE = prometheus_client.Histogram(
+        "gesture_batch_size", "Frames per model forward", buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32))
+    FRAMES = prometheus_client.Counter("gesture_frames", "Frames run through the model")
+    REQUEST_SECONDS = prometheus_client.Histogram(
+        "gesture_request_seconds", "Time from receiving a frame to its reply",
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+    IN_FLIGHT = prometheus_client.Gauge(
+        "gesture_in_flight_requests", "Requests received and not yet answered", multiprocess_mode="livesum")
+    TEMPORAL_CACHE = prometheus_client.Counter(
+        "gesture_temporal_cache", "Temporal cache lookups of incoming frames", ["result"])
+    SAVED_SECONDS = prometheus_client.Counter(
+        "gesture_temporal_cache_saved_seconds", "Estimated model forward time skipped by temporal cache hits")
+    ROI_FRAMES = prometheus_client.Counter(
+        "gesture_roi_frames", "Frames of tracked streams by the region they were detected on", ["region"])
+
+
+class _LoadCollector:
+    def __init__(self, queue_depth=None, worker_stats=None):
+        self.queue_depth = queue_depth
+        self.worker_stats = worker_stats
+
+    def collect(self):
+        if self.queue_depth is not None:
+            yield GaugeMetricFamily("gesture_queue_depth", "Requests queued or in inference",
+                                    value=self.queue_depth())
+        if self.worker_stats is None:
+            return
+        depth = GaugeMetricFamily("gesture_worker_queue_depth", "Requests queued or in inference per worker",
+                                  labels=["worker"])
+        latency = GaugeMetricFamily("gesture_worker_batch_latency_seconds",
+                                    "Moving average of a worker's batch time", labels=["worker"])
+        for stats in self.worker_stats():
+            depth.add_metric([str(stats["worker"])], stats["queue_depth"])
+            if stats["batch_latency"] is not None:
+                latency.add_metric([str(stats["worker"])], stats["batch_latency"])
+        yield depth
+        yield latency
+
+
+def observe_inference(stage, seconds, batch_size):
+    """Predictor observer: record the time of one inference stage of a batch."""
+    if prometheus_client is None:
+        return
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    if stage == "forward":
+        BATCH_SIZE.observe(batch_size)
+        FRAMES.inc(batch_size)
+        global _forward_seconds_per_frame
+        per_frame = seconds / batch_size
+        if _forward_seconds_per_frame is None:
+            _forward_seconds_per_frame = per_frame
+        else:
+            _forward_seconds_per_frame += FORWARD_EWMA_ALPHA * (per_frame - _forward_seconds_per_frame)
+
+
+def stage_timer(stage):
+    """Context manager timing a stage outside the Predictor, e.g. frame decoding."""
+    if prometheus_client is None:
+        return contextlib.nullcontext()
+    return STAGE_SECONDS.labels(stage).time()
+
+
+def request_started():
+    if prometheus_client is not None:
+        IN_FLIGHT.inc()
+
+
+def request_finished(seconds):
+    if prometheus_client is not None:
+        IN_FLIGHT.dec()
+        REQUEST_SECONDS.observe(seconds)
+
+
+def temporal_cache_lookup(result):
+    if prometheus_client is None:
+        return
+    TEMPORAL_CACHE.labels(result).inc()
+    if result == "hit" and _forward_seconds_per_frame is not None:
+        SAVED_SECONDS.inc(_forward_seconds_per_frame)
+
+
+def roi_frame(region):
+    if prometheus_client is not None:
+        ROI_FRAMES.labels(region).inc()
+
+
+def start_metrics_server(port, queue_depth=None, worker_stats=None):
+    """Serve /metrics over HTTP on `port` (0 disables it).
+
+    `queue_depth` is a callable reported as the gesture_queue_depth gauge and
+    `worker_stats` one returning routing.worker_stats() for the per-worker gauges.
+    """
+    if not port:
+        return
+    if prometheus_client is None:
+        print("prometheus_client is not installed, metrics are disabled")
+        return
+    registry = prometheus_client.REGISTRY
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # 各程序寫入自己的檔案，由此合併
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    if queue_depth is not None or worker_stats is not None:
+        registry.register(_LoadCollector(queue_depth, worker_stats))
+    try:
+        prometheus_client.start_http_server(port, registry=registry)
+    except OSError as e:
+        print(f"Metrics server could not listen on port {port}: {e}")
+        return
+    print("Metrics served on port", port)
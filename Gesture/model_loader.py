@@ -0,0 +1,145 @@
+import json
+import threading
+import zipfile
+
+import numpy as np
+import torch
+
+import metrics
+from config import settings
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+from vision.ssd.onnx_backend import OnnxRuntimeNet
+
+# export_model.py把模型資訊寫在TorchScript檔案內的這個extra file，ONNX則寫在同名的metadata_props
+MODEL_METADATA_FILE = "gesture_model.json"
+
+
+def load_class_names(label_path=None):
+    return [name.strip() for name in open(label_path or settings.label_path).readlines()]
+
+
+def default_device():
+    return torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+
+
+def read_torchscript_metadata(path):
+    """Export options of a TorchScript archive, read without loading the model."""
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            if name.endswith("/extra/" + MODEL_METADATA_FILE):
+                return json.loads(archive.read(name) or "{}")
+    return {}
+
+
+def _export_device(metadata):
+    return torch.device("cpu") if metadata.get("device") == "cpu" else default_device()
+
+
+def load_torchscript(path, device=None):
+    """Load an SSD written by `export_model.py torchscript` or `quantize_model.py`.
+
+    The traced graph is tied to the device it was exported on, so by default
+    a CPU export (e.g. an INT8 model) stays on the CPU.
+
+    Returns:
+        (module, metadata): the scripted model and the options it was exported with.
+    """
+    metadata = read_torchscript_metadata(path)
+    device = device or _export_device(metadata)
+    if metadata.get("quantization"):
+        # 量化權重以匯出時的engine打包
+        torch.backends.quantized.engine = metadata["quantized_engine"]
+    module = torch.jit.load(path, map_location=device)
+    return module, metadata
+
+
+def load_onnx(path):
+    """Load an SSD written by `export_model.py onnx` into an onnxruntime session.
+
+    Returns:
+        (net, metadata): the OnnxRuntimeNet and the options it was exported with.
+    """
+    net = OnnxRuntimeNet(path,
+                         intra_op_num_threads=settings.ort_intra_op_threads,
+                         inter_op_num_threads=settings.ort_inter_op_threads,
+                         io_binding=settings.ort_io_binding)
+    metadata = net.session.get_modelmeta().custom_metadata_map.get(MODEL_METADATA_FILE)
+    return net, json.loads(metadata or "{}")
+
+
+def _check_num_classes(metadata, num_classes):
+    if metadata.get("num_classes") != num_classes:
+        raise ValueError(f"{settings.weights} was exported for {metadata.get('num_classes')} classes, "
+                         f"the label file has {num_classes}")
+
+
+_shared_predictor = None
+_shared_lock = threading.Lock()
+
+
+def load_predictor(num_classes, share_weights=False):
+    """Build the gesture model, load settings.weights and wrap it in a Predictor.
+
+    Every server creates its predictor here so that the inference options in
+    settings apply to all of them. With model_format "torchscript" or backend
+    "onnxruntime" the weights file is an exported artifact, whose precision,
+    memory format and fusion were fixed at export time.
+
+    With share_weights the model is loaded once per process and every call
+    returns a replica of it (see Predictor.replica), so worker threads do not
+    each hold a copy of the weights.
+    """
+    global _shared_predictor
+    if not share_weights:
+        return _create_predictor(num_classes)
+    with _shared_lock:
+        if _shared_predictor is None:
+            _shared_predictor = _create_predictor(num_classes)
+        return _shared_predictor.replica()
+
+
+def _create_predictor(num_classes):
+    options = dict(precision=settings.precision, channels_last=settings.channels_last, fuse=settings.fuse_conv_bn)
+    if settings.backend == "onnxruntime":
+        net, metadata = load_onnx(settings.weights)
+        _check_num_classes(metadata, num_classes)
+        options = dict(precision=torch.float32, channels_last=False, fuse=False, device=net.device)
+    elif settings.backend != "torch":
+        raise ValueError(f"unknown backend {settings.backend!r}")
+    elif settings.model_format == "torchscript":
+        net, metadata = load_torchscript(settings.weights)
+        _check_num_classes(metadata, num_classes)
+        options = dict(precision=getattr(torch, metadata["dtype"]), channels_last=metadata["channels_last"],
+                       fuse=False, device=_export_device(metadata))
+    elif settings.model_format == "pth":
+        net = create_mobilenetv1_ssd(num_classes, is_test=True)
+        net.load(settings.weights)
+    else:
+        raise ValueError(f"unknown model_format {settings.model_format!r}")
+
+    predictor = create_mobilenetv1_ssd_predictor(net, candidate_size=200,
+                                                 nms_backend=settings.nms_backend,
+                                                 device_preprocess=settings.device_preprocess,
+                                                 # 伺服器只需要最強的一個手勢，top_k為1時略過NMS
+                                                 single_best=settings.top_k == 1,
+                                                 **options)
+    if settings.torch_compile and settings.backend == "torch":
+        # 每種batch大小第一次執行時才編譯，由warm_up先跑過
+        predictor.net = torch.compile(predictor.net, dynamic=False)
+    predictor.observer = metrics.observe_inference
+    return predictor
+
+
+def warm_up(predictor, max_batch_size, iterations=None):
+    """Run blank batches of every size from 1 to max_batch_size.
+
+    Lazy CUDA/cuDNN initialization, kernel autotuning and torch.compile all
+    happen on the first batch of a given shape; doing it here keeps that cost
+    off the first real frames.
+    """
+    size = predictor.size
+    for batch_size in range(1, max_batch_size + 1):
+        frames = np.zeros((batch_size, size, size, 3), np.uint8)
+        for _ in range(settings.warmup_iterations if iterations is None else iterations):
+            predictor.predict_batch(frames, top_k=settings.top_k, prob_threshold=settings.conf_thres,
+                                    sizes=[(size, size)] * batch_size)
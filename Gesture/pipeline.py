@@ -0,0 +1,69 @@
+import queue
+import threading
+import time
+
+_CLOSE = object()
+
+
+class Pipeline:
+    """Run jobs through a sequence of stages, each on its own thread, so consecutive jobs overlap.
+
+    A stage is a callable taking a job and returning it for the next stage (or
+    None to drop it). While one stage works on job N the stage before it can
+    already work on job N+1. Each stage has an input queue of at most `depth`
+    jobs, so put() blocks once the first stage falls behind and the number of
+    jobs in flight stays bounded. A job whose stage raises goes to
+    `on_error(job, exc)` and leaves the pipeline.
+
+    Args:
+        stages: list of (name, callable).
+        depth: jobs that may wait in front of each stage.
+        on_error: callable(job, exc) for failed jobs.
+        name: prefix of the stage thread names.
+    """
+
+    def __init__(self, stages, depth=1, on_error=None, name="pipeline"):
+        self.stages = stages
+        self.on_error = on_error
+        self.busy = {stage_name: 0.0 for stage_name, _ in stages}  # 每個階段實際工作的秒數
+        self._queues = [queue.Queue(maxsize=max(1, depth)) for _ in stages]
+        self._threads = [threading.Thread(target=self._run, args=(i,), name=f"{name}-{stage_name}", daemon=True)
+                         for i, (stage_name, _) in enumerate(stages)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def put(self, job):
+        self._queues[0].put(job)
+
+    def close(self):
+        """Stop after the jobs already put have gone through every stage."""
+        self._queues[0].put(_CLOSE)
+
+    def join(self, timeout=None):
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self, index):
+        stage_name, stage = self.stages[index]
+        inbox = self._queues[index]
+        outbox = self._queues[index + 1] if index + 1 < len(self._queues) else None
+        while True:
+            job = inbox.get()
+            if job is _CLOSE:
+                if outbox is not None:
+                    outbox.put(_CLOSE)
+                return
+            start = time.perf_counter()
+            try:
+                job = stage(job)
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(job, e)
+                job = None
+            finally:
+                self.busy[stage_name] += time.perf_counter() - start
+            if job is not None and outbox is not None:
+                outbox.put(job)
@@ -0,0 +1,88 @@
+"""Static post-training INT8 quantization of the gesture SSD for CPU-only nodes.
+
+    python quantize_model.py --dataset /data/gesture_voc --weights mb1-ssd-best.pth --output mb1-ssd-int8.pt
+    weights=mb1-ssd-int8.pt model_format=torchscript python GestureBatchNew.py
+
+Activation ranges are calibrated on images of a VOCDataset split (trainval by
+default); the saved model is then evaluated against the fp32 weights on the
+test split.
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from config import settings
+from eval_ssd import evaluate, print_report
+from export_model import save_torchscript
+from model_loader import load_class_names, load_torchscript
+from vision.datasets.voc_dataset import VOCDataset
+from vision.ssd.config import mobilenetv1_ssd_config as config
+from vision.ssd.data_preprocessing import PredictionTransform
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+from vision.ssd.quantization import quantize_ssd
+
+
+def calibration_batches(dataset, num_images, batch_size=8):
+    """Preprocessed batches of `num_images` images spread evenly over `dataset`."""
+    transform = PredictionTransform(config.image_size, config.image_mean, config.image_std)
+    indexes = np.unique(np.linspace(0, len(dataset) - 1, min(num_images, len(dataset))).astype(int))
+    for start in range(0, len(indexes), batch_size):
+        yield torch.stack([transform(dataset.get_image(i)) for i in indexes[start:start + batch_size]])
+
+
+def quantize_model(num_classes, weights, output, dataset, num_images=200, backend="x86"):
+    """Quantize trained weights, calibrated on `dataset`, and save a TorchScript drop-in for the servers."""
+    net = create_mobilenetv1_ssd(num_classes, is_test=True)
+    net.load(weights)
+    quantized = quantize_ssd(net, calibration_batches(dataset, num_images), backend)
+    metadata = {
+        "format": "torchscript",
+        "num_classes": num_classes,
+        "image_size": config.image_size,
+        "dtype": "float32",
+        "channels_last": False,
+        "fused": True,
+        "device": "cpu",
+        "quantization": "int8_static",
+        "quantized_engine": backend,
+        "calibration_images": min(num_images, len(dataset)),
+    }
+    example = torch.zeros(2, 3, config.image_size, config.image_size)
+    save_torchscript(quantized, example, output, metadata)
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization of the gesture SSD")
+    parser.add_argument("--dataset", required=True, help="VOC-style dataset root")
+    parser.add_argument("--calibration_split", default="trainval", choices=["trainval", "test"])
+    parser.add_argument("--num_calibration", type=int, default=200, help="number of calibration images")
+    parser.add_argument("--weights", default=settings.weights, help="trained .pth weights")
+    parser.add_argument("--label_file", default=settings.label_path)
+    parser.add_argument("--output", default="mb1-ssd-int8.pt")
+    parser.add_argument("--backend", default="x86", choices=["x86", "fbgemm", "qnnpack", "onednn"])
+    parser.add_argument("--skip_eval", action="store_true", help="do not compare AP with fp32 on the test split")
+    args = parser.parse_args()
+
+    class_names = load_class_names(args.label_file)
+    calibration = VOCDataset(args.dataset, is_test=args.calibration_split == "test")
+    metadata = quantize_model(len(class_names), args.weights, args.output, calibration,
+                              args.num_calibration, args.backend)
+    print(f"saved {args.output}, calibrated on {metadata['calibration_images']} {args.calibration_split} images")
+    if args.skip_eval:
+        return
+
+    dataset = VOCDataset(args.dataset, is_test=True)
+    cpu = torch.device("cpu")
+    net = create_mobilenetv1_ssd(len(class_names), is_test=True)
+    net.load(args.weights)
+    net.priors = net.priors.to(cpu)
+    baseline = evaluate(create_mobilenetv1_ssd_predictor(net, device=cpu), dataset, class_names)
+    quantized_net, _ = load_torchscript(args.output)
+    quantized = evaluate(create_mobilenetv1_ssd_predictor(quantized_net, device=cpu), dataset, class_names)
+    print_report(class_names, baseline, quantized, "int8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import threading
+
+# crop大到接近整張frame時直接用整張，省去裁切也不會漏掉邊緣的手
+FULL_FRAME_FRACTION = 0.8
+
+
+def crop_around(box, frame_size, margin=0.5, min_height=150):
+    """(x0, y0, x1, y1) crop of a (width, height) frame around `box`, or None for the whole frame.
+
+    The box grows by `margin` of its size on every side, then to the aspect
+    ratio of the frame and at least `min_height` pixels, so the model sees the
+    hand larger but stretched the same way as in a whole frame. The crop is
+    shifted to lie inside the frame.
+    """
+    width, height = frame_size
+    x0, y0, x1, y1 = box
+    crop_height = max((y1 - y0) * (1 + 2 * margin), (x1 - x0) * (1 + 2 * margin) * height / width, min_height)
+    crop_width = crop_height * width / height
+    if crop_width >= width * FULL_FRAME_FRACTION:
+        return None
+    left = min(max((x0 + x1 - crop_width) / 2, 0), width - crop_width)
+    top = min(max((y0 + y1 - crop_height) / 2, 0), height - crop_height)
+    return int(left), int(top), int(round(left + crop_width)), int(round(top + crop_height))
+
+
+class RoiTracker:
+    """Where to look for the hands in the next frame of one stream.
+
+    After a detection the following frames are decoded only around the hands
+    last found (the union of their boxes, see crop_around). A frame without
+    detections, and a frame after `refresh_interval` crops in a row, is
+    detected on the whole frame again so hands that appear elsewhere are found.
+    """
+
+    def __init__(self, margin=0.5, min_height=150, refresh_interval=10):
+        self.margin = margin
+        self.min_height = min_height
+        self.refresh_interval = refresh_interval
+        self.box = None
+        self.frame_size = None
+        self.crops = 0
+        self._lock = threading.Lock()
+
+    def region(self):
+        """Crop (x0, y0, x1, y1) to detect the next frame on, or None for the whole frame."""
+        with self._lock:
+            if self.box is None or self.crops >= self.refresh_interval:
+                return None
+            return crop_around(self.box, self.frame_size, self.margin, self.min_height)
+
+    def update(self, crop, boxes, frame_size):
+        """Record the detections of a frame: the crop it was detected on (None for
+        the whole frame), its boxes in frame coordinates and the frame size."""
+        with self._lock:
+            self.crops = 0 if crop is None else self.crops + 1
+            self.frame_size = frame_size
+            if len(boxes) == 0:
+                self.box = None
+            else:
+                self.box = (float(boxes[:, 0].min()), float(boxes[:, 1].min()),
+                            float(boxes[:, 2].max()), float(boxes[:, 3].max()))
@@ -0,0 +1,89 @@
+import itertools
+import random
+
+
+class RoundRobinRouter:
+    """Send requests to the workers in turn, ignoring their load."""
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, workers):
+        return workers[next(self._counter) % len(workers)]
+
+
+class LeastQueueRouter:
+    """Pick the worker with the fewest queued and in-progress requests.
+
+    Ties are broken by rotating the starting worker so an idle pool is still
+    used evenly.
+    """
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, workers):
+        start = next(self._counter) % len(workers)
+        order = workers[start:] + workers[:start]
+        return min(order, key=lambda worker: worker.queue_depth)
+
+
+class PowerOfTwoRouter:
+    """Sample two workers at random and pick the one with the shorter queue.
+
+    Avoids the herding of LeastQueueRouter when many requests see the same
+    queue depths at once.
+    """
+
+    def __init__(self, rng=None):
+        self._rng = rng or random.Random()
+
+    def choose(self, workers):
+        if len(workers) == 1:
+            return workers[0]
+        first, second = self._rng.sample(workers, 2)
+        return first if first.queue_depth <= second.queue_depth else second
+
+
+class EwmaLatencyRouter:
+    """Pick the worker with the smallest expected wait.
+
+    The wait is estimated as (queue_depth + 1) * batch_latency, where
+    batch_latency is the worker's moving average of batch inference time, so a
+    slow replica gets fewer requests even when its queue is short. A worker
+    that has not finished a batch yet is assumed as fast as the mean of the
+    measured ones; with no measurements at all this is LeastQueueRouter.
+    """
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def choose(self, workers):
+        start = next(self._counter) % len(workers)
+        order = workers[start:] + workers[:start]
+        measured = [worker.batch_latency for worker in workers if worker.batch_latency is not None]
+        # 沒有量測值時若當成0，這個worker不論queue多長都會被選中
+        default = sum(measured) / len(measured) if measured else 1.0
+        return min(order, key=lambda worker: (worker.queue_depth + 1) * (
+            worker.batch_latency if worker.batch_latency is not None else default))
+
+
+ROUTERS = {
+    "round_robin": RoundRobinRouter,
+    "least_queue": LeastQueueRouter,
+    "power_of_two": PowerOfTwoRouter,
+    "ewma_latency": EwmaLatencyRouter,
+}
+
+
+def create_router(policy):
+    try:
+        return ROUTERS[policy]()
+    except KeyError:
+        raise ValueError(f"unknown routing policy {policy!r}, expected one of {', '.join(ROUTERS)}") from None
+
+
+def worker_stats(workers):
+    """Per-worker load as reported to the router; metrics exports it as the gesture_worker_* gauges."""
+    return [{"worker": i, "queue_depth": worker.queue_depth, "batch_latency": worker.batch_latency}
+            for i, worker in enumerate(workers)]
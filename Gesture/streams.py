@@ -0,0 +1,31 @@
+import collections
+import threading
+
+
+class StreamState:
+    """What the server remembers between the frames of one stream (or unary client):
+    its TemporalCache and RoiTracker, each None when that feature is off."""
+
+    __slots__ = ("cache", "tracker")
+
+    def __init__(self, cache=None, tracker=None):
+        self.cache = cache
+        self.tracker = tracker
+
+
+class ClientStates:
+    """StreamState per unary client, keyed by peer; the least recently used are dropped."""
+
+    def __init__(self, factory, max_clients=1024):
+        self.factory = factory
+        self.max_clients = max_clients
+        self._states = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            state = self._states.pop(key, None) or self.factory()
+            self._states[key] = state
+            if len(self._states) > self.max_clients:
+                self._states.popitem(last=False)
+            return state
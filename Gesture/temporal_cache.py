@@ -0,0 +1,51 @@
+import threading
+
+import numpy as np
+
+from frames import decode_thumbnail
+
+
+def frame_signature(request, hash_size=16):
+    """Difference hash (hash_size * hash_size bits) of a request's frame.
+
+    Each bit says whether a pixel of a (hash_size, hash_size + 1) grayscale
+    thumbnail is brighter than its left neighbour, so small changes in
+    lighting or compression leave most bits unchanged.
+    """
+    small = decode_thumbnail(request, hash_size + 1, hash_size)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class TemporalCache:
+    """Reuse the last model result of one stream while its frames barely change.
+
+    A frame whose signature is within `threshold` bits of the frame that
+    produced the cached reply gets that reply again; after `refresh_interval`
+    reuses the next frame goes to the model regardless.
+    """
+
+    def __init__(self, threshold=8, refresh_interval=5):
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self.signature = None
+        self.reply = None
+        self.reuses = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, signature):
+        """Return (reply, result): the reply to reuse or None, and "hit", "miss" or "refresh"."""
+        with self._lock:
+            if self.reply is None or (signature ^ self.signature).bit_count() > self.threshold:
+                return None, "miss"
+            if self.reuses >= self.refresh_interval:
+                return None, "refresh"
+            self.reuses += 1
+            return self.reply, "hit"
+
+    def store(self, signature, reply):
+        with self._lock:
+            self.signature = signature
+            self.reply = reply
+            self.reuses = 0
+
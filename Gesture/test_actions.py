@@ -0,0 +1,33 @@
+import json
+import unittest
+
+from actions import ActionTable, hand_gestures
+from model_loader import load_class_names
+
+
+class ActionTableTestCase(unittest.TestCase):
+    def test_hand_gestures(self):
+        self.assertEqual(hand_gestures("hand_3"), ("3", "3"))
+        self.assertEqual(hand_gestures("rhand_8"), ("", "8"))
+        self.assertEqual(hand_gestures("lhand_9"), ("9", ""))
+        self.assertEqual(hand_gestures("fist_5"), ("5", "5"))
+
+    def test_matches_the_label_loop(self):
+        class_names = load_class_names()
+        table = ActionTable(class_names)
+        self.assertEqual(json.loads(table.action([])), {"Left": "", "Right": ""})
+        for label in range(1, len(class_names)):
+            digit = class_names[label].split("_")[-1]
+            self.assertEqual(json.loads(table.action([label])), {"Left": digit, "Right": digit})
+        # 後面的偵測結果覆蓋前面的
+        self.assertEqual(json.loads(table.action([2, 5])), {"Left": "4", "Right": "4"})
+
+    def test_left_and_right_hands_combine(self):
+        table = ActionTable(["BACKGROUND", "rhand_1", "lhand_2", "hand_3"])
+        self.assertEqual(json.loads(table.action([1, 2])), {"Left": "2", "Right": "1"})
+        self.assertEqual(json.loads(table.action([3, 1])), {"Left": "3", "Right": "1"})
+        self.assertIs(table.action([1]), table.single[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import threading
+import time
+import unittest
+
+from batching import (DynamicBatcher, DeadlineExceeded, ResponseTable, ResponseTableFull,
+                      deadline_from_context, time_remaining)
+
+
+class DynamicBatcherTestCase(unittest.TestCase):
+    def test_batches_up_to_max_size(self):
+        seen = []
+        gate = threading.Event()
+
+        def handler(payloads):
+            gate.wait(1)
+            seen.append(list(payloads))
+            return [p * 2 for p in payloads]
+
+        batcher = DynamicBatcher(handler, max_batch_size=4, max_delay=0.2).start()
+        self.addCleanup(batcher.close)
+        futs = [batcher.submit(i) for i in range(4)]
+        gate.set()
+        self.assertEqual([f.result(1) for f in futs], [0, 2, 4, 6])
+        self.assertEqual(seen, [[0, 1, 2, 3]])
+
+    def test_single_request_waits_at_most_max_delay(self):
+        batcher = DynamicBatcher(lambda payloads: payloads, max_batch_size=8, max_delay=0.02).start()
+        self.addCleanup(batcher.close)
+        start = time.monotonic()
+        self.assertEqual(batcher.submit("frame").result(1), "frame")
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_expired_requests_are_dropped_before_handler(self):
+        seen = []
+        batcher = DynamicBatcher(max_batch_size=4, max_delay=0)
+        expired = batcher.submit("old", deadline=time.monotonic() - 1)
+        live = batcher.submit("new", deadline=time.monotonic() + 10)
+        items = batcher.next_batch(timeout=1)
+        seen.extend(item.payload for item in items)
+        batcher.complete(items, ["done"])
+        self.assertEqual(seen, ["new"])
+        self.assertEqual(live.result(1), "done")
+        self.assertRaises(DeadlineExceeded, expired.result, 1)
+        self.assertEqual(batcher.dropped, 1)
+
+    def test_cancelled_requests_are_skipped(self):
+        batcher = DynamicBatcher(max_batch_size=4, max_delay=0)
+        cancelled = batcher.submit("gone")
+        cancelled.cancel()
+        batcher.submit("kept")
+        self.assertEqual([item.payload for item in batcher.next_batch(timeout=1)], ["kept"])
+
+    def test_batch_limit_adapts_to_latency(self):
+        batcher = DynamicBatcher(max_batch_size=8, target_latency=0.1)
+        batcher._record_latency(8, 0.5)
+        self.assertEqual(batcher.batch_limit, 4)
+        for _ in range(3):
+            batcher._record_latency(batcher.batch_limit, 0.01)
+        self.assertEqual(batcher.batch_limit, 7)
+
+    def test_in_progress_counts_running_batch(self):
+        running, release = threading.Event(), threading.Event()
+
+        def handler(payloads):
+            running.set()
+            release.wait(5)
+            return payloads
+
+        batcher = DynamicBatcher(handler, max_batch_size=2, max_delay=0).start()
+        self.addCleanup(batcher.close)
+        future = batcher.submit(1)
+        running.wait(5)
+        self.assertEqual(batcher.in_progress, 1)
+        release.set()
+        self.assertEqual(future.result(5), 1)
+        self.assertEqual(batcher.in_progress, 0)
+        self.assertIsNotNone(batcher.latency_ewma)
+
+    def test_handler_error_fails_batch(self):
+        def handler(payloads):
+            raise ValueError("boom")
+
+        batcher = DynamicBatcher(handler, max_batch_size=2, max_delay=0).start()
+        self.addCleanup(batcher.close)
+        self.assertRaises(ValueError, batcher.submit(1).result, 1)
+
+
+class ResponseTableTestCase(unittest.TestCase):
+    def test_ids_are_unique_and_resolved(self):
+        table = ResponseTable(max_entries=4)
+        (id0, fut0), (id1, fut1) = table.register(), table.register()
+        self.assertNotEqual(id0, id1)
+        table.resolve(id1, "reply")
+        self.assertEqual(fut1.result(0), "reply")
+        self.assertFalse(fut0.done())
+        self.assertEqual(len(table), 1)
+
+    def test_evicted_entries_free_space(self):
+        table = ResponseTable(max_entries=1)
+        req_id, future = table.register()
+        self.assertRaises(ResponseTableFull, table.register)
+        table.evict(req_id)
+        self.assertTrue(future.cancelled())
+        self.assertFalse(table.is_pending(req_id))
+        table.resolve(req_id, "late reply")  # 已離線的client不會留下紀錄
+        self.assertEqual(len(table), 0)
+        table.register()
+
+
+class _Context:
+    def __init__(self, remaining):
+        self.remaining = remaining
+
+    def time_remaining(self):
+        return self.remaining
+
+
+class DeadlineTestCase(unittest.TestCase):
+    def test_calls_without_deadline(self):
+        # sync gRPC回報約9e9秒
+        self.assertIsNone(time_remaining(_Context(9.2e9)))
+        self.assertIsNone(deadline_from_context(_Context(None)))
+        self.assertIsNone(deadline_from_context(None))
+
+    def test_deadline_is_monotonic(self):
+        deadline = deadline_from_context(_Context(2.0))
+        self.assertAlmostEqual(deadline - time.monotonic(), 2.0, delta=0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import itertools
+import math
+import unittest
+
+import numpy as np
+import torch
+
+from vision.ssd.config import mobilenetv1_ssd_config, vgg_ssd_config
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd
+from vision.utils import box_utils, box_utils_numpy
+
+
+def reference_hard_nms(box_scores, iou_threshold, top_k=-1, candidate_size=200):
+    """The original one-box-per-iteration implementation."""
+    scores = box_scores[:, -1]
+    boxes = box_scores[:, :-1]
+    picked = []
+    _, indexes = scores.sort(descending=True)
+    indexes = indexes[:candidate_size]
+    while len(indexes) > 0:
+        current = indexes[0]
+        picked.append(current.item())
+        if 0 < top_k == len(picked) or len(indexes) == 1:
+            break
+        current_box = boxes[current, :]
+        indexes = indexes[1:]
+        rest_boxes = boxes[indexes, :]
+        iou = box_utils.iou_of(rest_boxes, current_box.unsqueeze(0))
+        indexes = indexes[iou <= iou_threshold]
+    return box_scores[picked, :]
+
+
+def reference_hard_nms_numpy(box_scores, iou_threshold, top_k=-1, candidate_size=200):
+    scores = box_scores[:, -1]
+    boxes = box_scores[:, :-1]
+    picked = []
+    indexes = np.argsort(scores)[-candidate_size:]
+    while len(indexes) > 0:
+        current = indexes[-1]
+        picked.append(current)
+        if 0 < top_k == len(picked) or len(indexes) == 1:
+            break
+        current_box = boxes[current, :]
+        indexes = indexes[:-1]
+        rest_boxes = boxes[indexes, :]
+        iou = box_utils_numpy.iou_of(rest_boxes, np.expand_dims(current_box, axis=0))
+        indexes = indexes[iou <= iou_threshold]
+    return box_scores[picked, :]
+
+
+def random_box_scores(num_boxes, seed):
+    generator = torch.Generator().manual_seed(seed)
+    centers = torch.rand(num_boxes, 2, generator=generator)
+    sizes = torch.rand(num_boxes, 2, generator=generator) * 0.4 + 0.02
+    scores = torch.rand(num_boxes, 1, generator=generator)
+    return torch.cat([centers - sizes / 2, centers + sizes / 2, scores], dim=1)
+
+
+def reference_priors(specs, image_size):
+    """The original per-location loop of generate_ssd_priors."""
+    priors = []
+    for spec in specs:
+        scale = image_size / spec.shrinkage
+        for j, i in itertools.product(range(spec.feature_map_size), repeat=2):
+            x_center, y_center = (i + 0.5) / scale, (j + 0.5) / scale
+            w = h = spec.box_sizes.min / image_size
+            priors.append([x_center, y_center, w, h])
+            w = h = math.sqrt(spec.box_sizes.max * spec.box_sizes.min) / image_size
+            priors.append([x_center, y_center, w, h])
+            w = h = spec.box_sizes.min / image_size
+            for ratio in spec.aspect_ratios:
+                ratio = math.sqrt(ratio)
+                priors.append([x_center, y_center, w * ratio, h / ratio])
+                priors.append([x_center, y_center, w / ratio, h * ratio])
+    return torch.clamp(torch.tensor(priors), 0.0, 1.0)
+
+
+CASES = [
+    # (num_boxes, iou_threshold, top_k, candidate_size)
+    (1, 0.45, -1, 200),
+    (50, 0.45, -1, 200),
+    (300, 0.45, -1, 200),
+    (300, 0.2, -1, 200),
+    (300, 0.65, 1, 200),
+    (300, 0.45, 5, 50),
+    (1000, 0.3, -1, 1000),
+]
+
+
+class HardNmsTestCase(unittest.TestCase):
+    def test_matches_reference(self):
+        for seed, (num_boxes, iou_threshold, top_k, candidate_size) in enumerate(CASES):
+            box_scores = random_box_scores(num_boxes, seed)
+            expected = reference_hard_nms(box_scores, iou_threshold, top_k, candidate_size)
+            actual = box_utils.hard_nms(box_scores, iou_threshold, top_k, candidate_size)
+            self.assertTrue(torch.equal(actual, expected), (num_boxes, iou_threshold, top_k))
+
+    def test_numpy_matches_reference(self):
+        for seed, (num_boxes, iou_threshold, top_k, candidate_size) in enumerate(CASES):
+            box_scores = random_box_scores(num_boxes, seed).numpy()
+            expected = reference_hard_nms_numpy(box_scores, iou_threshold, top_k, candidate_size)
+            actual = box_utils_numpy.hard_nms(box_scores, iou_threshold, top_k, candidate_size)
+            np.testing.assert_array_equal(actual, expected)
+
+    def test_empty_input(self):
+        self.assertEqual(box_utils.hard_nms(torch.zeros(0, 5), 0.45).shape, (0, 5))
+
+    def test_batched_groups_do_not_suppress_each_other(self):
+        box_scores = random_box_scores(200, 7)
+        idxs = torch.arange(200) % 3
+        keep = box_utils.batched_hard_nms(box_scores[:, :4], box_scores[:, 4], idxs, 0.45, top_k=-1)
+        for group in range(3):
+            expected = reference_hard_nms(box_scores[idxs == group], 0.45)
+            self.assertTrue(torch.equal(box_scores[keep][idxs[keep] == group], expected))
+
+    @unittest.skipIf(box_utils.torchvision_batched_nms is None, "torchvision is not installed")
+    def test_torchvision_backend(self):
+        for seed, (num_boxes, iou_threshold, top_k, candidate_size) in enumerate(CASES):
+            box_scores = random_box_scores(num_boxes, seed)
+            expected = reference_hard_nms(box_scores, iou_threshold, top_k, candidate_size)
+            actual = box_utils.hard_nms(box_scores, iou_threshold, top_k, candidate_size, backend="torchvision")
+            torch.testing.assert_close(actual, expected)
+
+
+class PriorsTestCase(unittest.TestCase):
+    def test_matches_reference(self):
+        for config in (mobilenetv1_ssd_config, vgg_ssd_config):
+            expected = reference_priors(config.specs, config.image_size)
+            self.assertTrue(torch.equal(box_utils.generate_ssd_priors(config.specs, config.image_size), expected))
+            np.testing.assert_array_equal(box_utils_numpy.generate_ssd_priors(config.specs, config.image_size),
+                                          expected.numpy())
+
+    def test_non_square_image(self):
+        specs = [box_utils.SSDSpec((4, 2), 100, box_utils.SSDBoxSizes(100, 150), [2])]
+        priors = box_utils.generate_ssd_priors(specs, (400, 200), clamp=False)
+        self.assertEqual(priors.shape, (4 * 2 * 4, 4))
+        torch.testing.assert_close(priors[0], torch.tensor([0.125, 0.25, 0.25, 0.5]))
+        # 第二列第一格，像素上仍為正方形
+        torch.testing.assert_close(priors[4 * 4], torch.tensor([0.125, 0.75, 0.25, 0.5]))
+        np.testing.assert_array_equal(box_utils_numpy.generate_ssd_priors(specs, (400, 200), clamp=False),
+                                      priors.numpy())
+
+    def test_cache_is_shared(self):
+        specs, size = mobilenetv1_ssd_config.specs, mobilenetv1_ssd_config.image_size
+        priors = box_utils.cached_ssd_priors(specs, size)
+        self.assertIs(box_utils.cached_ssd_priors(list(specs), (size, size), torch.device("cpu")), priors)
+        self.assertIsNot(box_utils.cached_ssd_priors(specs, (size, 200)), priors)
+        # config的priors就是快取中的那一份，不會另外再產生
+        self.assertIs(mobilenetv1_ssd_config.priors, priors)
+        nets = [create_mobilenetv1_ssd(9, is_test=True) for _ in range(2)]
+        self.assertIs(nets[0].priors, nets[1].priors)
+        if nets[0].priors.device.type == "cpu":
+            self.assertIs(nets[0].priors, priors)
+
+    def test_model_on_whole_frames(self):
+        net = create_mobilenetv1_ssd(9, is_test=True).eval()
+        net.priors = box_utils.cached_ssd_priors(mobilenetv1_ssd_config.specs, 300)
+        with torch.no_grad():
+            scores, boxes = net(torch.zeros(1, 3, 310, 540))
+        self.assertEqual(scores.shape[1], boxes.shape[1])
+        self.assertEqual(boxes.shape[1], 5508)
+
+
+if __name__ == "__main__":
+    unittest.main()
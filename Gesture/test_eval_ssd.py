@@ -0,0 +1,31 @@
+import unittest
+
+import numpy as np
+import torch
+
+from eval_ssd import average_precision
+
+
+class AveragePrecisionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ground_truth = {
+            0: (torch.tensor([[0.0, 0.0, 10.0, 10.0]]), np.array([False])),
+            1: (torch.tensor([[20.0, 20.0, 40.0, 40.0], [0.0, 0.0, 5.0, 5.0]]), np.array([False, True])),
+        }
+
+    def test_perfect_detections(self):
+        detections = [(0, 0.9, torch.tensor([0.0, 0.0, 10.0, 10.0])),
+                      (1, 0.8, torch.tensor([20.0, 20.0, 40.0, 40.0])),
+                      (1, 0.7, torch.tensor([0.0, 0.0, 5.0, 5.0]))]  # difficult不計入
+        self.assertAlmostEqual(average_precision(self.ground_truth, detections), 1.0)
+        self.assertAlmostEqual(average_precision(self.ground_truth, detections, use_2007_metric=False), 1.0)
+
+    def test_duplicates_and_misses_lower_precision(self):
+        detections = [(0, 0.9, torch.tensor([0.0, 0.0, 10.0, 10.0])),
+                      (0, 0.8, torch.tensor([0.0, 0.0, 10.0, 10.0])),
+                      (2, 0.7, torch.tensor([0.0, 0.0, 10.0, 10.0]))]
+        self.assertAlmostEqual(average_precision(self.ground_truth, detections, use_2007_metric=False), 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
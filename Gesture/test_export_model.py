@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import torch
+
+from export_model import export_onnx, export_torchscript
+from model_loader import load_onnx, load_torchscript, warm_up
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+from vision.ssd.onnx_backend import onnxruntime
+
+
+class TorchScriptExportTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(0)
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.weights = os.path.join(cls.tmp.name, "w.pth")
+        net = create_mobilenetv1_ssd(9, is_test=True)
+        net.save(cls.weights)
+        net.priors = net.priors.cpu()
+        cls.net = net.eval()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_traced_model_matches_eager_for_any_batch_size(self):
+        output = os.path.join(self.tmp.name, "ssd.pt")
+        export_torchscript(9, self.weights, output, device="cpu")
+        module, metadata = load_torchscript(output, torch.device("cpu"))
+        self.assertEqual(metadata["num_classes"], 9)
+        self.assertEqual(metadata["dtype"], "float32")
+        for batch_size in (1, 3):
+            images = torch.randn(batch_size, 3, 300, 300)
+            with torch.no_grad():
+                expected_scores, expected_boxes = self.net(images)
+                scores, boxes = module(images)
+            # 輸出已含softmax與prior解碼
+            torch.testing.assert_close(scores, expected_scores, rtol=0, atol=1e-4)
+            torch.testing.assert_close(boxes, expected_boxes, rtol=0, atol=1e-4)
+
+    def test_metadata_records_export_options(self):
+        output = os.path.join(self.tmp.name, "ssd_cl.pt")
+        export_torchscript(9, self.weights, output, device="cpu", channels_last=True, fuse=False, freeze=False)
+        _, metadata = load_torchscript(output, torch.device("cpu"))
+        self.assertTrue(metadata["channels_last"])
+        self.assertFalse(metadata["fused"])
+
+
+@unittest.skipIf(onnxruntime is None, "onnxruntime is not installed")
+class OnnxExportTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(0)
+        cls.tmp = tempfile.TemporaryDirectory()
+        weights = os.path.join(cls.tmp.name, "w.pth")
+        net = create_mobilenetv1_ssd(9, is_test=True)
+        net.save(weights)
+        net.priors = net.priors.cpu()
+        cls.net = net.eval()
+        cls.output = os.path.join(cls.tmp.name, "ssd.onnx")
+        export_onnx(9, weights, cls.output)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_session_matches_eager_for_any_batch_size(self):
+        onnx_net, metadata = load_onnx(self.output)
+        self.assertEqual(metadata["num_classes"], 9)
+        for io_binding in (True, False):
+            onnx_net.io_binding = io_binding
+            for batch_size in (1, 3):
+                images = torch.randn(batch_size, 3, 300, 300)
+                with torch.no_grad():
+                    expected_scores, expected_boxes = self.net(images)
+                scores, boxes = onnx_net(images)
+                torch.testing.assert_close(scores, expected_scores, rtol=0, atol=1e-4)
+                torch.testing.assert_close(boxes, expected_boxes, rtol=0, atol=1e-4)
+
+    def test_predictor_on_onnxruntime(self):
+        onnx_net, _ = load_onnx(self.output)
+        frames = np.random.RandomState(0).randint(0, 256, (2, 300, 300, 3), np.uint8)
+        sizes = [(640, 480), (300, 300)]
+        expected = create_mobilenetv1_ssd_predictor(self.net, device=torch.device("cpu"))
+        predictor = create_mobilenetv1_ssd_predictor(onnx_net, device=onnx_net.device)
+        for (boxes, labels, probs), (expected_boxes, expected_labels, expected_probs) in zip(
+                predictor.predict_batch(frames, sizes=sizes), expected.predict_batch(frames, sizes=sizes)):
+            self.assertEqual(labels.tolist(), expected_labels.tolist())
+            torch.testing.assert_close(probs, expected_probs, rtol=0, atol=1e-4)
+            torch.testing.assert_close(boxes, expected_boxes, rtol=0, atol=1e-2)
+
+    def test_export_without_dynamo_keyword(self):
+        export = torch.onnx.export
+
+        # 模擬torch 2.4：torch.onnx.export沒有dynamo參數，只有TorchScript匯出器
+        def legacy_export(model, args, f, input_names=None, output_names=None, dynamic_axes=None,
+                          opset_version=None):
+            return export(model, args, f, input_names=input_names, output_names=output_names,
+                          dynamic_axes=dynamic_axes, opset_version=opset_version, dynamo=False)
+
+        weights = os.path.join(self.tmp.name, "w.pth")
+        output = os.path.join(self.tmp.name, "legacy.onnx")
+        with mock.patch("torch.onnx.export", legacy_export):
+            export_onnx(9, weights, output)
+        onnx_net, _ = load_onnx(output)
+        images = torch.randn(2, 3, 300, 300)
+        with torch.no_grad():
+            expected_scores, _ = self.net(images)
+        torch.testing.assert_close(onnx_net(images)[0], expected_scores, rtol=0, atol=1e-4)
+
+
+class _CountingPredictor:
+    size = 300
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict_batch(self, frames, top_k=-1, prob_threshold=None, sizes=None):
+        self.batch_sizes.append(len(frames))
+        return [None] * len(frames)
+
+
+class WarmUpTestCase(unittest.TestCase):
+    def test_every_batch_size_is_run(self):
+        predictor = _CountingPredictor()
+        warm_up(predictor, 3, iterations=2)
+        self.assertEqual(predictor.batch_sizes, [1, 1, 2, 2, 3, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
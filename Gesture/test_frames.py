@@ -0,0 +1,111 @@
+import unittest
+
+import cv2
+import numpy as np
+
+import gesture_pb2
+from frames import (FrameDecodeError, FrameDecoder, decode_image, encode_image, encodings_metadata,
+                    jpeg_size, negotiate_encoding, reduced_decode_flag)
+
+
+class FrameCodecTestCase(unittest.TestCase):
+    def setUp(self):
+        self.image = np.zeros((31, 54, 3), np.uint8)
+        self.image[:, :27] = (0, 128, 255)
+
+    def test_lossless_encodings_round_trip(self):
+        for encoding in ("png", "raw_bgr"):
+            decoded = decode_image(encode_image(self.image, encoding))
+            np.testing.assert_array_equal(decoded, self.image)
+
+    def test_legacy_base64_request_is_decoded(self):
+        request = encode_image(self.image, "base64")
+        self.assertEqual(request.encoding, gesture_pb2.ENCODING_BASE64)
+        self.assertEqual(decode_image(request).shape, self.image.shape)
+
+    def test_raw_jpeg_request_is_decoded(self):
+        request = encode_image(self.image, "jpeg")
+        self.assertEqual(request.image[:2], b"\xff\xd8")
+        self.assertEqual(decode_image(request).shape, self.image.shape)
+
+    def test_bad_frames_raise(self):
+        with self.assertRaises(FrameDecodeError):
+            decode_image(gesture_pb2.RecognitionRequest(image=b"not an image", encoding=gesture_pb2.ENCODING_JPEG))
+        with self.assertRaises(FrameDecodeError):
+            decode_image(gesture_pb2.RecognitionRequest(image=b"\x00" * 10, encoding=gesture_pb2.ENCODING_RAW_BGR,
+                                                        width=2, height=2))
+
+    def test_malformed_base64_raises_decode_error(self):
+        for data in (b"abcde", b"ab!d"):
+            with self.assertRaises(FrameDecodeError):
+                decode_image(gesture_pb2.RecognitionRequest(image=data, encoding=gesture_pb2.ENCODING_BASE64))
+        with self.assertRaises(FrameDecodeError):
+            FrameDecoder(300).decode(gesture_pb2.RecognitionRequest(image=b"abcde"))
+
+    def test_negotiation_falls_back_to_base64(self):
+        self.assertEqual(negotiate_encoding(encodings_metadata(), "jpeg"), "jpeg")
+        self.assertEqual(negotiate_encoding((), "jpeg"), "base64")
+        self.assertEqual(negotiate_encoding(None, "raw_bgr"), "base64")
+
+
+class FrameDecoderTestCase(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.frame = cv2.GaussianBlur(rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8), (31, 31), 10)
+        self.decoder = FrameDecoder(300)
+
+    def reference(self, request):
+        return cv2.cvtColor(cv2.resize(decode_image(request), (300, 300)), cv2.COLOR_BGR2RGB)
+
+    def test_jpeg_size_and_reduced_scale(self):
+        request = encode_image(self.frame, "jpeg")
+        self.assertEqual(jpeg_size(request.image), (1280, 720))
+        self.assertIsNone(jpeg_size(encode_image(self.frame[:10, :10], "png").image))
+        self.assertEqual(reduced_decode_flag(1280, 720, 300), cv2.IMREAD_REDUCED_COLOR_2)
+        self.assertEqual(reduced_decode_flag(2560, 1440, 300), cv2.IMREAD_REDUCED_COLOR_4)
+        self.assertEqual(reduced_decode_flag(540, 310, 300), cv2.IMREAD_COLOR)
+
+    def test_jpeg_close_to_full_decode(self):
+        for encoding in ("jpeg", "base64"):
+            request = encode_image(self.frame, encoding)
+            image, size = self.decoder.decode(request)
+            self.assertEqual(size, (1280, 720))
+            self.assertLessEqual(np.abs(image.astype(int) - self.reference(request)).mean(), 1.0)
+
+    def test_lossless_frames_match_exactly(self):
+        for encoding in ("png", "raw_bgr"):
+            request = encode_image(self.frame[:310, :540], encoding)
+            image, size = self.decoder.decode(request)
+            self.assertEqual(size, (540, 310))
+            np.testing.assert_array_equal(image, self.reference(request))
+
+    def test_decodes_into_reusable_buffer(self):
+        buffer = self.decoder.buffer(2)
+        image, _ = self.decoder.decode(encode_image(self.frame, "jpeg"), buffer[1])
+        self.assertTrue(np.shares_memory(image, buffer))
+        self.assertIs(self.decoder.buffer(2).base, buffer.base)
+        self.assertEqual(self.decoder.buffer(12).shape, (12, 300, 300, 3))
+
+    def test_crop_matches_cropped_frame(self):
+        frame = self.frame[:310, :540]
+        for encoding in ("png", "raw_bgr", "jpeg"):
+            request = encode_image(frame, encoding)
+            image, size, crop = self.decoder.decode_crop(request, (200.4, 100, 461, 250))
+            self.assertEqual((size, crop), ((540, 310), (200, 100, 461, 250)))
+            expected = cv2.cvtColor(cv2.resize(decode_image(request)[100:250, 200:461], (300, 300)), cv2.COLOR_BGR2RGB)
+            self.assertLessEqual(np.abs(image.astype(int) - expected).mean(), 0 if encoding != "jpeg" else 1.0)
+
+    def test_crop_is_clipped_and_scaled_with_reduced_decode(self):
+        request = encode_image(self.frame, "jpeg")
+        _, _, crop = self.decoder.decode_crop(request, (-50, 600, 2000, 900))
+        self.assertEqual(crop, (0, 600, 1280, 720))
+        image, _, crop = self.decoder.decode_crop(request, (0, 0, 1280, 720))
+        self.assertLessEqual(np.abs(image.astype(int) - self.reference(request)).mean(), 1.0)
+
+    def test_bad_frames_raise(self):
+        with self.assertRaises(FrameDecodeError):
+            self.decoder.decode(gesture_pb2.RecognitionRequest(image=b"\xff\xd8junk", encoding=gesture_pb2.ENCODING_JPEG))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import threading
+import time
+import unittest
+from concurrent import futures
+
+import grpc
+import numpy as np
+
+import gesture_pb2
+import gesture_pb2_grpc
+from frames import decode_image, encodings_metadata
+from gesture_client import GestureClient, percentile, run_loadgen
+
+
+class _EchoServicer(gesture_pb2_grpc.GestureRecognitionServicer):
+    def __init__(self):
+        self.encodings = []
+        self.lock = threading.Lock()
+
+    def Recognition(self, request, context):
+        if request.encoding == gesture_pb2.ENCODING_BASE64:
+            context.send_initial_metadata(encodings_metadata())
+        width = decode_image(request).shape[1]
+        if width == 1:
+            context.abort(grpc.StatusCode.UNAVAILABLE, "server going away")
+        if width == 2:
+            time.sleep(0.5)
+        with self.lock:
+            self.encodings.append(request.encoding)
+            index = len(self.encodings)
+        return gesture_pb2.RecognitionReply(frame_index=index, action='{"Left": "", "Right": ""}')
+
+
+class GestureClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.servicer = _EchoServicer()
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+        gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(self.servicer, self.server)
+        port = self.server.add_insecure_port("localhost:0")
+        self.server.start()
+        self.addCleanup(self.server.stop, None)
+        self.client = GestureClient(f"localhost:{port}", num_channels=2, window=4, encoding="raw_bgr", timeout=10)
+        self.addCleanup(self.client.close)
+        self.frame = np.zeros((31, 54, 3), np.uint8)
+
+    def test_negotiates_then_sends_raw_frames(self):
+        self.client.recognize(self.frame)
+        self.client.recognize(self.frame)
+        self.assertEqual(self.client.encoding, "raw_bgr")
+        self.assertEqual(self.servicer.encodings,
+                         [gesture_pb2.ENCODING_BASE64, gesture_pb2.ENCODING_RAW_BGR])
+
+    def test_pipelined_requests(self):
+        self.client.recognize(self.frame)
+        replies = [f.result() for f in [self.client.submit(self.frame) for _ in range(10)]]
+        self.assertEqual(sorted(r.frame_index for r in replies), list(range(2, 12)))
+
+    def test_unavailable_keeps_other_calls(self):
+        client = GestureClient(self.client.target, num_channels=1, window=4, encoding="raw_bgr", timeout=10)
+        self.addCleanup(client.close)
+        client.recognize(self.frame)
+        slow = client.submit(np.zeros((31, 2, 3), np.uint8))
+        time.sleep(0.1)
+        failed = client.submit(np.zeros((31, 1, 3), np.uint8))
+        self.assertEqual(failed.exception(timeout=10).code(), grpc.StatusCode.UNAVAILABLE)
+        # 重建channel時不能取消舊channel上仍在進行的呼叫
+        self.assertGreater(slow.result(timeout=10).frame_index, 0)
+        self.assertGreater(client.submit(self.frame).result(timeout=10).frame_index, 0)
+        # 舊channel在最後一個呼叫的callback裡關閉
+        deadline = time.monotonic() + 5
+        while client._retired and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(client._retired, {})
+
+    def test_loadgen_report(self):
+        report = run_loadgen(self.client, [self.frame], fps=50, duration=0.2)
+        self.assertEqual(report["errors"], 0)
+        self.assertEqual(report["completed"], report["sent"])
+        self.assertLessEqual(report["p50_ms"], report["p99_ms"])
+
+
+class PercentileTestCase(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
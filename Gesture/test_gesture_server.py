@@ -0,0 +1,247 @@
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from concurrent import futures
+
+import grpc
+import numpy as np
+from grpc_health.v1 import health_pb2, health_pb2_grpc
+
+import gesture_pb2
+import gesture_pb2_grpc
+from config import settings
+from frames import encode_image
+from model_loader import load_class_names
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd
+
+import GestureBatchNew
+
+# 隨機權重的模型只用來走過完整的伺服器流程，辨識結果沒有意義
+TEST_SETTINGS = dict(num_workers=1, worker_mode="thread", warmup_iterations=1, batch_size=2, stream_window=2,
+                     temporal_cache=False, roi_tracking=False, pipeline_depth=0, share_weights=False)
+
+
+def frame_request(value=0, encoding="jpeg"):
+    return encode_image(np.full((310, 540, 3), value, np.uint8), encoding)
+
+
+class ServerTestCase(unittest.TestCase):
+    """Runs a GestureBatchNew service with a random-weight model on a local port."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        weights = os.path.join(cls.tmpdir.name, "random-ssd.pth")
+        create_mobilenetv1_ssd(len(load_class_names())).save(weights)
+        cls.saved_settings = {name: getattr(settings, name) for name in list(TEST_SETTINGS) + ["weights"]}
+        for name, value in dict(TEST_SETTINGS, weights=weights).items():
+            setattr(settings, name, value)
+
+    @classmethod
+    def tearDownClass(cls):
+        for name, value in cls.saved_settings.items():
+            setattr(settings, name, value)
+        cls.tmpdir.cleanup()
+
+
+class SyncServerTestCase(ServerTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = GestureBatchNew.GestureRecognitionService()
+        cls.service.start()
+        cls.server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+        gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(cls.service, cls.server)
+        port = cls.server.add_insecure_port("localhost:0")
+        cls.server.start()
+        cls.channel = grpc.insecure_channel(f"localhost:{port}")
+        cls.stub = gesture_pb2_grpc.GestureRecognitionStub(cls.channel)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.channel.close()
+        cls.server.stop(None).wait()
+        cls.service.close()
+        super().tearDownClass()
+
+    def stream_threads(self):
+        return [thread for thread in threading.enumerate() if thread.name.startswith("gesture-stream")]
+
+    def test_stream_replies_in_order(self):
+        replies = list(self.stub.RecognitionStream(iter([frame_request(i) for i in range(6)]), timeout=30))
+        indexes = [reply.frame_index for reply in replies]
+        self.assertEqual(len(indexes), 6)
+        self.assertEqual(indexes, sorted(indexes))
+
+    def test_cancelled_stream_leaves_no_thread(self):
+        def frames():
+            while True:
+                yield frame_request()
+
+        for _ in range(3):
+            call = self.stub.RecognitionStream(frames(), timeout=30)
+            next(call)
+            # 不再讀取回覆，讓伺服器的pending填滿後才取消
+            time.sleep(0.5)
+            call.cancel()
+        deadline = time.monotonic() + 10
+        while self.stream_threads() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        self.assertEqual(self.stream_threads(), [])
+
+    def test_malformed_frame_fails_only_itself(self):
+        with self.assertRaises(grpc.RpcError) as raised:
+            self.stub.Recognition(gesture_pb2.RecognitionRequest(image=b"abcde"), timeout=30)
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.INVALID_ARGUMENT)
+        self.assertGreater(self.stub.Recognition(frame_request(encoding="base64"), timeout=30).frame_index, 0)
+
+    def test_calls_beyond_handler_threads_fail_fast(self):
+        saved = settings.grpc_max_workers
+        settings.grpc_max_workers = 1
+        try:
+            server = GestureBatchNew.create_server()
+        finally:
+            settings.grpc_max_workers = saved
+        gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(self.service, server)
+        port = server.add_insecure_port("localhost:0")
+        server.start()
+        release = threading.Event()
+
+        def frames():
+            yield frame_request()
+            release.wait(30)
+
+        try:
+            with grpc.insecure_channel(f"localhost:{port}") as channel:
+                stub = gesture_pb2_grpc.GestureRecognitionStub(channel)
+                # 開著的stream佔住唯一的handler執行緒
+                stream = stub.RecognitionStream(frames(), timeout=30)
+                next(stream)
+                with self.assertRaises(grpc.RpcError) as raised:
+                    stub.Recognition(frame_request(), timeout=5)
+                self.assertEqual(raised.exception.code(), grpc.StatusCode.RESOURCE_EXHAUSTED)
+                release.set()
+                self.assertEqual(list(stream), [])
+        finally:
+            release.set()
+            server.stop(None).wait()
+
+
+class PipelinedWorkerTestCase(ServerTestCase):
+    def test_batch_latency_is_model_time(self):
+        settings.pipeline_depth = 2
+        try:
+            worker = GestureBatchNew.GestureDetectionWorker(0)
+        finally:
+            settings.pipeline_depth = 0
+        forward, decode = worker.recognizer.forward, worker.pipeline.stages[0][1]
+
+        def slow_forward(frames):
+            time.sleep(0.05)
+            return forward(frames)
+
+        def slow_decode(job):
+            time.sleep(0.5)
+            return decode(job)
+
+        worker.recognizer.forward = slow_forward
+        worker.pipeline.stages[0] = ("decode", slow_decode)
+        worker.start()
+        try:
+            for future in [worker.submit(frame_request(i)) for i in range(4)]:
+                future.result(timeout=30)
+        finally:
+            worker.batcher.close()
+        # 解碼與階段間排隊的時間不算進batch延遲
+        self.assertGreaterEqual(worker.batch_latency, 0.05)
+        self.assertLess(worker.batch_latency, 0.5)
+
+
+class AsyncServerTestCase(ServerTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.service = GestureBatchNew.AsyncGestureRecognitionService()
+        cls.service.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.close()
+        super().tearDownClass()
+
+    def run_client(self, client):
+        async def run():
+            server = grpc.aio.server()
+            gesture_pb2_grpc.add_GestureRecognitionServicer_to_server(self.service, server)
+            port = server.add_insecure_port("localhost:0")
+            await server.start()
+            try:
+                async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+                    return await client(gesture_pb2_grpc.GestureRecognitionStub(channel))
+            finally:
+                await server.stop(None)
+        return asyncio.run(run())
+
+    def test_unary(self):
+        async def client(stub):
+            return await stub.Recognition(frame_request(encoding="base64"), timeout=30)
+        reply = self.run_client(client)
+        self.assertGreater(reply.frame_index, 0)
+        self.assertIn("Left", reply.action)
+
+    def test_stream_replies_in_order(self):
+        async def client(stub):
+            return [reply.frame_index async for reply in
+                    stub.RecognitionStream(iter([frame_request(i) for i in range(5)]), timeout=30)]
+        indexes = self.run_client(client)
+        self.assertEqual(len(indexes), 5)
+        self.assertEqual(indexes, sorted(indexes))
+
+    def test_decode_error_status(self):
+        async def client(stub):
+            with self.assertRaises(grpc.aio.AioRpcError) as raised:
+                await stub.Recognition(gesture_pb2.RecognitionRequest(image=b"abcde"), timeout=30)
+            return raised.exception.code()
+        self.assertEqual(self.run_client(client), grpc.StatusCode.INVALID_ARGUMENT)
+
+    def test_serve_aio(self):
+        with socket.socket() as sock:
+            sock.bind(("localhost", 0))
+            port = sock.getsockname()[1]
+        saved = settings.gRPC_port, settings.metrics_port
+        settings.gRPC_port, settings.metrics_port = str(port), 0
+
+        async def run():
+            server = asyncio.create_task(GestureBatchNew.serve_aio())
+            try:
+                async with grpc.aio.insecure_channel(f"localhost:{port}") as channel:
+                    health = health_pb2_grpc.HealthStub(channel)
+                    for _ in range(300):
+                        try:
+                            response = await health.Check(health_pb2.HealthCheckRequest(), timeout=1)
+                            if response.status == health_pb2.HealthCheckResponse.SERVING:
+                                break
+                        except grpc.aio.AioRpcError:
+                            pass
+                        await asyncio.sleep(0.1)
+                    stub = gesture_pb2_grpc.GestureRecognitionStub(channel)
+                    return response.status, await stub.Recognition(frame_request(), timeout=30)
+            finally:
+                server.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await server
+
+        try:
+            status, reply = asyncio.run(run())
+        finally:
+            settings.gRPC_port, settings.metrics_port = saved
+        self.assertEqual(status, health_pb2.HealthCheckResponse.SERVING)
+        self.assertGreater(reply.frame_index, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
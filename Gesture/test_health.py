@@ -0,0 +1,94 @@
+import asyncio
+import unittest
+
+from grpc_health.v1 import health, health_pb2
+
+from health import NOT_SERVING, SERVICE_NAMES, SERVING, LatencyWindow, ReadinessMonitor
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def check(servicer, service):
+    return servicer.Check(health_pb2.HealthCheckRequest(service=service), None).status
+
+
+class LatencyWindowTestCase(unittest.TestCase):
+    def test_old_latencies_leave_the_window(self):
+        clock = FakeClock()
+        latencies = LatencyWindow(10.0, clock)
+        self.assertIsNone(latencies.percentile(99))
+        for latency in [0.01] * 98 + [2.0, 2.0]:
+            latencies.record(latency)
+        self.assertGreater(latencies.percentile(99), 1.0)
+        self.assertAlmostEqual(latencies.percentile(50), 0.01)
+        clock.now = 11.0
+        latencies.record(0.02)
+        self.assertAlmostEqual(latencies.percentile(99), 0.02)
+
+
+class ReadinessMonitorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.servicer = health.HealthServicer()
+        self.depth = 0
+        self.clock = FakeClock()
+        self.latencies = LatencyWindow(10.0, self.clock)
+        self.monitor = ReadinessMonitor(self.servicer, queue_depth=lambda: self.depth, latencies=self.latencies,
+                                        max_queue_depth=8, max_p99_latency=0.5)
+
+    def statuses(self):
+        return [check(self.servicer, service) for service in SERVICE_NAMES]
+
+    def test_not_serving_until_warmed_up(self):
+        self.assertEqual(self.statuses(), [NOT_SERVING, NOT_SERVING])
+        self.assertEqual(self.monitor.mark_ready(), SERVING)
+        self.assertEqual(self.statuses(), [SERVING, SERVING])
+
+    def test_backlog_and_latency_saturate_the_server(self):
+        self.monitor.mark_ready()
+        self.depth = 9
+        self.assertEqual(self.monitor.update(), NOT_SERVING)
+        self.assertIn("queue depth", self.monitor.reason)
+        self.depth = 2
+        self.assertEqual(self.monitor.update(), SERVING)
+
+        for _ in range(10):
+            self.latencies.record(0.8)
+        self.assertEqual(self.monitor.update(), NOT_SERVING)
+        self.assertEqual(self.statuses(), [NOT_SERVING, NOT_SERVING])
+        self.clock.now = 20.0
+        self.assertEqual(self.monitor.update(), SERVING)
+
+    def test_close_reports_not_serving(self):
+        self.monitor.mark_ready()
+        self.monitor.start()
+        self.monitor.close()
+        self.assertEqual(self.statuses(), [NOT_SERVING, NOT_SERVING])
+
+
+class AsyncReadinessMonitorTestCase(unittest.TestCase):
+    def test_statuses_are_set_on_the_event_loop(self):
+        async def run():
+            servicer = health.aio.HealthServicer()
+            monitor = ReadinessMonitor(servicer, loop=asyncio.get_running_loop())
+            await asyncio.sleep(0.01)
+            before = [(await servicer.Check(health_pb2.HealthCheckRequest(service=name), None)).status
+                      for name in SERVICE_NAMES]
+            monitor.mark_ready()
+            await asyncio.sleep(0.01)
+            after = [(await servicer.Check(health_pb2.HealthCheckRequest(service=name), None)).status
+                     for name in SERVICE_NAMES]
+            return before, after
+
+        before, after = asyncio.run(run())
+        self.assertEqual(before, [NOT_SERVING, NOT_SERVING])
+        self.assertEqual(after, [SERVING, SERVING])
+
+
+if __name__ == "__main__":
+    unittest.main()
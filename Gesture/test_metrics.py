@@ -0,0 +1,61 @@
+import unittest
+
+import metrics
+
+
+@unittest.skipIf(metrics.prometheus_client is None, "prometheus_client is not installed")
+class MetricsTestCase(unittest.TestCase):
+    def sample(self, name, **labels):
+        return metrics.prometheus_client.REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_inference_stages(self):
+        forwards = self.sample("gesture_stage_seconds_count", stage="forward")
+        frames = self.sample("gesture_frames_total")
+        batches = self.sample("gesture_batch_size_count")
+        metrics.observe_inference("preprocess", 0.002, 3)
+        metrics.observe_inference("forward", 0.02, 3)
+        metrics.observe_inference("postprocess", 0.001, 3)
+        self.assertEqual(self.sample("gesture_stage_seconds_count", stage="forward"), forwards + 1)
+        self.assertEqual(self.sample("gesture_frames_total"), frames + 3)
+        self.assertEqual(self.sample("gesture_batch_size_count"), batches + 1)
+
+    def test_temporal_cache_saved_seconds(self):
+        metrics.observe_inference("forward", 0.03, 3)
+        per_frame = metrics._forward_seconds_per_frame
+        hits = self.sample("gesture_temporal_cache_total", result="hit")
+        saved = self.sample("gesture_temporal_cache_saved_seconds_total")
+        metrics.temporal_cache_lookup("hit")
+        metrics.temporal_cache_lookup("miss")
+        self.assertEqual(self.sample("gesture_temporal_cache_total", result="hit"), hits + 1)
+        self.assertAlmostEqual(self.sample("gesture_temporal_cache_saved_seconds_total"), saved + per_frame)
+
+    def test_worker_gauges(self):
+        stats = [{"worker": 0, "queue_depth": 3, "batch_latency": 0.04},
+                 {"worker": 1, "queue_depth": 0, "batch_latency": None}]
+        registry = metrics.prometheus_client.CollectorRegistry()
+        registry.register(metrics._LoadCollector(lambda: 3, lambda: stats))
+        self.assertEqual(registry.get_sample_value("gesture_queue_depth"), 3)
+        self.assertEqual(registry.get_sample_value("gesture_worker_queue_depth", {"worker": "0"}), 3)
+        self.assertEqual(registry.get_sample_value("gesture_worker_queue_depth", {"worker": "1"}), 0)
+        self.assertEqual(registry.get_sample_value("gesture_worker_batch_latency_seconds", {"worker": "0"}), 0.04)
+        # 還沒量到batch時間的worker不回報延遲
+        self.assertIsNone(registry.get_sample_value("gesture_worker_batch_latency_seconds", {"worker": "1"}))
+
+    def test_decode_timer(self):
+        decodes = self.sample("gesture_stage_seconds_count", stage="decode")
+        with metrics.stage_timer("decode"):
+            pass
+        self.assertEqual(self.sample("gesture_stage_seconds_count", stage="decode"), decodes + 1)
+
+    def test_in_flight_requests(self):
+        in_flight = self.sample("gesture_in_flight_requests")
+        requests = self.sample("gesture_request_seconds_count")
+        metrics.request_started()
+        self.assertEqual(self.sample("gesture_in_flight_requests"), in_flight + 1)
+        metrics.request_finished(0.05)
+        self.assertEqual(self.sample("gesture_in_flight_requests"), in_flight)
+        self.assertEqual(self.sample("gesture_request_seconds_count"), requests + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import threading
+import time
+import unittest
+
+from pipeline import Pipeline
+
+
+class PipelineTestCase(unittest.TestCase):
+    def test_stages_overlap_and_keep_order(self):
+        done = []
+
+        def stage(name):
+            def run(job):
+                time.sleep(0.02)
+                return job + [name]
+            return run
+
+        pipeline = Pipeline([("a", stage("a")), ("b", stage("b")), ("c", lambda job: done.append(job))], depth=1)
+        pipeline.start()
+        start = time.perf_counter()
+        for i in range(10):
+            pipeline.put([i])
+        pipeline.close()
+        pipeline.join()
+        elapsed = time.perf_counter() - start
+        self.assertEqual(done, [[i, "a", "b"] for i in range(10)])
+        # 依序執行需要0.4秒，兩個階段重疊後接近0.2秒
+        self.assertLess(elapsed, 0.32)
+        self.assertGreaterEqual(pipeline.busy["a"], 0.2)
+
+    def test_failed_job_goes_to_on_error(self):
+        failed, done = [], []
+
+        def check(job):
+            if job == 2:
+                raise ValueError("bad job")
+            return job
+
+        pipeline = Pipeline([("check", check), ("done", done.append)],
+                            on_error=lambda job, exc: failed.append((job, str(exc)))).start()
+        for i in range(4):
+            pipeline.put(i)
+        pipeline.close()
+        pipeline.join()
+        self.assertEqual(done, [0, 1, 3])
+        self.assertEqual(failed, [(2, "bad job")])
+
+    def test_put_blocks_when_full(self):
+        started, release = threading.Event(), threading.Event()
+
+        def wait(job):
+            started.set()
+            release.wait()
+
+        pipeline = Pipeline([("wait", wait)], depth=1).start()
+        pipeline.put(0)
+        started.wait(1)
+        pipeline.put(1)
+        blocked = threading.Thread(target=pipeline.put, args=(2,))
+        blocked.start()
+        blocked.join(0.05)
+        self.assertTrue(blocked.is_alive())
+        release.set()
+        blocked.join(1)
+        self.assertFalse(blocked.is_alive())
+        pipeline.close()
+        pipeline.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
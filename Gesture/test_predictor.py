@@ -0,0 +1,255 @@
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+import torch
+
+from vision.ssd.data_preprocessing import DevicePredictionTransform, PredictionTransform
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+from vision.ssd.predictor import Predictor, resolve_dtype
+
+
+def make_predictor(**kwargs):
+    return Predictor(torch.nn.Identity(), 300, iou_threshold=0.45, candidate_size=200,
+                     device=torch.device("cpu"), **kwargs)
+
+
+def random_detections(num_images, num_priors=400, num_classes=9, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    scores = torch.softmax(torch.randn(num_images, num_priors, num_classes, generator=generator) * 3, dim=2)
+    centers = torch.rand(num_images, num_priors, 2, generator=generator)
+    sizes = torch.rand(num_images, num_priors, 2, generator=generator) * 0.3 + 0.05
+    boxes = torch.cat([centers - sizes / 2, centers + sizes / 2], dim=2)
+    return scores, boxes
+
+
+class BatchedPostprocessTestCase(unittest.TestCase):
+    def assert_same_results(self, expected, actual):
+        self.assertEqual(len(expected), len(actual))
+        for (boxes0, labels0, probs0), (boxes1, labels1, probs1) in zip(expected, actual):
+            torch.testing.assert_close(boxes1, boxes0)
+            self.assertTrue(torch.equal(labels1, labels0))
+            torch.testing.assert_close(probs1, probs0)
+
+    def check(self, top_k, prob_threshold, num_images=4):
+        predictor = make_predictor()
+        scores, boxes = random_detections(num_images)
+        widths, heights = [540, 300, 640, 100][:num_images], [310, 300, 480, 50][:num_images]
+        expected = [predictor._postprocess(scores[i], boxes[i], widths[i], heights[i], top_k, prob_threshold)
+                    for i in range(num_images)]
+        actual = predictor._postprocess_batch(scores, boxes, widths, heights, top_k, prob_threshold)
+        self.assert_same_results(expected, actual)
+
+    def test_matches_per_image_postprocess(self):
+        self.check(top_k=-1, prob_threshold=0.2)
+
+    def test_matches_with_top_k(self):
+        self.check(top_k=1, prob_threshold=0.1)
+        self.check(top_k=3, prob_threshold=0.05)
+
+    def test_images_without_detections(self):
+        self.check(top_k=1, prob_threshold=0.99)
+        self.check(top_k=-1, prob_threshold=0.6, num_images=1)
+
+
+class CropOffsetTestCase(unittest.TestCase):
+    def test_boxes_are_moved_to_frame_coordinates(self):
+        scores, boxes = random_detections(2, seed=5)
+        for kwargs in ({}, {"single_best": True}, {"nms_method": "soft"}):
+            predictor = make_predictor(**kwargs)
+            expected = predictor._postprocess_all(scores, boxes, [260, 540], [150, 310], 3, 0.2)
+            actual = predictor._postprocess_all(scores, boxes, [260, 540], [150, 310], 3, 0.2,
+                                                offsets=[(200, 100), (0, 0)])
+            torch.testing.assert_close(actual[0][0], expected[0][0] + torch.tensor([200.0, 100.0, 200.0, 100.0]))
+            torch.testing.assert_close(actual[1][0], expected[1][0])
+            self.assertTrue(torch.equal(actual[0][1], expected[0][1]))
+
+
+class SingleBestTestCase(unittest.TestCase):
+    def test_matches_strongest_nms_detection(self):
+        predictor = make_predictor(single_best=True)
+        scores, boxes = random_detections(4, seed=3)
+        widths, heights = [540, 300, 640, 100], [310, 300, 480, 50]
+        nms_results = predictor._postprocess_batch(scores, boxes, widths, heights, 1, 0.1)
+        best_results = predictor._postprocess_best(scores, boxes, widths, heights, 0.1)
+        for (boxes0, labels0, probs0), (boxes1, labels1, probs1) in zip(nms_results, best_results):
+            strongest = probs0.argmax()
+            torch.testing.assert_close(boxes1[0], boxes0[strongest])
+            self.assertEqual(labels1.tolist(), [labels0[strongest].item()])
+            torch.testing.assert_close(probs1[0], probs0[strongest])
+
+    def test_below_threshold(self):
+        predictor = make_predictor(single_best=True)
+        scores, boxes = random_detections(2, seed=4)
+        for boxes0, labels0, probs0 in predictor._postprocess_best(scores, boxes, [540, 540], [310, 310], 1.0):
+            self.assertEqual(labels0.numel(), 0)
+
+
+class DevicePreprocessTestCase(unittest.TestCase):
+    mean = np.array([127, 127, 127])
+    std = 128.0
+
+    def check(self, images):
+        expected = torch.stack([PredictionTransform(300, self.mean, self.std)(image) for image in images])
+        actual = DevicePredictionTransform(300, self.mean, self.std, torch.device("cpu"))(images)
+        self.assertEqual(actual.shape, expected.shape)
+        # cv2在uint8上以定點數內插並四捨五入，允許約一個灰階的誤差
+        torch.testing.assert_close(actual, expected, rtol=0, atol=1.5 / self.std)
+
+    def test_matches_prediction_transform(self):
+        rng = np.random.default_rng(0)
+        self.check([rng.integers(0, 256, (480, 640, 3), dtype=np.uint8) for _ in range(3)])
+
+    def test_decoded_batch_array(self):
+        rng = np.random.default_rng(2)
+        frames = rng.integers(0, 256, (3, 300, 300, 3), dtype=np.uint8)
+        transform = DevicePredictionTransform(300, self.mean, self.std, torch.device("cpu"))
+        torch.testing.assert_close(transform(frames), transform(list(frames)))
+
+    def test_mixed_sizes_and_model_size(self):
+        rng = np.random.default_rng(1)
+        self.check([rng.integers(0, 256, shape, dtype=np.uint8) for shape in [(480, 640, 3), (300, 300, 3), (120, 90, 3)]])
+
+    def test_threads_do_not_share_staging(self):
+        transform = DevicePredictionTransform(300, self.mean, self.std, torch.device("cpu"))
+        batches = [[np.full((300, 300, 3), value, np.uint8)] * 2 for value in range(0, 256, 32)]
+        expected = [transform(batch) for batch in batches]
+        failures = []
+
+        def run(index):
+            for _ in range(20):
+                if not torch.equal(transform(batches[index]), expected[index]):
+                    failures.append(index)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(batches))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(failures, [])
+
+
+class InferenceOptimizationTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        torch.manual_seed(0)
+        net = create_mobilenetv1_ssd(9, is_test=True)
+        for module in net.modules():
+            if isinstance(module, torch.nn.BatchNorm2d):
+                module.running_mean.uniform_(-0.5, 0.5)
+                module.running_var.uniform_(0.5, 2.0)
+                module.weight.data.uniform_(0.5, 1.5)
+                module.bias.data.uniform_(-0.2, 0.2)
+        cls.state = net.state_dict()
+        cls.frames = np.random.default_rng(0).integers(0, 256, (2, 300, 300, 3), dtype=np.uint8)
+        cls.expected = cls.forward(create_mobilenetv1_ssd_predictor(cls.build(), device=torch.device("cpu")))
+
+    @classmethod
+    def build(cls):
+        net = create_mobilenetv1_ssd(9, is_test=True)
+        net.load_state_dict(cls.state)
+        return net
+
+    @classmethod
+    def forward(cls, predictor):
+        with torch.no_grad():
+            return predictor.net(predictor._preprocess(cls.frames))
+
+    def test_resolve_dtype(self):
+        cpu = torch.device("cpu")
+        self.assertEqual(resolve_dtype("fp32", cpu), torch.float32)
+        # CPU沒有快速的fp16卷積，只會退回bf16或fp32
+        self.assertIn(resolve_dtype("fp16", cpu), (torch.bfloat16, torch.float32))
+        self.assertEqual(resolve_dtype("auto", cpu), resolve_dtype("bf16", cpu))
+        with self.assertRaises(ValueError):
+            resolve_dtype("int8", cpu)
+
+    def test_fused_channels_last_matches_fp32(self):
+        predictor = create_mobilenetv1_ssd_predictor(self.build(), device=torch.device("cpu"),
+                                                     fuse=True, channels_last=True)
+        self.assertFalse(any(isinstance(m, torch.nn.BatchNorm2d) for m in predictor.net.modules()))
+        scores, boxes = self.forward(predictor)
+        torch.testing.assert_close(scores, self.expected[0], rtol=0, atol=1e-4)
+        torch.testing.assert_close(boxes, self.expected[1], rtol=0, atol=1e-4)
+
+    def test_reduced_precision_keeps_float32_outputs(self):
+        predictor = create_mobilenetv1_ssd_predictor(self.build(), device=torch.device("cpu"), precision="auto")
+        scores, boxes = self.forward(predictor)
+        self.assertEqual(scores.dtype, torch.float32)
+        self.assertEqual(boxes.dtype, torch.float32)
+        torch.testing.assert_close(scores.sum(dim=2), torch.ones(scores.shape[:2]))
+        torch.testing.assert_close(scores, self.expected[0], rtol=0, atol=0.05)
+
+    def test_observer_sees_every_stage(self):
+        predictor = create_mobilenetv1_ssd_predictor(self.build(), device=torch.device("cpu"))
+        stages = []
+        predictor.observer = lambda stage, seconds, batch_size: stages.append((stage, batch_size, seconds >= 0))
+        batch_results = predictor.predict_batch(self.frames, sizes=[(640, 480)] * 2)
+        boxes, labels, probs = predictor.predict(self.frames[1], size=(640, 480))
+        self.assertEqual(stages, [("preprocess", 2, True), ("forward", 2, True), ("postprocess", 2, True),
+                                  ("preprocess", 1, True), ("forward", 1, True), ("postprocess", 1, True)])
+        self.assertTrue(torch.equal(labels, batch_results[1][1]))
+        torch.testing.assert_close(boxes, batch_results[1][0], rtol=0, atol=1e-3)
+
+    def test_gpu_forward_time_is_read_after_results(self):
+        class FakeEvent:
+            done = False
+
+            def __init__(self, enable_timing=False):
+                self.time = len(recorded) * 5.0
+                recorded.append(self)
+
+            def record(self):
+                pass
+
+            def query(self):
+                return self.done
+
+            def elapsed_time(self, end):
+                return end.time - self.time
+
+        recorded, stages = [], []
+        predictor = make_predictor()
+        predictor.device = torch.device("cuda")
+        predictor.observer = lambda stage, seconds, batch_size: stages.append((stage, seconds, batch_size))
+        with mock.patch("torch.cuda.Event", FakeEvent):
+            predictor._observe("forward", 0.0, 3, predictor._timing_event())
+            predictor._report_forward()
+            self.assertEqual(stages, [])  # GPU還沒跑到結束event
+            for event in recorded:
+                event.done = True
+            predictor._report_forward()
+        self.assertEqual(stages, [("forward", 0.005, 3)])
+
+
+class ReplicaTestCase(unittest.TestCase):
+    def test_replicas_share_weights(self):
+        torch.manual_seed(0)
+        predictor = create_mobilenetv1_ssd_predictor(create_mobilenetv1_ssd(9, is_test=True),
+                                                     device=torch.device("cpu"), device_preprocess=True)
+        replicas = [predictor.replica() for _ in range(3)]
+        self.assertTrue(all(replica.net is predictor.net for replica in replicas))
+        self.assertEqual(len({id(replica.device_transform) for replica in replicas}), 3)
+        self.assertIsNone(replicas[0].stream)
+
+        frames = np.random.default_rng(1).integers(0, 256, (4, 2, 300, 300, 3), dtype=np.uint8)
+        expected = [predictor.predict_batch(batch, prob_threshold=0.2, sizes=[(540, 310)] * 2) for batch in frames]
+        actual = [None] * len(frames)
+
+        def run(i):
+            actual[i] = replicas[i % 3].predict_batch(frames[i], prob_threshold=0.2, sizes=[(540, 310)] * 2)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(frames))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for expected_batch, actual_batch in zip(expected, actual):
+            for (boxes0, labels0, _), (boxes1, labels1, _) in zip(expected_batch, actual_batch):
+                self.assertTrue(torch.equal(labels1, labels0))
+                torch.testing.assert_close(boxes1, boxes0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+
+from model_loader import load_torchscript
+from quantize_model import calibration_batches, quantize_model
+from vision.ssd.mobilenetv1_ssd import create_mobilenetv1_ssd, create_mobilenetv1_ssd_predictor
+
+
+class RandomImages:
+    """Stands in for a VOCDataset in calibration."""
+
+    def __init__(self, count):
+        self.images = np.random.RandomState(0).randint(0, 256, (count, 240, 320, 3), np.uint8)
+
+    def __len__(self):
+        return len(self.images)
+
+    def get_image(self, index):
+        return self.images[index]
+
+
+class QuantizeModelTestCase(unittest.TestCase):
+    def test_calibration_batches_cover_the_split(self):
+        batches = list(calibration_batches(RandomImages(20), 10, batch_size=4))
+        self.assertEqual([len(batch) for batch in batches], [4, 4, 2])
+        self.assertEqual(tuple(batches[0].shape[1:]), (3, 300, 300))
+
+    def test_quantized_model_is_a_drop_in(self):
+        torch.manual_seed(0)
+        net = create_mobilenetv1_ssd(9, is_test=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            weights = os.path.join(tmp, "w.pth")
+            output = os.path.join(tmp, "int8.pt")
+            net.save(weights)
+            quantize_model(9, weights, output, RandomImages(8), num_images=8)
+            quantized, metadata = load_torchscript(output)
+
+        self.assertEqual(metadata["quantization"], "int8_static")
+        self.assertEqual(metadata["calibration_images"], 8)
+        net.priors = net.priors.cpu()
+        images = next(calibration_batches(RandomImages(2), 2))
+        with torch.no_grad():
+            expected_scores, expected_boxes = net.eval()(images)
+            scores, boxes = quantized(images)
+        torch.testing.assert_close(scores, expected_scores, rtol=0, atol=0.05)
+        torch.testing.assert_close(boxes, expected_boxes, rtol=0, atol=0.05)
+
+        predictor = create_mobilenetv1_ssd_predictor(quantized, device=torch.device("cpu"))
+        frames = RandomImages(2).images
+        self.assertEqual(len(predictor.predict_batch(list(frames))), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import torch
+
+from roi_tracker import RoiTracker, crop_around
+
+
+class CropAroundTestCase(unittest.TestCase):
+    def test_keeps_frame_aspect_and_min_height(self):
+        x0, y0, x1, y1 = crop_around((250, 120, 290, 160), (540, 310), margin=0.5, min_height=150)
+        self.assertEqual(y1 - y0, 150)
+        self.assertAlmostEqual((x1 - x0) / (y1 - y0), 540 / 310, places=2)
+        self.assertAlmostEqual((x0 + x1) / 2, 270, delta=1)
+        self.assertAlmostEqual((y0 + y1) / 2, 140, delta=1)
+
+    def test_grows_with_the_box(self):
+        x0, y0, x1, y1 = crop_around((200, 100, 260, 200), (540, 310), margin=0.25, min_height=10)
+        self.assertEqual(y1 - y0, 150)
+        self.assertLessEqual(x0, 200)
+        self.assertGreaterEqual(x1, 260)
+
+    def test_shifted_inside_the_frame(self):
+        x0, y0, x1, y1 = crop_around((0, 280, 30, 310), (540, 310), min_height=150)
+        self.assertEqual((x0, y1), (0, 310))
+        self.assertEqual(y1 - y0, 150)
+
+    def test_large_boxes_use_the_whole_frame(self):
+        self.assertIsNone(crop_around((100, 50, 400, 250), (540, 310)))
+
+
+class RoiTrackerTestCase(unittest.TestCase):
+    def test_crops_until_refresh(self):
+        tracker = RoiTracker(refresh_interval=2)
+        self.assertIsNone(tracker.region())
+        hand = torch.tensor([[250.0, 120.0, 290.0, 160.0]])
+        tracker.update(None, hand, (540, 310))
+        crop = tracker.region()
+        self.assertEqual(crop, crop_around((250, 120, 290, 160), (540, 310)))
+        tracker.update(crop, hand, (540, 310))
+        self.assertIsNotNone(tracker.region())
+        tracker.update(crop, hand, (540, 310))
+        self.assertIsNone(tracker.region())
+        tracker.update(None, hand, (540, 310))
+        self.assertEqual(tracker.region(), crop)
+
+    def test_covers_every_hand(self):
+        tracker = RoiTracker(margin=0.0, min_height=10)
+        tracker.update(None, torch.tensor([[100.0, 100.0, 120.0, 120.0], [150.0, 110.0, 170.0, 140.0]]), (540, 310))
+        self.assertEqual(tracker.box, (100.0, 100.0, 170.0, 140.0))
+        x0, y0, x1, y1 = tracker.region()
+        self.assertTrue(x0 <= 100 and y0 <= 100 and x1 >= 170 and y1 >= 140)
+
+    def test_lost_hand_goes_back_to_the_whole_frame(self):
+        tracker = RoiTracker()
+        tracker.update(None, torch.tensor([[250.0, 120.0, 290.0, 160.0]]), (540, 310))
+        tracker.update(tracker.region(), torch.tensor([]), (540, 310))
+        self.assertIsNone(tracker.region())
+
+
+if __name__ == "__main__":
+    unittest.main()
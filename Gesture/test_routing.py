@@ -0,0 +1,68 @@
+import random
+import unittest
+from collections import Counter
+
+from routing import (EwmaLatencyRouter, LeastQueueRouter, PowerOfTwoRouter, RoundRobinRouter,
+                     create_router, worker_stats)
+
+
+class FakeWorker:
+    def __init__(self, queue_depth=0, batch_latency=None):
+        self.queue_depth = queue_depth
+        self.batch_latency = batch_latency
+
+
+class RouterTestCase(unittest.TestCase):
+    def test_round_robin(self):
+        workers = [FakeWorker(5), FakeWorker(0), FakeWorker(9)]
+        router = RoundRobinRouter()
+        self.assertEqual([router.choose(workers) for _ in range(4)], workers + workers[:1])
+
+    def test_least_queue_avoids_backlog(self):
+        workers = [FakeWorker(4), FakeWorker(1), FakeWorker(2)]
+        router = LeastQueueRouter()
+        for _ in range(3):
+            self.assertIs(router.choose(workers), workers[1])
+
+    def test_least_queue_spreads_ties(self):
+        workers = [FakeWorker(), FakeWorker(), FakeWorker()]
+        router = LeastQueueRouter()
+        self.assertEqual({id(router.choose(workers)) for _ in range(3)}, {id(worker) for worker in workers})
+
+    def test_power_of_two_never_picks_the_longest_queue(self):
+        workers = [FakeWorker(0), FakeWorker(1), FakeWorker(8)]
+        router = PowerOfTwoRouter(random.Random(0))
+        picks = Counter(id(router.choose(workers)) for _ in range(200))
+        self.assertNotIn(id(workers[2]), picks)
+        self.assertGreater(picks[id(workers[0])], picks[id(workers[1])])
+        self.assertIs(router.choose(workers[:1]), workers[0])
+
+    def test_ewma_latency_prefers_fast_replica(self):
+        slow, fast = FakeWorker(1, batch_latency=0.2), FakeWorker(3, batch_latency=0.02)
+        router = EwmaLatencyRouter()
+        self.assertIs(router.choose([slow, fast]), fast)
+        # 還沒有量測值的worker以量測值的平均估計，queue長時不會每次都被選中
+        fresh = FakeWorker(2)
+        self.assertIs(router.choose([slow, fast, fresh]), fast)
+        fast.queue_depth = 9
+        idle = FakeWorker(0)
+        self.assertIs(router.choose([slow, fast, idle]), idle)
+
+    def test_ewma_latency_without_measurements_is_least_queue(self):
+        workers = [FakeWorker(3), FakeWorker(1), FakeWorker(2)]
+        router = EwmaLatencyRouter()
+        for _ in range(3):
+            self.assertIs(router.choose(workers), workers[1])
+
+    def test_create_router(self):
+        self.assertIsInstance(create_router("power_of_two"), PowerOfTwoRouter)
+        with self.assertRaises(ValueError):
+            create_router("random")
+
+    def test_worker_stats(self):
+        stats = worker_stats([FakeWorker(2, 0.05)])
+        self.assertEqual(stats, [{"worker": 0, "queue_depth": 2, "batch_latency": 0.05}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+
+from streams import ClientStates, StreamState
+
+
+class ClientStatesTestCase(unittest.TestCase):
+    def test_clients_are_evicted_least_recently_used(self):
+        states = ClientStates(StreamState, max_clients=2)
+        first = states.get("a")
+        states.get("b")
+        self.assertIs(states.get("a"), first)
+        states.get("c")
+        self.assertIs(states.get("a"), first)
+        self.assertEqual(list(states._states), ["c", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
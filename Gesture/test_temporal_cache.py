@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import GestureBatchNew
+from config import settings
+from frames import encode_image
+from temporal_cache import TemporalCache, frame_signature
+from test_gesture_server import ServerTestCase
+
+
+def scene(seed, height=310, width=540):
+    # 平滑的亮度變化加上區塊，模擬相機畫面
+    rng = np.random.default_rng(seed)
+    image = np.tile(np.linspace(40, 200, width, dtype=np.uint8), (height, 1))
+    image = np.repeat(image[:, :, None], 3, axis=2)
+    for _ in range(6):
+        y, x = rng.integers(0, height - 60), rng.integers(0, width - 60)
+        image[y:y + 60, x:x + 60] = rng.integers(0, 256, 3)
+    return image
+
+
+class FrameSignatureTestCase(unittest.TestCase):
+    def test_near_duplicates_are_close(self):
+        frame = scene(0)
+        noisy = np.clip(frame.astype(int) + np.random.default_rng(1).integers(-3, 4, frame.shape), 0, 255)
+        for encoding in ("jpeg", "raw_bgr"):
+            signature = frame_signature(encode_image(frame, encoding))
+            self.assertLessEqual((signature ^ frame_signature(encode_image(noisy.astype(np.uint8), encoding)))
+                                 .bit_count(), 8)
+            self.assertGreater((signature ^ frame_signature(encode_image(scene(2), encoding))).bit_count(), 8)
+
+    def test_signature_size(self):
+        self.assertLess(frame_signature(encode_image(scene(0), "png"), hash_size=8), 1 << 64)
+
+
+class TemporalCacheTestCase(unittest.TestCase):
+    def test_reuse_until_refresh(self):
+        cache = TemporalCache(threshold=2, refresh_interval=2)
+        self.assertEqual(cache.lookup(0b1010), (None, "miss"))
+        cache.store(0b1010, "reply")
+        self.assertEqual(cache.lookup(0b1011), ("reply", "hit"))
+        self.assertEqual(cache.lookup(0b0011), ("reply", "hit"))
+        self.assertEqual(cache.lookup(0b1010), (None, "refresh"))
+        self.assertEqual(cache.lookup(0b0101), (None, "miss"))
+        cache.store(0b0101, "new reply")
+        self.assertEqual(cache.lookup(0b0101), ("new reply", "hit"))
+
+
+
+class CachedReplyTestCase(ServerTestCase):
+    def setUp(self):
+        settings.temporal_cache = True
+        self.service = GestureBatchNew.AsyncGestureRecognitionService()
+        self.service.start()
+
+    def tearDown(self):
+        self.service.close()
+        settings.temporal_cache = False
+
+    def test_hit_gets_fresh_frame_index(self):
+        state = self.service.new_stream_state()
+        request = encode_image(scene(0), "jpeg")
+        with mock.patch.object(self.service.router, "choose", wraps=self.service.router.choose) as choose:
+            replies = [self.service.submit_frame(request, state=state).result(timeout=30) for _ in range(3)]
+        # 命中不經過router，不改變router的狀態
+        self.assertEqual(choose.call_count, 1)
+        indexes = [reply.frame_index for reply in replies]
+        self.assertEqual(len(set(indexes)), 3)
+        self.assertEqual(indexes, sorted(indexes))
+        self.assertEqual({reply.action for reply in replies}, {replies[0].action})
+        # 命中的編號與之後真正偵測的frame共用同一個計數
+        other = self.service.submit_frame(encode_image(scene(2), "jpeg"), state=state).result(timeout=30)
+        self.assertEqual(other.frame_index, indexes[-1] + 1)
+
+    def test_async_signature_runs_off_event_loop(self):
+        threads = []
+
+        def signature(request):
+            threads.append(threading.current_thread())
+            return frame_signature(request)
+
+        async def submit():
+            future = await self.service.submit_async(encode_image(scene(0), "jpeg"),
+                                                     state=self.service.new_stream_state())
+            return await asyncio.wrap_future(future)
+
+        with mock.patch("GestureBatchNew.frame_signature", signature):
+            asyncio.run(submit())
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], threading.main_thread())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import time
+import unittest
+
+import numpy as np
+
+import gesture_pb2
+from batching import DeadlineExceeded
+from frames import FrameDecodeError, encode_image
+from worker_pool import FrameRing, ProcessWorkerPool
+
+
+class MeanHandler:
+    """Stands in for a model replica in the worker processes."""
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.warmed_up = False
+
+    def warm_up(self):
+        self.warmed_up = True
+
+    def __call__(self, frames, sizes):
+        time.sleep(0.01)
+        assert self.warmed_up
+        return [(self.worker_id, int(frame[..., 0].mean()), size) for frame, size in zip(frames, sizes)]
+
+
+class CrashingHandler(MeanHandler):
+    """Worker 0 dies on a white frame, as a worker process killed mid-batch would."""
+
+    def __call__(self, frames, sizes):
+        if self.worker_id == 0 and (frames == 255).all():
+            os._exit(3)
+        return super().__call__(frames, sizes)
+
+
+class FailingWarmUpHandler(MeanHandler):
+    def warm_up(self):
+        raise RuntimeError("no model weights")
+
+
+def solid_frame(value, width=12, height=6):
+    return encode_image(np.full((height, width, 3), value, np.uint8), "raw_bgr")
+
+
+class FrameRingTestCase(unittest.TestCase):
+    def test_slots_and_batches(self):
+        ring = FrameRing(3, 4)
+        try:
+            self.assertEqual([ring.acquire(0), ring.acquire(0), ring.acquire(0)], [0, 1, 2])
+            self.assertIsNone(ring.acquire(0.01))
+            ring.release(1)
+            self.assertEqual(ring.acquire(0), 1)
+            ring.frames[:] = np.arange(3).reshape(3, 1, 1, 1)
+            self.assertTrue(np.shares_memory(ring.batch([1, 2]), ring.frames))
+            self.assertEqual(ring.batch([2, 0])[:, 0, 0, 0].tolist(), [2, 0])
+
+            attached = FrameRing(3, 4, name=ring.name)
+            self.assertEqual(attached.frames[2, 0, 0, 0], 2)
+            attached.close()
+        finally:
+            ring.close()
+            ring.unlink()
+
+
+class ProcessWorkerPoolTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ProcessWorkerPool(MeanHandler, 2, size=8, slots_per_worker=2,
+                                     max_batch_size=4, max_delay=0.002)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def test_workers_report_ready(self):
+        self.assertTrue(self.pool.wait_ready(30))
+
+    def test_frames_reach_worker_processes(self):
+        results = [self.pool.submit(solid_frame(value)) for value in range(10)]
+        replies = [future.result(timeout=30) for future in results]
+        self.assertEqual([value for _, value, _ in replies], list(range(10)))
+        self.assertEqual({size for _, _, size in replies}, {(12, 6)})
+        self.assertEqual({worker for worker, _, _ in replies}, {0, 1})
+        stats = self.pool.worker_stats()
+        self.assertEqual([worker["queue_depth"] for worker in stats], [0, 0])
+        self.assertTrue(all(worker["batch_latency"] > 0 for worker in stats))
+
+    def test_bad_frame_fails_its_future(self):
+        future = self.pool.submit(gesture_pb2.RecognitionRequest(image=b"junk", encoding=gesture_pb2.ENCODING_JPEG))
+        with self.assertRaises(FrameDecodeError):
+            future.result(timeout=1)
+        # 格式錯誤的base64也只讓該請求失敗
+        future = self.pool.submit(gesture_pb2.RecognitionRequest(image=b"abcde"))
+        with self.assertRaises(FrameDecodeError):
+            future.result(timeout=1)
+        self.assertEqual(self.pool.submit(solid_frame(7)).result(timeout=30)[1], 7)
+
+    def test_expired_request(self):
+        future = self.pool.submit(solid_frame(1), deadline=time.monotonic() - 1)
+        with self.assertRaises(DeadlineExceeded):
+            future.result(timeout=30)
+
+
+
+class WorkerExitTestCase(unittest.TestCase):
+    def test_exit_fails_pending_and_reroutes(self):
+        pool = ProcessWorkerPool(CrashingHandler, 2, size=8, slots_per_worker=2,
+                                 max_batch_size=1, max_delay=0.002)
+        try:
+            self.assertTrue(pool.wait_ready(30))
+            # 只送給worker 0：讓worker 1看起來比較忙
+            pool.workers[1].queue_depth += 100
+            future = pool.submit(solid_frame(255))
+            with self.assertRaisesRegex(RuntimeError, "exited with code 3"):
+                future.result(timeout=30)
+            pool.workers[1].queue_depth -= 100
+            replies = [pool.submit(solid_frame(value)).result(timeout=30) for value in range(6)]
+            self.assertEqual({worker for worker, _, _ in replies}, {1})
+            self.assertEqual(sorted(pool.ring._free), list(range(pool.ring.num_slots)))
+        finally:
+            pool.close()
+
+    def test_exit_before_ready_raises(self):
+        pool = ProcessWorkerPool(FailingWarmUpHandler, 1, size=8, slots_per_worker=1)
+        try:
+            with self.assertRaisesRegex(RuntimeError, "exited with code 1"):
+                pool.wait_ready(30)
+        finally:
+            pool.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.ao.quantization import fuse_modules
 
 
 class MobileNetV1(nn.Module):
@@ -49,4 +50,24 @@ class MobileNetV1(nn.Module):
         x = F.avg_pool2d(x, 7)
         x = x.view(-1, 1024)
         x = self.fc(x)
-        return x
\ No newline at end of file
+        return x
+
+
+def fuse_conv_bn_relu(model):
+    """Fold every Conv2d + BatchNorm2d (+ ReLU) of the conv_bn/conv_dw blocks into one conv, in place.
+
+    The model must be in eval mode and already hold its trained weights, since
+    the BatchNorm statistics are baked into the convolution.
+    """
+    for block in [m for m in model.modules() if isinstance(m, nn.Sequential)]:
+        layers = list(block.named_children())
+        groups = []
+        for i in range(len(layers) - 1):
+            if isinstance(layers[i][1], nn.Conv2d) and isinstance(layers[i + 1][1], nn.BatchNorm2d):
+                group = [layers[i][0], layers[i + 1][0]]
+                if i + 2 < len(layers) and isinstance(layers[i + 2][1], nn.ReLU):
+                    group.append(layers[i + 2][0])
+                groups.append(group)
+        if groups:
+            fuse_modules(block, groups, inplace=True)
+    return model
@@ -1,6 +1,6 @@
 import numpy as np
 
-from vision.utils.box_utils import SSDSpec, SSDBoxSizes, generate_ssd_priors
+from vision.utils.box_utils import SSDSpec, SSDBoxSizes, cached_ssd_priors
 
 
 image_size = 300
@@ -20,4 +20,5 @@ specs = [
 ]
 
 
-priors = generate_ssd_priors(specs, image_size)
\ No newline at end of file
+# 與SSD模型共用同一份快取中的priors，啟動時只產生一次
+priors = cached_ssd_priors(specs, image_size)
\ No newline at end of file
@@ -1,4 +1,7 @@
+import threading
+
 from ..transforms.transforms import *
+import torch.nn.functional as F
 
 
 class TrainAugmentation:
@@ -59,4 +62,67 @@ class PredictionTransform:
 
     def __call__(self, image):
         image, _, _ = self.transform(image)
-        return image
\ No newline at end of file
+        return image
+
+class DevicePredictionTransform:
+    """Batched PredictionTransform that runs on the inference device.
+
+    The uint8 frames are copied once into a pinned host buffer and uploaded with a
+    non-blocking copy; resize, mean/std normalization and HWC->CHW then run on the
+    device for the whole batch instead of per frame on the CPU. Every calling
+    thread has its own host buffer, so one transform can serve a thread pool.
+    """
+
+    def __init__(self, size, mean=0.0, std=1.0, device=None):
+        self.size = size
+        self.device = torch.device(device) if device is not None else torch.device("cpu")
+        self.mean = torch.as_tensor(mean, dtype=torch.float32, device=self.device).reshape(1, -1, 1, 1)
+        self.std = torch.as_tensor(std, dtype=torch.float32, device=self.device).reshape(1, -1, 1, 1)
+        self.pin_memory = self.device.type == "cuda"
+        # pinned buffer與上傳完成的event每個執行緒各一份，避免同時覆寫彼此的batch
+        self._local = threading.local()
+
+    def _staging_buffer(self, shape):
+        local = self._local
+        # 上一次non_blocking上傳完成前不能覆寫同一塊pinned buffer
+        upload_done = getattr(local, "upload_done", None)
+        if upload_done is not None:
+            upload_done.synchronize()
+        staging = getattr(local, "staging", None)
+        if staging is None or staging.shape != shape:
+            staging = local.staging = torch.empty(shape, dtype=torch.uint8, pin_memory=self.pin_memory)
+        return staging
+
+    def _upload(self, images):
+        if isinstance(images, np.ndarray) and not self.pin_memory:
+            return torch.from_numpy(images)  # CPU上直接使用呼叫端的緩衝區
+        shape = (len(images),) + images[0].shape
+        staging = self._staging_buffer(shape)
+        if isinstance(images, np.ndarray):
+            np.copyto(staging.numpy(), images)
+        else:
+            np.stack(images, out=staging.numpy())
+        batch = staging.to(self.device, non_blocking=True)
+        if self.pin_memory:
+            self._local.upload_done = torch.cuda.Event()
+            self._local.upload_done.record()
+        return batch
+
+    def _resize(self, batch):
+        batch = batch.permute(0, 3, 1, 2).float()
+        if batch.shape[2:] != (self.size, self.size):
+            batch = F.interpolate(batch, size=(self.size, self.size), mode="bilinear", align_corners=False)
+        return batch
+
+    def __call__(self, images):
+        """
+        Args:
+            images: list of HxWx3 uint8 images, or one (batch_size, H, W, 3) uint8 array.
+        Returns:
+            float tensor (batch_size, 3, size, size) on the device.
+        """
+        if isinstance(images, np.ndarray) or all(image.shape == images[0].shape for image in images):
+            batch = self._resize(self._upload(images))
+        else:
+            batch = torch.cat([self._resize(self._upload([image])) for image in images])
+        return (batch - self.mean) / self.std
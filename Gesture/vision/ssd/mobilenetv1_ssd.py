@@ -1,6 +1,6 @@
 import torch
 from torch.nn import Conv2d, Sequential, ModuleList, ReLU
-from ..nn.mobilenet import MobileNetV1
+from ..nn.mobilenet import MobileNetV1, fuse_conv_bn_relu
 
 from .ssd import SSD
 from .predictor import Predictor
@@ -63,12 +63,23 @@ def create_mobilenetv1_ssd(num_classes, is_test=False):
                extras, classification_headers, regression_headers, is_test=is_test, config=config)
 
 
-def create_mobilenetv1_ssd_predictor(net, candidate_size=200, nms_method=None, sigma=0.5, device=None):
+def create_mobilenetv1_ssd_predictor(net, candidate_size=200, nms_method=None, sigma=0.5, device=None,
+                                     nms_backend=None, single_best=False, device_preprocess=False,
+                                     precision="fp32", channels_last=False, fuse=False):
+    if fuse:
+        # BatchNorm折進卷積權重，必須在載入權重之後、eval模式下進行
+        net.eval()
+        fuse_conv_bn_relu(net.base_net)
     predictor = Predictor(net, config.image_size, config.image_mean,
                           config.image_std,
                           nms_method=nms_method,
                           iou_threshold=config.iou_threshold,
                           candidate_size=candidate_size,
                           sigma=sigma,
-                          device=device)
+                          device=device,
+                          nms_backend=nms_backend,
+                          single_best=single_best,
+                          device_preprocess=device_preprocess,
+                          precision=precision,
+                          channels_last=channels_last)
     return predictor
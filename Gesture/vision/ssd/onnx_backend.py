@@ -0,0 +1,61 @@
+import numpy as np
+import torch
+
+try:
+    import onnxruntime
+except ImportError:
+    onnxruntime = None
+
+
+class OnnxRuntimeNet:
+    """Run an SSD exported by `export_model.py onnx` on the onnxruntime CPU execution provider.
+
+    Stands in for the torch SSD behind Predictor: calling it with the
+    preprocessed (batch_size, 3, size, size) float32 tensor returns the
+    (scores, boxes) tensors of the test-mode SSD. With io_binding the session
+    reads the input and writes the outputs directly in torch tensor memory.
+    """
+
+    def __init__(self, path, intra_op_num_threads=0, inter_op_num_threads=0, io_binding=True):
+        if onnxruntime is None:
+            raise ImportError("the onnxruntime backend needs the onnxruntime package")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0為onnxruntime預設值；同一台機器跑多個session時應分配核心，避免執行緒互搶
+        options.intra_op_num_threads = intra_op_num_threads
+        options.inter_op_num_threads = inter_op_num_threads
+        if inter_op_num_threads > 1:
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.device = torch.device("cpu")
+        self.io_binding = io_binding
+        self.input_name = self.session.get_inputs()[0].name
+        outputs = self.session.get_outputs()
+        self.output_names = [output.name for output in outputs]
+        self.output_shapes = [tuple(output.shape[1:]) for output in outputs]
+
+    def forward(self, images):
+        images = images.to(dtype=torch.float32).contiguous()
+        if not self.io_binding:
+            outputs = self.session.run(self.output_names, {self.input_name: images.numpy()})
+            return tuple(torch.from_numpy(output) for output in outputs)
+
+        batch_size = images.size(0)
+        # 每次呼叫都配置新的輸出tensor，同一個predictor可能被多個執行緒同時呼叫
+        outputs = [torch.empty((batch_size,) + shape, dtype=torch.float32) for shape in self.output_shapes]
+        binding = self.session.io_binding()
+        binding.bind_input(self.input_name, "cpu", 0, np.float32, tuple(images.shape), images.data_ptr())
+        for name, output in zip(self.output_names, outputs):
+            binding.bind_output(name, "cpu", 0, np.float32, tuple(output.shape), output.data_ptr())
+        self.session.run_with_iobinding(binding)
+        return tuple(outputs)
+
+    def __call__(self, images):
+        return self.forward(images)
+
+    def to(self, *args, **kwargs):
+        # 精度與記憶體配置在匯出時已固定，Predictor的.to()不改變session
+        return self
+
+    def eval(self):
+        return self
@@ -1,61 +1,209 @@
+import collections
+import contextlib
+import copy
+import threading
+import time
+
+import numpy as np
 import torch
 from ..utils import box_utils
-from .data_preprocessing import PredictionTransform
-from ..utils.misc import Timer
+from .data_preprocessing import PredictionTransform, DevicePredictionTransform
+
+
+def _cpu_has_native_bf16():
+    check = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    return bool(check and check())
+
+
+def resolve_dtype(precision, device):
+    """Map a precision name ("fp32", "fp16", "bf16" or "auto") to the dtype to run on `device`.
+
+    CUDA runs fp16 and bf16 (bf16 only where the GPU supports it, else fp16). A
+    CPU has no fast fp16 convolutions, so reduced precision there becomes bf16 if
+    the CPU supports it natively and fp32 otherwise. A torch.dtype is used as is,
+    e.g. for a model exported in a fixed precision.
+    """
+    if isinstance(precision, torch.dtype):
+        return precision
+    if precision not in ("fp32", "fp16", "bf16", "auto"):
+        raise ValueError(f"unknown precision {precision!r}")
+    if precision == "fp32":
+        return torch.float32
+    if torch.device(device).type == "cuda":
+        if precision == "bf16" and torch.cuda.is_bf16_supported():
+            return torch.bfloat16
+        return torch.float16
+    return torch.bfloat16 if _cpu_has_native_bf16() else torch.float32
+
 
 class Predictor:
     def __init__(self, net, size, mean=0.0, std=1.0, nms_method=None,
-                 iou_threshold=0.45, filter_threshold=0.01, candidate_size=200, sigma=0.5, device=None):
+                 iou_threshold=0.45, filter_threshold=0.01, candidate_size=200, sigma=0.5, device=None,
+                 nms_backend=None, single_best=False, device_preprocess=False, precision="fp32",
+                 channels_last=False):
         self.net = net
+        self.size = size
         self.transform = PredictionTransform(size, mean, std)
         self.iou_threshold = iou_threshold
         self.filter_threshold = filter_threshold
         self.candidate_size = candidate_size
         self.nms_method = nms_method
         self.sigma = sigma
+        self.nms_backend = nms_backend
+        self.single_best = single_best  # 只取全圖分數最高的一個偵測結果，略過NMS
         self.device = device if device else torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+        # 在裝置上整批做resize與正規化，取代逐張在CPU上的PredictionTransform
+        self.device_preprocess = device_preprocess
+        self.device_transform = DevicePredictionTransform(size, mean, std, self.device)
         self.net.to(self.device)
         self.net.eval()
-        self.timer = Timer()
+        # 推論最佳化：降低精度與NHWC記憶體配置，輸入tensor也轉成相同格式
+        self.dtype = resolve_dtype(precision, self.device)
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        self.net.to(dtype=self.dtype, memory_format=self.memory_format)
+        # observer(stage, seconds, batch_size)：每批的preprocess、forward、postprocess時間，例如匯出成metrics
+        self.observer = None
+        # 此predictor的CUDA stream，None為預設stream(見replica)
+        self.stream = None
+        # CUDA上forward的(開始, 結束, batch大小)計時event，結果同步回CPU後才回報
+        self._forward_events = collections.deque()
+        self._forward_events_lock = threading.Lock()
 
-    def predict(self, image, top_k=-1, prob_threshold=None):
-        cpu_device = torch.device("cpu")
-        height, width, _ = image.shape
-        image = self.transform(image)
-        images = image.unsqueeze(0).to(self.device)
+    def replica(self):
+        """A Predictor sharing this one's network, for another worker thread.
 
-        with torch.no_grad():
-            self.timer.start("default")
-            scores, boxes = self.net.forward(images)
-            print("Inference time: ", self.timer.end("default"))
+        Inference only reads the weights, so a replica costs no extra model
+        memory. On CUDA every replica queues its batches on its own stream, so
+        the batches of different workers overlap on the GPU; on the CPU the
+        worker threads run their forwards concurrently.
+        """
+        replica = copy.copy(self)
+        # pinned上傳緩衝區每個執行緒各自一份
+        transform = self.device_transform
+        replica.device_transform = DevicePredictionTransform(self.size, transform.mean, transform.std, self.device)
+        replica.stream = torch.cuda.Stream(self.device) if self.device.type == "cuda" else None
+        replica._forward_events = collections.deque()
+        replica._forward_events_lock = threading.Lock()
+        return replica
 
-        return self._postprocess(scores[0], boxes[0], width, height, top_k, prob_threshold or self.filter_threshold)
+    def predict(self, image, top_k=-1, prob_threshold=None, size=None):
+        """Detect objects in one HxWx3 RGB image.
 
-    def predict_batch(self, image_list, top_k=-1, prob_threshold=None):
-        cpu_device = torch.device("cpu")
-        heights = [img.shape[0] for img in image_list]
-        widths = [img.shape[1] for img in image_list]
+        `size` is the (width, height) of the original frame when `image` was already
+        resized to the model input (see frames.FrameDecoder); boxes are scaled to it.
+        """
+        height, width, _ = image.shape
+        if size is not None:
+            width, height = size
+        return self.predict_batch([image], top_k, prob_threshold, sizes=[(width, height)])[0]
 
-        tensor_list = [self.transform(img).unsqueeze(0) for img in image_list]
-        batch_tensor = torch.cat(tensor_list, dim=0).to(self.device)
+    def predict_batch(self, image_list, top_k=-1, prob_threshold=None, sizes=None, offsets=None):
+        """Detect objects in a list of RGB images.
 
-        with torch.no_grad():
-            self.timer.start("default")
-            scores, boxes = self.net.forward(batch_tensor)
-            print("Batch inference time: ", self.timer.end("default"))
+        `image_list` may also be a (batch_size, size, size, 3) uint8 array that is
+        already at the model size; it is then uploaded as one block and `sizes`
+        gives the (width, height) of every original frame for box scaling.
+        When the images are crops of their frames (see roi_tracker), `sizes` are
+        the crop sizes and `offsets` the (x, y) of every crop in its frame, so
+        the boxes come back in frame coordinates.
+        """
+        if sizes is None:
+            sizes = [(img.shape[1], img.shape[0]) for img in image_list]
+        scores, boxes = self.forward_batch(image_list)
+        return self.postprocess_batch(scores, boxes, sizes, top_k, prob_threshold, offsets)
 
-        results = []
-        for i in range(len(image_list)):
-            result = self._postprocess(scores[i].to(cpu_device),
-                                       boxes[i].to(cpu_device),
-                                       widths[i],
-                                       heights[i],
-                                       top_k,
-                                       prob_threshold or self.filter_threshold)
-            results.append(result)
+    def forward_batch(self, image_list):
+        """Preprocess a batch and run the network; returns its (scores, boxes) on the device.
+
+        Together with postprocess_batch this is predict_batch split in two, so a
+        pipeline can run the model on one batch while another thread
+        post-processes the previous one. Both run on the predictor's stream.
+        """
+        with self._on_stream():
+            start = time.perf_counter()
+            batch_tensor = self._preprocess(image_list)
+            self._observe("preprocess", start, len(image_list))
+
+            with torch.no_grad():
+                start = time.perf_counter()
+                begin = self._timing_event()
+                scores, boxes = self.net.forward(batch_tensor)
+                self._observe("forward", start, len(image_list), begin)
+        return scores, boxes
 
+    def postprocess_batch(self, scores, boxes, sizes, top_k=-1, prob_threshold=None, offsets=None):
+        """NMS and box scaling of forward_batch outputs; `sizes` and `offsets` as for predict_batch."""
+        widths = [width for width, _ in sizes]
+        heights = [height for _, height in sizes]
+        with self._on_stream():
+            start = time.perf_counter()
+            results = self._postprocess_all(scores, boxes, widths, heights, top_k,
+                                            prob_threshold or self.filter_threshold, offsets)
+            self._observe("postprocess", start, len(sizes))
+        self._report_forward()
         return results  # List of (boxes, labels, probs)
 
+    def _on_stream(self):
+        return torch.cuda.stream(self.stream) if self.stream is not None else contextlib.nullcontext()
+
+    def _timing_event(self):
+        """A CUDA timing event recorded on the current stream, or None when nothing is timed on the GPU."""
+        if self.observer is None or self.device.type != "cuda":
+            return None
+        event = torch.cuda.Event(enable_timing=True)
+        event.record()
+        return event
+
+    def _observe(self, stage, start, batch_size, begin=None):
+        if self.observer is None:
+            return
+        if begin is not None:
+            # GPU非同步執行，不在這裡等forward算完；event在結果同步回CPU後由_report_forward讀取
+            with self._forward_events_lock:
+                self._forward_events.append((begin, self._timing_event(), batch_size))
+            return
+        self.observer(stage, time.perf_counter() - start, batch_size)
+
+    def _report_forward(self):
+        """Report the forward time of every batch whose end event the GPU has reached."""
+        if self.observer is None:
+            return
+        with self._forward_events_lock:
+            while self._forward_events and self._forward_events[0][1].query():
+                begin, end, batch_size = self._forward_events.popleft()
+                self.observer("forward", begin.elapsed_time(end) / 1000, batch_size)
+
+    def _postprocess_all(self, scores, boxes, widths, heights, top_k, prob_threshold, offsets=None):
+        if self.single_best:
+            results = self._postprocess_best(scores, boxes, widths, heights, prob_threshold)
+        elif self.nms_method != "soft":
+            results = self._postprocess_batch(scores, boxes, widths, heights, top_k, prob_threshold)
+        else:
+            cpu_device = torch.device("cpu")
+            results = []
+            for i in range(len(widths)):
+                result = self._postprocess(scores[i].to(cpu_device),
+                                           boxes[i].to(cpu_device),
+                                           widths[i],
+                                           heights[i],
+                                           top_k,
+                                           prob_threshold)
+                results.append(result)
+        if offsets is not None:
+            # crop內的座標移回原始frame
+            for (image_boxes, _, _), (x, y) in zip(results, offsets):
+                if image_boxes.numel() and (x or y):
+                    image_boxes += torch.tensor([x, y, x, y], dtype=image_boxes.dtype)
+        return results
+
+    def _preprocess(self, image_list):
+        if self.device_preprocess or isinstance(image_list, np.ndarray):
+            batch = self.device_transform(image_list)
+        else:
+            tensor_list = [self.transform(img).unsqueeze(0) for img in image_list]
+            batch = torch.cat(tensor_list, dim=0).to(self.device)
+        return batch.to(dtype=self.dtype, memory_format=self.memory_format)
+
     def _postprocess(self, scores, boxes, width, height, top_k, prob_threshold):
         picked_box_probs = []
         picked_labels = []
@@ -73,7 +221,8 @@ class Predictor:
                                       iou_threshold=self.iou_threshold,
                                       sigma=self.sigma,
                                       top_k=top_k,
-                                      candidate_size=self.candidate_size)
+                                      candidate_size=self.candidate_size,
+                                      backend=self.nms_backend)
             picked_box_probs.append(box_probs)
             picked_labels.extend([class_index] * box_probs.size(0))
 
@@ -87,3 +236,74 @@ class Predictor:
         picked_box_probs[:, 3] *= height
 
         return picked_box_probs[:, :4], torch.tensor(picked_labels), picked_box_probs[:, 4]
+
+    def _postprocess_batch(self, scores, boxes, widths, heights, top_k, prob_threshold):
+        """Hard-NMS post-processing of a whole batch with a handful of tensor ops.
+
+        Gives the same results as calling _postprocess on every image: candidates
+        above prob_threshold are grouped by (image, class) and a single class-aware
+        NMS pass handles all groups.
+
+        Args:
+            scores (batch_size, num_priors, num_classes): class probabilities.
+            boxes (batch_size, num_priors, 4): corner-form boxes relative to the image size.
+        Returns:
+            list of (boxes, labels, probs), one per image.
+        """
+        num_images, _, num_classes = scores.shape
+        class_scores = scores[:, :, 1:]
+        mask = class_scores > prob_threshold
+        image_index, prior_index, class_index = mask.nonzero(as_tuple=True)
+        class_index = class_index + 1
+        probs = class_scores[mask]
+        candidate_boxes = boxes[image_index, prior_index]
+
+        keep = box_utils.batched_hard_nms(candidate_boxes, probs, image_index * num_classes + class_index,
+                                          iou_threshold=self.iou_threshold,
+                                          top_k=top_k,
+                                          candidate_size=self.candidate_size,
+                                          backend=self.nms_backend)
+        image_index = image_index[keep].cpu()
+        scale = torch.tensor([[w, h, w, h] for w, h in zip(widths, heights)], dtype=boxes.dtype)
+        picked_boxes = candidate_boxes[keep].cpu() * scale[image_index]
+        picked_labels = class_index[keep].cpu()
+        picked_probs = probs[keep].cpu()
+
+        counts = torch.bincount(image_index, minlength=num_images).tolist()
+        results = []
+        for image_boxes, image_labels, image_probs in zip(picked_boxes.split(counts),
+                                                          picked_labels.split(counts),
+                                                          picked_probs.split(counts)):
+            if image_labels.numel() == 0:
+                results.append((torch.tensor([]), torch.tensor([]), torch.tensor([])))
+            else:
+                results.append((image_boxes, image_labels, image_probs))
+        return results
+
+    def _postprocess_best(self, scores, boxes, widths, heights, prob_threshold):
+        """Return only the strongest non-background detection of every image.
+
+        The argmax over all priors and classes is taken on the device, so no NMS
+        runs at all. The result equals the highest-probability detection that the
+        NMS path would report.
+
+        Returns:
+            list of (boxes, labels, probs) with at most one detection per image.
+        """
+        num_images, _, num_classes = scores.shape
+        class_scores = scores[:, :, 1:].reshape(num_images, -1)
+        best_probs, best_index = class_scores.max(dim=1)
+        prior_index = torch.div(best_index, num_classes - 1, rounding_mode="floor")
+        labels = (best_index % (num_classes - 1) + 1).cpu()
+        best_boxes = boxes[torch.arange(num_images, device=boxes.device), prior_index].cpu()
+        best_probs = best_probs.cpu()
+        found = (best_probs > prob_threshold).tolist()
+
+        results = []
+        for i in range(num_images):
+            if not found[i]:
+                results.append((torch.tensor([]), torch.tensor([]), torch.tensor([])))
+                continue
+            scale = torch.tensor([widths[i], heights[i], widths[i], heights[i]], dtype=best_boxes.dtype)
+            results.append(((best_boxes[i] * scale).unsqueeze(0), labels[i:i + 1], best_probs[i:i + 1]))
+        return results
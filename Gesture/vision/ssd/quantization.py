@@ -0,0 +1,59 @@
+import torch
+from torch import nn
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+from ..utils import box_utils
+
+
+class QuantizedSSD(nn.Module):
+    """Test-mode SSD whose backbone and headers run as an INT8 GraphModule.
+
+    The quantized graph returns the raw confidences and locations; the softmax
+    and the prior-box decoding stay in float32, as in SSD.forward.
+    """
+
+    def __init__(self, features, priors, config):
+        super(QuantizedSSD, self).__init__()
+        self.features = features
+        self.register_buffer("priors", priors)
+        self.center_variance = config.center_variance
+        self.size_variance = config.size_variance
+
+    def forward(self, x):
+        confidences, locations = self.features(x)
+        confidences = torch.softmax(confidences, dim=2)
+        boxes = box_utils.convert_locations_to_boxes(locations, self.priors, self.center_variance, self.size_variance)
+        return confidences, box_utils.center_form_to_corner_form(boxes)
+
+
+def quantize_ssd(net, calibration_batches, backend="x86"):
+    """Static post-training INT8 quantization of a trained SSD with FX graph mode.
+
+    Conv+BN+ReLU are fused and the activation ranges are observed on the
+    calibration batches before the weights and activations are converted to
+    int8. The modules of `net` are reused, so it should not be run afterwards.
+
+    Args:
+        net: SSD with trained weights, built with is_test=True.
+        calibration_batches: iterable of preprocessed (n, 3, size, size) float tensors.
+        backend: quantized engine, "x86" (or "fbgemm") on x86 servers, "qnnpack" on ARM.
+    Returns:
+        QuantizedSSD running on the CPU.
+    """
+    torch.backends.quantized.engine = backend
+    priors, config = net.priors.cpu(), net.config
+    calibration_batches = iter(calibration_batches)
+    example = next(calibration_batches)
+    net.cpu().eval()
+    # 只量化到headers的原始輸出，softmax與box解碼留在QuantizedSSD以float計算
+    net.is_test = False
+    try:
+        prepared = prepare_fx(net, get_default_qconfig_mapping(backend), (example,))
+    finally:
+        net.is_test = True
+    with torch.no_grad():
+        prepared(example)
+        for batch in calibration_batches:
+            prepared(batch)
+    return QuantizedSSD(convert_fx(prepared), priors, config).eval()
@@ -35,11 +35,14 @@ class SSD(nn.Module):
             self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
         if is_test:
             self.config = config
-            self.priors = config.priors.to(self.device)
+            # 同一裝置上的所有模型共用同一份priors
+            self.priors = box_utils.cached_ssd_priors(config.specs, config.image_size, self.device)
             
     def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
         confidences = []
         locations = []
+        image_height, image_width = x.shape[2:]
+        feature_maps = []
         start_layer_index = 0
         header_index = 0
         for end_layer_index in self.source_layer_indexes:
@@ -70,6 +73,7 @@ class SSD(nn.Module):
                 end_layer_index += 1
             start_layer_index = end_layer_index
             confidence, location = self.compute_header(header_index, y)
+            feature_maps.append(y.shape[2:])
             header_index += 1
             confidences.append(confidence)
             locations.append(location)
@@ -80,6 +84,7 @@ class SSD(nn.Module):
         for layer in self.extras:
             x = layer(x)
             confidence, location = self.compute_header(header_index, x)
+            feature_maps.append(x.shape[2:])
             header_index += 1
             confidences.append(confidence)
             locations.append(location)
@@ -88,15 +93,30 @@ class SSD(nn.Module):
         locations = torch.cat(locations, 1)
         
         if self.is_test:
-            confidences = F.softmax(confidences, dim=2)
+            # fp16/bf16推論時softmax與exp解碼仍以float32計算，避免溢位與精度損失
+            confidences = F.softmax(confidences.float(), dim=2)
+            priors = self.priors
+            # trace匯出的模型priors是常數，固定為config的輸入大小
+            if not torch.jit.is_tracing() and (image_width, image_height) != (self.config.image_size,) * 2:
+                priors = self.priors_for((image_width, image_height), feature_maps)
             boxes = box_utils.convert_locations_to_boxes(
-                locations, self.priors, self.config.center_variance, self.config.size_variance
+                locations.float(), priors, self.config.center_variance, self.config.size_variance
             )
             boxes = box_utils.center_form_to_corner_form(boxes)
             return confidences, boxes
         else:
             return confidences, locations
 
+    def priors_for(self, image_size, feature_maps):
+        """Priors of a (width, height) input other than config.image_size, e.g. whole 540x310 frames.
+
+        The feature map sizes come from the forward pass; every size is generated
+        once per process and device.
+        """
+        specs = [spec._replace(feature_map_size=(int(width), int(height)))
+                 for spec, (height, width) in zip(self.config.specs, feature_maps)]
+        return box_utils.cached_ssd_priors(specs, image_size, self.priors.device)
+
     def compute_header(self, i, x):
         confidence = self.classification_headers[i](x)
         confidence = confidence.permute(0, 2, 3, 1).contiguous()
@@ -1,14 +1,35 @@
 import collections
 import torch
-import itertools
+import threading
 from typing import List
 import math
 
+try:
+    from torchvision.ops import batched_nms as torchvision_batched_nms
+except ImportError:
+    torchvision_batched_nms = None
+
 SSDBoxSizes = collections.namedtuple('SSDBoxSizes', ['min', 'max'])
 
 SSDSpec = collections.namedtuple('SSDSpec', ['feature_map_size', 'shrinkage', 'box_sizes', 'aspect_ratios'])
 
 
+def _pair(size):
+    return (size, size) if isinstance(size, (int, float)) else tuple(size)
+
+
+def _prior_shapes(spec, image_width, image_height):
+    """(w, h) of the priors at one location: small square, big square, then every aspect ratio both ways."""
+    w, h = spec.box_sizes.min / image_width, spec.box_sizes.min / image_height
+    size = math.sqrt(spec.box_sizes.max * spec.box_sizes.min)
+    shapes = [(w, h), (size / image_width, size / image_height)]
+    for ratio in spec.aspect_ratios:
+        ratio = math.sqrt(ratio)
+        shapes.append((w * ratio, h / ratio))
+        shapes.append((w / ratio, h * ratio))
+    return shapes
+
+
 def generate_ssd_priors(specs: List[SSDSpec], image_size, clamp=True) -> torch.Tensor:
     """Generate SSD Prior Boxes.
 
@@ -23,63 +44,59 @@ def generate_ssd_priors(specs: List[SSDSpec], image_size, clamp=True) -> torch.T
                 SSDSpec(3, 100, SSDBoxSizes(213, 264), [2]),
                 SSDSpec(1, 300, SSDBoxSizes(264, 315), [2])
             ]
-        image_size: image size.
+            For a non-square input feature_map_size is the (width, height) of the feature map.
+        image_size: image size, or (width, height) of a non-square image.
         clamp: if true, clamp the values to make fall between [0.0, 1.0]
     Returns:
         priors (num_priors, 4): The prior boxes represented as [[center_x, center_y, w, h]]. All the values
             are relative to the image size.
     """
+    image_width, image_height = _pair(image_size)
     priors = []
     for spec in specs:
-        scale = image_size / spec.shrinkage
-        for j, i in itertools.product(range(spec.feature_map_size), repeat=2):
-            x_center = (i + 0.5) / scale
-            y_center = (j + 0.5) / scale
-
-            # small sized square box
-            size = spec.box_sizes.min
-            h = w = size / image_size
-            priors.append([
-                x_center,
-                y_center,
-                w,
-                h
-            ])
-
-            # big sized square box
-            size = math.sqrt(spec.box_sizes.max * spec.box_sizes.min)
-            h = w = size / image_size
-            priors.append([
-                x_center,
-                y_center,
-                w,
-                h
-            ])
-
-            # change h/w ratio of the small sized box
-            size = spec.box_sizes.min
-            h = w = size / image_size
-            for ratio in spec.aspect_ratios:
-                ratio = math.sqrt(ratio)
-                priors.append([
-                    x_center,
-                    y_center,
-                    w * ratio,
-                    h / ratio
-                ])
-                priors.append([
-                    x_center,
-                    y_center,
-                    w / ratio,
-                    h * ratio
-                ])
-
-    priors = torch.tensor(priors)
+        map_width, map_height = _pair(spec.feature_map_size)
+        # 以float64計算再轉float32，結果與逐一計算的版本完全相同
+        x_centers = (torch.arange(map_width, dtype=torch.float64) + 0.5) / (image_width / spec.shrinkage)
+        y_centers = (torch.arange(map_height, dtype=torch.float64) + 0.5) / (image_height / spec.shrinkage)
+        y_grid, x_grid = torch.meshgrid(y_centers, x_centers, indexing="ij")
+        centers = torch.stack([x_grid.reshape(-1), y_grid.reshape(-1)], dim=1)
+        shapes = torch.tensor(_prior_shapes(spec, image_width, image_height), dtype=torch.float64)
+        priors.append(torch.cat([centers.repeat_interleave(len(shapes), dim=0), shapes.repeat(len(centers), 1)],
+                                dim=1))
+
+    priors = torch.cat(priors).float()
     if clamp:
         torch.clamp(priors, 0.0, 1.0, out=priors)
     return priors
 
 
+_priors_cache = {}
+_priors_lock = threading.Lock()
+
+
+def cached_ssd_priors(specs: List[SSDSpec], image_size, device="cpu", clamp=True) -> torch.Tensor:
+    """generate_ssd_priors on `device`, computed once per process for each specs and image size.
+
+    The SSD configs take their `priors` from here, and other devices get a copy
+    of the CPU tensor. Every model replica on the same device shares the returned
+    tensor, so it must not be modified in place.
+    """
+    device = torch.device(device)
+    if device.type == "cuda" and device.index is None:
+        device = torch.device("cuda", torch.cuda.current_device())
+    specs = tuple(spec._replace(aspect_ratios=tuple(spec.aspect_ratios)) for spec in specs)
+    cpu_key = (specs, _pair(image_size), torch.device("cpu"), clamp)
+    key = cpu_key[:2] + (device, clamp)
+    with _priors_lock:
+        priors = _priors_cache.get(key)
+        if priors is None:
+            cpu_priors = _priors_cache.get(cpu_key)
+            if cpu_priors is None:
+                cpu_priors = _priors_cache[cpu_key] = generate_ssd_priors(specs, image_size, clamp)
+            priors = _priors_cache[key] = cpu_priors.to(device)
+    return priors
+
+
 def convert_locations_to_boxes(locations, priors, center_variance,
                                size_variance):
     """Convert regressional location results of SSD into boxes in the form of (center_x, center_y, h, w).
@@ -216,7 +233,7 @@ def corner_form_to_center_form(boxes):
     ], boxes.dim() - 1)
 
 
-def hard_nms(box_scores, iou_threshold, top_k=-1, candidate_size=200):
+def hard_nms(box_scores, iou_threshold, top_k=-1, candidate_size=200, backend=None):
     """
 
     Args:
@@ -224,37 +241,113 @@ def hard_nms(box_scores, iou_threshold, top_k=-1, candidate_size=200):
         iou_threshold: intersection over union threshold.
         top_k: keep top_k results. If k <= 0, keep all the results.
         candidate_size: only consider the candidates with the highest scores.
+        backend: "matrix" (default) or "torchvision" (falls back to "matrix" if torchvision is missing).
     Returns:
-         picked: a list of indexes of the kept boxes
+         picked_box_scores (K, 5): the kept boxes and probabilities, sorted by descending probability.
     """
     scores = box_scores[:, -1]
     boxes = box_scores[:, :-1]
-    picked = []
-    _, indexes = scores.sort(descending=True)
-    indexes = indexes[:candidate_size]
-    while len(indexes) > 0:
-        current = indexes[0]
-        picked.append(current.item())
-        if 0 < top_k == len(picked) or len(indexes) == 1:
+    keep = batched_hard_nms(boxes, scores, torch.zeros_like(scores, dtype=torch.long),
+                            iou_threshold, top_k, candidate_size, backend)
+    return box_scores[keep, :]
+
+
+def greedy_keep(suppress):
+    """Resolve greedy NMS from a suppression matrix without a per-box loop.
+
+    Boxes are assumed sorted by descending score, and suppress[..., i, j] (i < j)
+    tells whether box i would suppress box j if i were kept. Box j is kept when no
+    kept box before it suppresses it. Iterating that rule from "keep everything"
+    fixes at least one more box per round and stops at the exact result of
+    sequential greedy NMS, usually after a few rounds (Cluster-NMS).
+
+    Args:
+        suppress (..., K, K): upper-triangular boolean matrix.
+    Returns:
+        keep (..., K): boolean mask of the kept boxes.
+    """
+    keep = torch.ones(suppress.shape[:-1], dtype=torch.bool, device=suppress.device)
+    for _ in range(suppress.size(-1)):
+        new_keep = ~(suppress & keep.unsqueeze(-1)).any(-2)
+        if torch.equal(new_keep, keep):
             break
-        current_box = boxes[current, :]
-        indexes = indexes[1:]
-        rest_boxes = boxes[indexes, :]
-        iou = iou_of(
-            rest_boxes,
-            current_box.unsqueeze(0),
-        )
-        indexes = indexes[iou <= iou_threshold]
+        keep = new_keep
+    return keep
+
+
+def group_sort(scores, idxs):
+    """Order candidates by group, and by descending score inside each group.
+
+    Args:
+        scores (N): scores of the candidates.
+        idxs (N): group id of every candidate.
+    Returns:
+         order (N): indexes of the candidates in (group, -score) order.
+         rank (N): position of every ordered candidate inside its group.
+    """
+    order = torch.argsort(scores, descending=True, stable=True)
+    order = order[torch.argsort(idxs[order], stable=True)]
+    _, counts = torch.unique_consecutive(idxs[order], return_counts=True)
+    starts = torch.cumsum(counts, 0) - counts
+    rank = torch.arange(order.numel(), device=order.device) - torch.repeat_interleave(starts, counts)
+    return order, rank
+
+
+def batched_hard_nms(boxes, scores, idxs, iou_threshold, top_k=-1, candidate_size=200, backend=None):
+    """Hard NMS applied independently to every group of boxes in a single pass.
+
+    Boxes only suppress boxes of the same group, so passing image_index * num_classes + class_index
+    as `idxs` gives per-image, per-class NMS for a whole batch at once. The IoU of
+    every pair of candidates inside a group is computed once and suppression is
+    resolved with greedy_keep, so there is no per-box Python loop. Each greedy_keep
+    round checks convergence with one device sync; that is one sync per round
+    (usually a few), not one per box.
 
-    return box_scores[picked, :]
+    Args:
+        boxes (N, 4): boxes in corner-form.
+        scores (N): probabilities.
+        idxs (N): group id of every box.
+        iou_threshold: intersection over union threshold.
+        top_k: keep top_k results per group. If k <= 0, keep all the results.
+        candidate_size: only consider the candidates with the highest scores in each group.
+        backend: "matrix" (default) or "torchvision" (falls back to "matrix" if torchvision is missing).
+    Returns:
+         keep: indexes of the kept boxes, ordered by group and descending score.
+    """
+    if scores.numel() == 0:
+        return torch.empty(0, dtype=torch.long, device=scores.device)
+    order, rank = group_sort(scores, idxs)
+    selected = rank < candidate_size
+    order, rank = order[selected], rank[selected]
+
+    if backend == "torchvision" and torchvision_batched_nms is not None:
+        kept = order[torchvision_batched_nms(boxes[order], scores[order], idxs[order], iou_threshold)]
+        order, rank = group_sort(scores[kept], idxs[kept])
+        keep = kept[order]
+        return keep[rank < top_k] if top_k > 0 else keep
+
+    # 每個group排成一列(G, K)，只計算同一group內的IoU
+    _, group = torch.unique_consecutive(idxs[order], return_inverse=True)
+    num_groups, group_size = int(group[-1]) + 1, int(rank.max()) + 1
+    padded = boxes.new_zeros(num_groups, group_size, 4)
+    padded[group, rank] = boxes[order]
+    valid = torch.zeros(num_groups, group_size, dtype=torch.bool, device=boxes.device)
+    valid[group, rank] = True
+
+    iou = iou_of(padded.unsqueeze(2), padded.unsqueeze(1))
+    suppress = torch.triu(iou > iou_threshold, diagonal=1) & valid.unsqueeze(1) & valid.unsqueeze(2)
+    keep = greedy_keep(suppress) & valid
+    if top_k > 0:
+        keep &= torch.cumsum(keep, dim=1) <= top_k
+    return order[keep[group, rank]]
 
 
 def nms(box_scores, nms_method=None, score_threshold=None, iou_threshold=None,
-        sigma=0.5, top_k=-1, candidate_size=200):
+        sigma=0.5, top_k=-1, candidate_size=200, backend=None):
     if nms_method == "soft":
         return soft_nms(box_scores, score_threshold, sigma, top_k)
     else:
-        return hard_nms(box_scores, iou_threshold, top_k, candidate_size=candidate_size)
+        return hard_nms(box_scores, iou_threshold, top_k, candidate_size=candidate_size, backend=backend)
 
 
 def soft_nms(box_scores, score_threshold, sigma=0.5, top_k=-1):
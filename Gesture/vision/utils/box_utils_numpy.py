@@ -1,8 +1,6 @@
-from .box_utils import SSDSpec
+from .box_utils import SSDSpec, _pair, _prior_shapes
 
 from typing import List
-import itertools
-import math
 import numpy as np
 
 
@@ -20,58 +18,26 @@ def generate_ssd_priors(specs: List[SSDSpec], image_size, clamp=True):
                 SSDSpec(3, 100, SSDBoxSizes(213, 264), [2]),
                 SSDSpec(1, 300, SSDBoxSizes(264, 315), [2])
             ]
-        image_size: image size.
+            For a non-square input feature_map_size is the (width, height) of the feature map.
+        image_size: image size, or (width, height) of a non-square image.
         clamp: if true, clamp the values to make fall between [0.0, 1.0]
     Returns:
         priors (num_priors, 4): The prior boxes represented as [[center_x, center_y, w, h]]. All the values
             are relative to the image size.
     """
+    image_width, image_height = _pair(image_size)
     priors = []
     for spec in specs:
-        scale = image_size / spec.shrinkage
-        for j, i in itertools.product(range(spec.feature_map_size), repeat=2):
-            x_center = (i + 0.5) / scale
-            y_center = (j + 0.5) / scale
-
-            # small sized square box
-            size = spec.box_sizes.min
-            h = w = size / image_size
-            priors.append([
-                x_center,
-                y_center,
-                w,
-                h
-            ])
-
-            # big sized square box
-            size = math.sqrt(spec.box_sizes.max * spec.box_sizes.min)
-            h = w = size / image_size
-            priors.append([
-                x_center,
-                y_center,
-                w,
-                h
-            ])
-
-            # change h/w ratio of the small sized box
-            size = spec.box_sizes.min
-            h = w = size / image_size
-            for ratio in spec.aspect_ratios:
-                ratio = math.sqrt(ratio)
-                priors.append([
-                    x_center,
-                    y_center,
-                    w * ratio,
-                    h / ratio
-                ])
-                priors.append([
-                    x_center,
-                    y_center,
-                    w / ratio,
-                    h * ratio
-                ])
-
-    priors = np.array(priors, dtype=np.float32)
+        map_width, map_height = _pair(spec.feature_map_size)
+        x_centers = (np.arange(map_width, dtype=np.float64) + 0.5) / (image_width / spec.shrinkage)
+        y_centers = (np.arange(map_height, dtype=np.float64) + 0.5) / (image_height / spec.shrinkage)
+        x_grid, y_grid = np.meshgrid(x_centers, y_centers)
+        centers = np.stack([x_grid.reshape(-1), y_grid.reshape(-1)], axis=1)
+        shapes = np.array(_prior_shapes(spec, image_width, image_height), dtype=np.float64)
+        priors.append(np.concatenate([np.repeat(centers, len(shapes), axis=0), np.tile(shapes, (len(centers), 1))],
+                                     axis=1))
+
+    priors = np.concatenate(priors).astype(np.float32)
     if clamp:
         np.clip(priors, 0.0, 1.0, out=priors)
     return priors
@@ -167,34 +133,38 @@ def hard_nms(box_scores, iou_threshold, top_k=-1, candidate_size=200):
         top_k: keep top_k results. If k <= 0, keep all the results.
         candidate_size: only consider the candidates with the highest scores.
     Returns:
-         picked: a list of indexes of the kept boxes
+         picked_box_scores (K, 5): the kept boxes and probabilities, sorted by descending probability.
     """
     scores = box_scores[:, -1]
     boxes = box_scores[:, :-1]
-    picked = []
-    #_, indexes = scores.sort(descending=True)
-    indexes = np.argsort(scores)
-    #indexes = indexes[:candidate_size]
-    indexes = indexes[-candidate_size:]
-    while len(indexes) > 0:
-        #current = indexes[0]
-        current = indexes[-1]
-        picked.append(current)
-        if 0 < top_k == len(picked) or len(indexes) == 1:
-            break
-        current_box = boxes[current, :]
-        #indexes = indexes[1:]
-        indexes = indexes[:-1]
-        rest_boxes = boxes[indexes, :]
-        iou = iou_of(
-            rest_boxes,
-            np.expand_dims(current_box, axis=0),
-        )
-        indexes = indexes[iou <= iou_threshold]
-
+    indexes = np.argsort(scores)[-candidate_size:][::-1]
+    candidates = boxes[indexes, :]
+    iou = iou_of(np.expand_dims(candidates, 1), np.expand_dims(candidates, 0))
+    keep = greedy_keep(np.triu(iou > iou_threshold, k=1))
+    picked = indexes[keep]
+    if top_k > 0:
+        picked = picked[:top_k]
     return box_scores[picked, :]
 
 
+def greedy_keep(suppress):
+    """Numpy version of box_utils.greedy_keep.
+
+    Args:
+        suppress (K, K): upper-triangular boolean matrix, suppress[i, j] tells whether box i
+            (higher score) would suppress box j.
+    Returns:
+        keep (K): boolean mask of the kept boxes.
+    """
+    keep = np.ones(suppress.shape[0], dtype=bool)
+    for _ in range(suppress.shape[0]):
+        new_keep = ~(suppress & keep[:, None]).any(axis=0)
+        if np.array_equal(new_keep, keep):
+            break
+        keep = new_keep
+    return keep
+
+
 # def nms(box_scores, nms_method=None, score_threshold=None, iou_threshold=None,
 #         sigma=0.5, top_k=-1, candidate_size=200):
 #     if nms_method == "soft":
@@ -0,0 +1,281 @@
+import itertools
+import multiprocessing as mp
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import metrics
+from batching import DeadlineExceeded, DynamicBatcher
+from frames import FrameDecodeError, FrameDecoder
+from routing import LeastQueueRouter, worker_stats
+
+# 收集結果的執行緒每隔這麼久檢查一次worker程序是否還活著
+WORKER_POLL_INTERVAL = 0.5
+
+
+class FrameRing:
+    """Fixed number of size x size x 3 uint8 frame slots in shared memory.
+
+    The creating process hands slots out with acquire() and takes them back with
+    release(); worker processes attach to the same memory by name and only read
+    the slots they were told about.
+    """
+
+    def __init__(self, num_slots, size, name=None):
+        self.num_slots = num_slots
+        self.size = size
+        nbytes = num_slots * size * size * 3
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.frames = np.ndarray((num_slots, size, size, 3), np.uint8, buffer=self.shm.buf)
+        self._free = deque(range(num_slots))
+        self._cond = threading.Condition()
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def acquire(self, timeout=None):
+        """Return a free slot index, or None if none frees up within `timeout` seconds."""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._free, timeout):
+                return None
+            return self._free.popleft()
+
+    def release(self, slot):
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify()
+
+    def batch(self, slots):
+        """(len(slots), size, size, 3) array of the given slots, without a copy when they are consecutive."""
+        if slots == list(range(slots[0], slots[0] + len(slots))):
+            return self.frames[slots[0]:slots[0] + len(slots)]
+        return self.frames[slots]
+
+    def close(self):
+        self.frames = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class _ProcessWorker:
+    """Front-end view of one worker process, as seen by the router."""
+    __slots__ = ("tasks", "queue_depth", "batch_latency", "alive")
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.queue_depth = 0  # 已送出但還沒收到結果的請求數
+        self.batch_latency = None
+        self.alive = True
+
+
+def _send_result(results, req_id, batcher, future):
+    error = future.exception()
+    results.put((req_id, None if error is not None else future.result(), error, batcher.latency_ewma))
+
+
+def _worker_main(worker_id, handler_factory, ring_name, num_slots, size, tasks, results, batch_options):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C由主程序處理並關閉worker
+    ring = FrameRing(num_slots, size, name=ring_name)
+    handler = handler_factory(worker_id)
+    if hasattr(handler, "warm_up"):
+        handler.warm_up()
+    results.put((None, worker_id, None, None))  # 模型已就緒
+
+    def process(payloads):
+        frames = ring.batch([slot for _, slot, _ in payloads])
+        return handler(frames, [frame_size for _, _, frame_size in payloads])
+
+    batcher = DynamicBatcher(process, name=f"gesture-process-{worker_id}", **batch_options).start()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        req_id, slot, frame_size, deadline = task
+        future = batcher.submit((req_id, slot, frame_size), deadline)
+        future.add_done_callback(lambda f, req_id=req_id: _send_result(results, req_id, batcher, f))
+    # 等batch執行緒送完所有結果再結束，否則可能帶著result queue的鎖離開
+    batcher.close()
+    batcher.join()
+
+
+class ProcessWorkerPool:
+    """Model replicas in separate processes, fed through a shared-memory frame ring.
+
+    submit() decodes the frame straight into a free ring slot, so only a small
+    task tuple crosses the process boundary, and sends it to the worker picked by
+    `router` from each process's requests in flight and batch latency, which the
+    workers report with every result. Every worker process builds its own handler with
+    `handler_factory(worker_id)`, runs its warm_up() if it has one, and batches
+    its tasks with a DynamicBatcher; replies come back on one result queue that a
+    collector thread resolves. The collector also notices a worker process
+    that exits: its requests in flight fail with RuntimeError and it gets no
+    more requests.
+
+    Args:
+        handler_factory: picklable callable returning a handler that maps
+            (frames, sizes) to one reply (or Exception instance) per frame.
+        num_workers: number of worker processes.
+        size: side of the model input frames.
+        slots_per_worker: ring slots per worker; submit() blocks when all are in use.
+        router: routing policy from routing.py (default LeastQueueRouter).
+        batch_options: keyword arguments for each worker's DynamicBatcher.
+    """
+
+    def __init__(self, handler_factory, num_workers, size=300, slots_per_worker=16, router=None,
+                 **batch_options):
+        ctx = mp.get_context("spawn")  # fork之後的子程序不能使用CUDA
+        self.decoder = FrameDecoder(size)
+        self.ring = FrameRing(num_workers * slots_per_worker, size)
+        self.router = router or LeastQueueRouter()
+        self.results = ctx.Queue()
+        self.workers = [_ProcessWorker(ctx.SimpleQueue()) for _ in range(num_workers)]
+        self._pending = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._num_ready = 0
+        self._ready = threading.Event()
+        self._startup_error = None
+        self._closing = False
+        self.processes = [
+            ctx.Process(target=_worker_main, name=f"gesture-process-{i}", daemon=True,
+                        args=(i, handler_factory, self.ring.name, self.ring.num_slots, size,
+                              self.workers[i].tasks, self.results, batch_options))
+            for i in range(num_workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self._collector = threading.Thread(target=self._collect, name="gesture-results", daemon=True)
+        self._collector.start()
+
+    def submit(self, request, deadline=None):
+        """Decode `request` into the ring and return a Future for the worker's reply.
+
+        Like the thread workers, an undecodable frame fails the future with
+        FrameDecodeError, and a request that cannot get a ring slot before its
+        deadline fails with DeadlineExceeded.
+        """
+        future = futures.Future()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        slot = self.ring.acquire(timeout)
+        if slot is None:
+            future.set_exception(DeadlineExceeded("no free frame slot before deadline"))
+            return future
+        try:
+            with metrics.stage_timer("decode"):
+                _, frame_size = self.decoder.decode(request, self.ring.frames[slot])
+        except FrameDecodeError as e:
+            self.ring.release(slot)
+            future.set_exception(e)
+            return future
+
+        with self._lock:
+            workers = [worker for worker in self.workers if worker.alive]
+            if workers:
+                worker = self.router.choose(workers)
+                worker.queue_depth += 1
+                req_id = next(self._ids)
+                self._pending[req_id] = (future, slot, worker)
+        if not workers:
+            self.ring.release(slot)
+            future.set_exception(RuntimeError("no worker process is running"))
+            return future
+        worker.tasks.put((req_id, slot, frame_size, deadline))
+        return future
+
+    def worker_stats(self):
+        return worker_stats(self.workers)
+
+    def wait_ready(self, timeout=None):
+        """Wait until every worker process has built and warmed up its handler.
+
+        Raises RuntimeError if a worker process exits before it is ready.
+        """
+        ready = self._ready.wait(timeout)
+        if self._startup_error is not None:
+            raise RuntimeError(self._startup_error)
+        return ready
+
+    def _collect(self):
+        next_check = time.monotonic() + WORKER_POLL_INTERVAL
+        while True:
+            # 結果一直進來時也要定期檢查，否則死掉的worker不會被發現
+            if time.monotonic() >= next_check:
+                self._check_processes()
+                next_check = time.monotonic() + WORKER_POLL_INTERVAL
+            try:
+                message = self.results.get(timeout=WORKER_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if message is None:
+                return
+            req_id, reply, error, batch_latency = message
+            if req_id is None:
+                self._num_ready += 1
+                if self._num_ready == len(self.workers):
+                    self._ready.set()
+                continue
+            with self._lock:
+                pending = self._pending.pop(req_id, None)
+                if pending is None:
+                    continue  # worker結束時已讓此請求失敗
+                future, slot, worker = pending
+                worker.queue_depth -= 1
+                worker.batch_latency = batch_latency
+            # worker回覆後才歸還slot；client先取消的請求仍會跑完推論
+            self.ring.release(slot)
+            if future.set_running_or_notify_cancel():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(reply)
+
+    def _check_processes(self):
+        for worker, process in zip(self.workers, self.processes):
+            if worker.alive and process.exitcode is not None and not self._closing:
+                self._worker_exited(worker, process)
+
+    def _worker_exited(self, worker, process):
+        message = f"{process.name} exited with code {process.exitcode}"
+        with self._lock:
+            worker.alive = False
+            worker.queue_depth = 0
+            failed = [req_id for req_id, (_, _, owner) in self._pending.items() if owner is worker]
+            failed = [self._pending.pop(req_id) for req_id in failed]
+        if not self._ready.is_set():
+            self._startup_error = message
+            self._ready.set()
+        # 程序已結束，不會再讀它的slot
+        for future, slot, _ in failed:
+            self.ring.release(slot)
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError(message))
+
+    def close(self):
+        self._closing = True
+        for worker in self.workers:
+            worker.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        self._collector.join()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future, _, _ in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError("worker pool closed"))
+        self.ring.close()
+        self.ring.unlink()